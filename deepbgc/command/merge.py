@@ -0,0 +1,185 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from deepbgc import util
+from deepbgc.command.base import BaseCommand
+from deepbgc.output.evaluation.plot_writer import PlotRenderPool
+from deepbgc.output.readme import ReadmeWriter
+from deepbgc.output.registry import create_output_writers
+from deepbgc.output.score_store import read_score_store, get_pfam_score_table
+from deepbgc.output.shard import load_shard_manifest, get_writer_class, ShardReader
+
+
+class MergeCommand(BaseCommand):
+    command = 'merge'
+
+    help = """Merge outputs of pipeline runs on shards of the input (see "deepbgc pipeline --shard") into a single report directory.
+
+Records are merged in the order of the input, the GenBank and TSV outputs are the same as if the input was processed in a single run.
+Evaluation plots are rendered from the merged score store and BGC table.
+
+Examples:
+
+  # Show detailed help
+  deepbgc merge --help
+
+  # Merge outputs of "deepbgc pipeline --shard 1/3 sequence.fa", "--shard 2/3" and "--shard 3/3"
+  deepbgc merge --output sequence/ sequence.shard-1-of-3/ sequence.shard-2-of-3/ sequence.shard-3-of-3/
+  """
+
+    LOG_FILENAME = 'LOG.txt'
+    PLOT_DIRNAME = 'evaluation'
+    # Number of rows read at once when rendering plots from the merged BGC table
+    TABLE_CHUNK_SIZE = 100000
+
+    def add_arguments(self, parser):
+        parser.add_argument(dest='shards', nargs='+', help="Output directory paths of all shards.")
+        parser.add_argument('-o', '--output', required=True, help="Output directory path.")
+
+    def run(self, shards, output):
+        manifests = [load_shard_manifest(path) for path in shards]
+        shards, manifests = self._check_shards(shards, manifests)
+
+        if not os.path.exists(output):
+            os.mkdir(output)
+        logger = logging.getLogger('')
+        logger.addHandler(logging.FileHandler(os.path.join(output, self.LOG_FILENAME)))
+        output_file_name = os.path.basename(os.path.normpath(output))
+
+        outputs = manifests[0]['outputs']
+        writers = [get_writer_class(o)(out_path=os.path.join(output, output_file_name + o['suffix'])) for o in outputs]
+        record_ids = self._merge_outputs(shards, manifests, [w.out_path for w in writers])
+
+        plots = manifests[0]['plots']
+        if plots:
+            evaluation_path = os.path.join(output, self.PLOT_DIRNAME)
+            if not os.path.exists(evaluation_path):
+                os.mkdir(evaluation_path)
+            render_pool = PlotRenderPool(processes=len(plots))
+            try:
+                plot_writers = create_output_writers(plots, output, evaluation_path, output_file_name, render_pool=render_pool)
+                paths = {o['name']: w.out_path for o, w in zip(outputs, writers)}
+                self._render_plots(plot_writers, record_ids, paths.get('score-store'), paths.get('bgc-tsv'))
+                render_pool.wait()
+            finally:
+                render_pool.terminate()
+            writers += plot_writers
+
+        ReadmeWriter(out_path=os.path.join(output, 'README.txt'), root_path=output, writers=writers).close()
+
+        logging.info('=' * 80)
+        logging.info('Merged %s records from %s shards', len(record_ids), len(shards))
+        logging.info('Saved DeepBGC result to: {}'.format(output))
+
+    def _check_shards(self, shards, manifests):
+        """
+        Make sure all shards of the same run are provided
+        :return: Tuple (shard paths, manifests) sorted by shard number
+        """
+        num_shards = manifests[0]['num_shards']
+        shard_numbers = sorted(m['shard'] for m in manifests)
+        if shard_numbers != list(range(1, num_shards + 1)):
+            raise ValueError('Expected all {} shards exactly once, got shards: {}'.format(
+                num_shards, ', '.join(str(s) for s in shard_numbers)))
+        suffixes = [o['suffix'] for o in manifests[0]['outputs']]
+        for shard, manifest in zip(shards, manifests):
+            if manifest['num_shards'] != num_shards or [o['suffix'] for o in manifest['outputs']] != suffixes:
+                raise ValueError('Shard {} has different outputs than the other shards, '
+                                 'all shards should be run with the same options'.format(shard))
+        order = np.argsort([m['shard'] for m in manifests])
+        shards = [shards[i] for i in order]
+        manifests = [manifests[i] for i in order]
+        # Records are distributed between shards one by one
+        num_records = sum(m['num_records'] for m in manifests)
+        for i, (shard, manifest) in enumerate(zip(shards, manifests)):
+            expected = (num_records - i + num_shards - 1) // num_shards
+            if manifest['num_records'] != expected:
+                raise ValueError('Shard {} contains {} records, expected {}, '
+                                 'all shards should be run with the same inputs'.format(shard, manifest['num_records'], expected))
+        return shards, manifests
+
+    def _merge_outputs(self, shards, manifests, out_paths):
+        """
+        Concatenate parts of shard outputs written for each record, in the order of the input
+        :return: List of merged record IDs
+        """
+        readers = [ShardReader(shard, manifest) for shard, manifest in zip(shards, manifests)]
+        out_fds = [open(path, 'wb') for path in out_paths]
+        has_header = [False] * len(out_paths)
+        record_ids = []
+        num_records = sum(m['num_records'] for m in manifests)
+        try:
+            for i in range(num_records):
+                reader = readers[i % len(readers)]
+                entry = reader.next_record()
+                record_ids.append(entry['id'])
+                for j, output in enumerate(reader.manifest['outputs']):
+                    has_header[j] |= reader.copy_record(output, entry, out_fds[j], skip_header=has_header[j])
+        finally:
+            for reader in readers:
+                reader.close()
+            for fd in out_fds:
+                fd.close()
+        for path in out_paths:
+            logging.info('Merged %s', path)
+        return record_ids
+
+    def _render_plots(self, plot_writers, record_ids, score_store_path, cluster_tsv_path):
+        """
+        Render evaluation plots of merged records from the merged score store and BGC table
+        """
+        logging.info('Rendering evaluation plots')
+        region_writers = [w for w in plot_writers if w.get_name() == 'bgc-region-plot']
+        score_writers = [w for w in plot_writers if w.get_name() != 'bgc-region-plot']
+        scores = read_score_store(score_store_path) if score_store_path and os.path.exists(score_store_path) else iter([])
+        clusters = self._iter_table_groups(cluster_tsv_path)
+        next_scores = next(scores, None)
+        next_clusters = next(clusters, None)
+        # Scores and BGCs are saved only for some records, in the same order
+        for record_id in record_ids:
+            description = None
+            if next_scores is not None and next_scores.id == record_id:
+                description = next_scores.description
+                pfam_scores = get_pfam_score_table(next_scores)
+                if not pfam_scores.empty:
+                    for writer in score_writers:
+                        writer.write_scores(util.format_record_title(record_id, description), pfam_scores, next_scores.detectors)
+                next_scores = next(scores, None)
+            record_clusters = pd.DataFrame()
+            if next_clusters is not None and next_clusters[0] == record_id:
+                record_clusters = next_clusters[1]
+                next_clusters = next(clusters, None)
+            for writer in region_writers:
+                writer.write_clusters(util.format_record_title(record_id, description), record_clusters)
+        for writer in plot_writers:
+            writer.close()
+
+    def _iter_table_groups(self, path, column='sequence_id'):
+        """
+        Read table by chunks and yield consecutive rows with the same value of given column
+        :return: Generator of tuples (value, DataFrame)
+        """
+        if not path or not os.path.exists(path) or not os.path.getsize(path):
+            return
+        pending = None
+        for chunk in pd.read_csv(path, sep='\t', dtype={column: str}, chunksize=self.TABLE_CHUNK_SIZE):
+            if pending is not None:
+                chunk = pd.concat([pending, chunk], sort=False)
+            values = chunk[column].values
+            starts = np.concatenate([[0], np.flatnonzero(values[1:] != values[:-1]) + 1])
+            ends = np.concatenate([starts[1:], [len(values)]])
+            # Last group can continue in the next chunk
+            for start, end in zip(starts[:-1], ends[:-1]):
+                yield values[start], chunk.iloc[start:end].reset_index(drop=True)
+            pending = chunk.iloc[starts[-1]:]
+        if pending is not None and len(pending):
+            yield pending[column].values[0], pending.reset_index(drop=True)
@@ -6,24 +6,23 @@ from __future__ import (
 
 import logging
 
-import deepbgc.util
 from deepbgc.command.base import BaseCommand
 import os
 from deepbgc import util
 from Bio import SeqIO
 
-from deepbgc.output.bgc_genbank import BGCGenbankWriter
-from deepbgc.output.evaluation.pr_plot import PrecisionRecallPlotWriter
-from deepbgc.output.evaluation.roc_plot import ROCPlotWriter
+from deepbgc.input import read_inputs, count_records, parse_shard, strip_compressed_extension
 from deepbgc.output.readme import ReadmeWriter
-from deepbgc.pipeline.annotator import DeepBGCAnnotator
+from deepbgc.output.evaluation.plot_writer import PlotRenderPool, MAX_PLOT_SEQUENCES
+from deepbgc.output.journal import RecordJournal
+from deepbgc.output.registry import OUTPUT_WRITERS, parse_outputs, is_plot_output, create_output_writers
+from deepbgc.output.shard import save_shard_manifest
+from deepbgc.output.tables import RecordTables, get_required_tables
+from deepbgc.pipeline.annotator import DeepBGCAnnotator, HMMSEARCH_MIN_PROTEINS
+from deepbgc.pipeline.pfam import PFAM_SEARCH_BACKENDS, get_reduced_pfam_db
 from deepbgc.pipeline.detector import DeepBGCDetector
 from deepbgc.pipeline.classifier import DeepBGCClassifier
 from deepbgc.output.genbank import GenbankWriter
-from deepbgc.output.evaluation.bgc_region_plot import BGCRegionPlotWriter
-from deepbgc.output.cluster_tsv import ClusterTSVWriter
-from deepbgc.output.evaluation.pfam_score_plot import PfamScorePlotWriter
-from deepbgc.output.pfam_tsv import PfamTSVWriter
 
 
 class PipelineCommand(BaseCommand):
@@ -49,15 +48,44 @@ Examples:
     LOG_FILENAME = 'LOG.txt'
     PLOT_DIRNAME = 'evaluation'
     TMP_DIRNAME = 'tmp'
+    JOURNAL_FILENAME = 'checkpoint.jsonl'
 
     def add_arguments(self, parser):
 
-        parser.add_argument(dest='inputs', nargs='+', help="Input sequence file path (FASTA, GenBank, Pfam CSV).")
+        parser.add_argument(dest='inputs', nargs='+', help="Input sequence file path (FASTA, GenBank, Pfam CSV/TSV, optionally gzip compressed).")
 
         parser.add_argument('-o', '--output', required=False, help="Custom output directory path.")
         parser.add_argument('--limit-to-record', action='append', help="Process only specific record ID. Can be provided multiple times.")
+        parser.add_argument('--shard', required=False,
+                            help="Process only every N-th input record starting from the i-th record, given as \"i/N\", "
+                                 "used to split a run across multiple machines.")
+        parser.add_argument('--pfam-backend', default='hmmscan', choices=list(PFAM_SEARCH_BACKENDS),
+                            help="Pfam domain search backend: HMMER hmmscan or hmmsearch subprocess or in-process pyhmmer (needs pyhmmer package).")
+        parser.add_argument('--pfam-cpus', type=int, help="Number of CPUs used for Pfam domain search (HMMER default by default).")
+        parser.add_argument('--hmmsearch-min-proteins', default=HMMSEARCH_MIN_PROTEINS, type=int,
+                            help="Search Pfam domains using HMMER hmmsearch instead of hmmscan in records with at least given number of proteins "
+                                 "(default: %(default)s, use 0 to disable).")
+        parser.add_argument('--prefilter-pfam', action='store_true', default=False,
+                            help="Search only Pfam profiles used by the selected detection and classification models "
+                                 "(reduced Pfam DB is created and cached in the downloads directory).")
+        parser.add_argument('--batch-records', default=16, type=int,
+                            help="Number of records processed together, BGCs from all records in a batch are classified at once "
+                                 "(default: %(default)s).")
+        parser.add_argument('--checkpoint', action='store_true', default=False,
+                            help="Save outputs of each completed record to disk and record it in a journal, "
+                                 "so that an interrupted run can be continued using --resume.")
+        parser.add_argument('--resume', action='store_true', default=False,
+                            help="Resume an interrupted --checkpoint run with the same inputs and options in the same output directory, "
+                                 "skipping records that were already completed.")
+        parser.add_argument('--continue', dest='is_continue', action='store_true', default=False,
+                            help="Continue from output of a previous run: Skip detectors and classifiers already applied "
+                                 "with the same label, model version and parameters, and re-detect BGCs from stored scores "
+                                 "if only the detection thresholds changed.")
         parser.add_argument('--minimal-output', dest='is_minimal_output', action='store_true', default=False,
                             help="Produce minimal output with just the GenBank sequence file.")
+        parser.add_argument('--outputs', required=False,
+                            help="Comma-separated names of outputs to produce in given order ({}), all outputs by default. "
+                                 "Plotting libraries are loaded only if a plot output is enabled.".format(', '.join(OUTPUT_WRITERS)))
         group = parser.add_argument_group('BGC detection options', '')
         no_models_message = 'run "deepbgc download" to download models'
         detector_names = util.get_available_models('detector')
@@ -84,17 +112,35 @@ Examples:
         group.add_argument('--no-classifier', action='store_true', help="Disable BGC classification.")
         group.add_argument('--classifier-score', default=0.5, type=float,
                             help="DeepBGC classification score threshold for assigning classes to BGCs (inclusive).")
+        group.add_argument('--classifier-jobs', type=int,
+                            help="Number of threads used for BGC classification (-1 = all cores, model default by default).")
+        group.add_argument('--classifier-compact', action='store_true', default=False,
+                            help="Classify BGCs using random forests compiled into compact flat arrays (same scores, faster prediction). "
+                                 "The compiled model is saved next to the model file and reused on next runs.")
 
     def run(self, inputs, output, detectors, no_detector, labels, classifiers, no_classifier,
             is_minimal_output, limit_to_record, score, classifier_score, merge_max_protein_gap, merge_max_nucl_gap, min_nucl,
-            min_proteins, min_domains, min_bio_domains):
+            min_proteins, min_domains, min_bio_domains, pfam_backend, pfam_cpus, hmmsearch_min_proteins, prefilter_pfam, batch_records, classifier_jobs, classifier_compact,
+            checkpoint, resume, is_continue, shard, outputs):
+        shard = parse_shard(shard) if shard else None
+        outputs = parse_outputs(outputs, is_minimal_output=is_minimal_output)
+        # Plots need all records, they are rendered when merging the shards (see "deepbgc merge")
+        plot_outputs = [name for name in outputs if is_plot_output(name)]
+        if shard:
+            outputs = [name for name in outputs if not is_plot_output(name)]
+        if (checkpoint or resume) and 'genbank' not in outputs and any(is_plot_output(name) for name in outputs):
+            # Plots keep their state in memory, completed records are replayed from the GenBank output when resuming
+            raise ValueError('Plot outputs can be resumed only together with the "genbank" output',
+                             'Add "genbank" to --outputs or remove the plot outputs when using --checkpoint or --resume.')
         if not detectors:
             detectors = ['deepbgc']
         if not classifiers:
             classifiers = ['product_class', 'product_activity']
         if not output:
             # if not specified, set output path to name of first input file without extension
-            output, _ = os.path.splitext(os.path.basename(os.path.normpath(inputs[0])))
+            output, _ = os.path.splitext(os.path.basename(strip_compressed_extension(os.path.normpath(inputs[0]))))
+            if shard:
+                output += '.shard-{}-of-{}'.format(*shard)
 
         if not os.path.exists(output):
             os.mkdir(output)
@@ -108,83 +154,180 @@ Examples:
         evaluation_path = os.path.join(output, self.PLOT_DIRNAME)
         output_file_name = os.path.basename(os.path.normpath(output))
 
-        steps = []
-        steps.append(DeepBGCAnnotator(tmp_dir_path=tmp_path))
-        if not no_detector:
-            if not labels:
-                labels = [None] * len(detectors)
-            elif len(labels) != len(detectors):
-                raise ValueError('A separate label should be provided for each of the detectors: {}'.format(detectors))
-
-            for detector_name, label in zip(detectors, labels):
-                steps.append(DeepBGCDetector(
-                    detector=detector_name,
-                    label=label,
-                    score_threshold=score,
-                    merge_max_protein_gap=merge_max_protein_gap,
-                    merge_max_nucl_gap=merge_max_nucl_gap,
-                    min_nucl=min_nucl,
-                    min_proteins=min_proteins,
-                    min_domains=min_domains,
-                    min_bio_domains=min_bio_domains
-                ))
-
-        writers = []
-        writers.append(GenbankWriter(out_path=os.path.join(output, output_file_name+'.full.gbk')))
-        is_evaluation = False
-        if not is_minimal_output:
-            writers.append(BGCGenbankWriter(out_path=os.path.join(output, output_file_name+'.bgc.gbk')))
-            writers.append(ClusterTSVWriter(out_path=os.path.join(output, output_file_name+'.bgc.tsv')))
-            writers.append(PfamTSVWriter(out_path=os.path.join(output, output_file_name+'.pfam.tsv')))
-
-            is_evaluation = True
-            writers.append(PfamScorePlotWriter(out_path=os.path.join(evaluation_path, output_file_name + '.score.png')))
-            writers.append(BGCRegionPlotWriter(out_path=os.path.join(evaluation_path, output_file_name+'.bgc.png')))
-            writers.append(ROCPlotWriter(out_path=os.path.join(evaluation_path, output_file_name+'.roc.png')))
-            writers.append(PrecisionRecallPlotWriter(out_path=os.path.join(evaluation_path, output_file_name+'.pr.png')))
-
-        writers.append(ReadmeWriter(out_path=os.path.join(output, 'README.txt'), root_path=output, writers=writers))
-
-        if not no_classifier:
-            for classifier_name in classifiers:
-                steps.append(DeepBGCClassifier(classifier=classifier_name, score_threshold=classifier_score))
-
-        # Create temp and evaluation dir
-        if not os.path.exists(tmp_path):
-            os.mkdir(tmp_path)
+        is_evaluation = bool(plot_outputs) and not shard
+        render_pool = None
         if is_evaluation:
-            if not os.path.exists(evaluation_path):
-                os.mkdir(evaluation_path)
-
-        record_idx = 0
-        for input_path in inputs:
-            fmt = deepbgc.util.guess_format(input_path)
-            if not fmt:
-                raise NotImplementedError("Sequence file type not recognized: {}, ".format(input_path),
-                                          "Please provide a GenBank or FASTA sequence "
-                                          "with an appropriate file extension.")
-            records = SeqIO.parse(input_path, fmt)
-            for record in records:
-                if limit_to_record and record.id not in limit_to_record:
-                    logging.debug('Skipping record %s not matching filter %s', record.id, limit_to_record)
-                    continue
+            # Plots are rendered in background processes, forked before loading the models. Rendering overlaps with
+            # processing only in inputs with more records than fit into a plot, smaller inputs are plotted directly.
+            num_records = count_records(inputs, limit=MAX_PLOT_SEQUENCES + 1)
+            if num_records is None or num_records > MAX_PLOT_SEQUENCES:
+                render_pool = PlotRenderPool(processes=len(plot_outputs))
+            else:
+                logging.debug('Rendering plots of %s records directly', num_records)
+
+        try:
+            steps = []
+            if not no_detector:
+                if not labels:
+                    labels = [None] * len(detectors)
+                elif len(labels) != len(detectors):
+                    raise ValueError('A separate label should be provided for each of the detectors: {}'.format(detectors))
+
+                for detector_name, label in zip(detectors, labels):
+                    steps.append(DeepBGCDetector(
+                        detector=detector_name,
+                        label=label,
+                        score_threshold=score,
+                        merge_max_protein_gap=merge_max_protein_gap,
+                        merge_max_nucl_gap=merge_max_nucl_gap,
+                        min_nucl=min_nucl,
+                        min_proteins=min_proteins,
+                        min_domains=min_domains,
+                        min_bio_domains=min_bio_domains,
+                        skip_unchanged=is_continue
+                    ))
+
+            writers = create_output_writers(outputs, output, evaluation_path, output_file_name, render_pool=render_pool)
+            writers.append(ReadmeWriter(out_path=os.path.join(output, 'README.txt'), root_path=output, writers=writers))
+
+            if not no_classifier:
+                for classifier_name in classifiers:
+                    steps.append(DeepBGCClassifier(classifier=classifier_name, score_threshold=classifier_score,
+                                                   n_jobs=classifier_jobs, compact=classifier_compact,
+                                                   skip_unchanged=is_continue))
+
+            pfam_db_path, pfam_num_profiles = None, None
+            if prefilter_pfam:
+                pfam_db_path, pfam_num_profiles = self._get_reduced_pfam_db(steps)
+
+            # Annotator is created after loading the models, since it can depend on them
+            steps.insert(0, DeepBGCAnnotator(
+                tmp_dir_path=tmp_path,
+                pfam_backend=pfam_backend,
+                pfam_cpus=pfam_cpus,
+                hmmsearch_min_proteins=hmmsearch_min_proteins,
+                pfam_db_path=pfam_db_path,
+                pfam_num_profiles=pfam_num_profiles
+            ))
 
+            # Create temp and evaluation dir
+            if not os.path.exists(tmp_path):
+                os.mkdir(tmp_path)
+            if is_evaluation:
+                if not os.path.exists(evaluation_path):
+                    os.mkdir(evaluation_path)
+
+            if batch_records < 1:
+                raise ValueError('Number of records in a batch should be at least 1, got {}'.format(batch_records))
+
+            journal = None
+            # Shard outputs are merged using offsets of each record saved in the journal
+            if checkpoint or resume or shard:
+                # Outputs are synced to disk after each record only when the run can be resumed
+                journal = RecordJournal(os.path.join(tmp_path, self.JOURNAL_FILENAME), resume=resume,
+                                        sync=checkpoint or resume)
+                if len(journal):
+                    self._resume_writers(journal, writers)
+
+            batch = []
+            record_idx = 0
+            for record in read_inputs(inputs, record_ids=limit_to_record, shard=shard):
                 record_idx += 1
-                logging.info('='*80)
-                logging.info('Processing record #%s: %s', record_idx, record.id)
-                for step in steps:
-                    step.run(record)
+                if journal and journal.is_completed(record_idx, record):
+                    logging.info('Skipping record #%s: %s completed in previous run', record_idx, record.id)
+                    continue
+                logging.info('Loaded record #%s: %s', record_idx, record.id)
+                batch.append(record)
+                if len(batch) >= batch_records:
+                    self._process_batch(batch, steps, writers, journal, first_ordinal=record_idx - len(batch) + 1)
+                    batch = []
 
-                logging.info('Saving processed record %s', record.id)
-                for writer in writers:
-                    writer.write(record)
+            if batch:
+                self._process_batch(batch, steps, writers, journal, first_ordinal=record_idx - len(batch) + 1)
 
-        logging.info('=' * 80)
-        for step in steps:
-            step.print_summary()
+            logging.info('=' * 80)
+            for step in steps:
+                step.print_summary()
 
-        for writer in writers:
-            writer.close()
+            for writer in writers:
+                writer.close()
+            if render_pool:
+                render_pool.wait()
+        finally:
+            if render_pool:
+                # Stop the workers also when the run fails
+                render_pool.terminate()
+
+        if shard:
+            save_shard_manifest(output, output_file_name, shard, journal, writers, plots=plot_outputs)
+        elif journal:
+            # Run is complete, outputs no longer need to be resumed
+            journal.close(remove=True)
 
         logging.info('='*80)
         logging.info('Saved DeepBGC result to: {}'.format(output))
+
+    def _process_batch(self, records, steps, writers, journal=None, first_ordinal=None):
+        """
+        Run all pipeline steps on a batch of records and save the processed records
+        :param records: List of records
+        :param steps: List of pipeline steps
+        :param writers: List of output writers
+        :param journal: RecordJournal to record each completed record in, or None
+        :param first_ordinal: Ordinal number of the first record in the input, used in the journal
+        """
+        logging.info('='*80)
+        logging.info('Processing batch of %s records: %s', len(records), ', '.join(record.id for record in records))
+        for step in steps:
+            step.run_batch(records)
+
+        # Tables derived from each record are computed once and shared by all writers that need them
+        required_tables = get_required_tables(writers)
+        for i, record in enumerate(records):
+            logging.info('Saving processed record %s', record.id)
+            tables = RecordTables(record, required_tables)
+            for writer in writers:
+                writer.write(record, tables=tables)
+            if journal:
+                journal.append(first_ordinal + i, record, writers)
+
+    def _resume_writers(self, journal, writers):
+        """
+        Continue writing outputs from the last checkpoint of an interrupted run
+        :param journal: RecordJournal of the interrupted run
+        :param writers: List of output writers
+        """
+        logging.info('=' * 80)
+        logging.info('Resuming run after %s completed records', len(journal))
+        checkpoints = journal.get_last_checkpoints()
+        replay_writers = []
+        for writer in writers:
+            if writer.out_path in checkpoints:
+                writer.resume(checkpoints[writer.out_path])
+            else:
+                replay_writers.append(writer)
+
+        genbank_writer = [w for w in writers if isinstance(w, GenbankWriter) and w.out_path in checkpoints]
+        if replay_writers and genbank_writer:
+            # Writers that keep their state in memory get the completed records from the resumed GenBank output
+            for record in SeqIO.parse(genbank_writer[0].write_path, 'genbank'):
+                for writer in replay_writers:
+                    writer.write(record)
+
+    def _get_reduced_pfam_db(self, model_steps):
+        """
+        Get Pfam DB reduced to Pfam profiles used by given detector and classifier steps
+        :param model_steps: List of DeepBGCDetector and DeepBGCClassifier steps
+        :return: Tuple (reduced Pfam DB path, number of profiles in full Pfam DB) or (None, None) if not possible
+        """
+        if not model_steps:
+            logging.warning('No models used, not prefiltering Pfam profiles')
+            return None, None
+        pfam_ids = set(util.ANTISMASH_BIO_PFAMS)
+        for step in model_steps:
+            vocabulary = step.model.get_pfam_vocabulary()
+            if vocabulary is None:
+                logging.warning('Not prefiltering Pfam profiles, model %s can use any Pfam ID', step.model_path)
+                return None, None
+            pfam_ids.update(vocabulary)
+        return get_reduced_pfam_db(pfam_ids, [step.model_path for step in model_steps])
@@ -8,13 +8,14 @@ import logging
 
 from deepbgc import util
 from deepbgc.command.base import BaseCommand
-from Bio import SeqIO
 import os
 import shutil
 
+from deepbgc.input import read_records
 from deepbgc.output.genbank import GenbankWriter
 from deepbgc.output.pfam_tsv import PfamTSVWriter
-from deepbgc.pipeline.annotator import DeepBGCAnnotator
+from deepbgc.pipeline.annotator import DeepBGCAnnotator, HMMSEARCH_MIN_PROTEINS
+from deepbgc.pipeline.pfam import PFAM_SEARCH_BACKENDS
 
 
 class PrepareCommand(BaseCommand):
@@ -31,12 +32,18 @@ Examples:
   """
 
     def add_arguments(self, parser):
-        parser.add_argument(dest='inputs', nargs='+', help="Input sequence file path(s) (FASTA/GenBank).")
+        parser.add_argument(dest='inputs', nargs='+', help="Input sequence file path(s) (FASTA/GenBank, optionally gzip compressed).")
+        parser.add_argument('--pfam-backend', default='hmmscan', choices=list(PFAM_SEARCH_BACKENDS),
+                            help="Pfam domain search backend: HMMER hmmscan or hmmsearch subprocess or in-process pyhmmer (needs pyhmmer package).")
+        parser.add_argument('--pfam-cpus', type=int, help="Number of CPUs used for Pfam domain search (HMMER default by default).")
+        parser.add_argument('--hmmsearch-min-proteins', default=HMMSEARCH_MIN_PROTEINS, type=int,
+                            help="Search Pfam domains using HMMER hmmsearch instead of hmmscan in records with at least given number of proteins "
+                                 "(default: %(default)s, use 0 to disable).")
         group = parser.add_argument_group('required arguments', '')
         group.add_argument('--output-gbk', required=False, help="Output GenBank file path.")
         group.add_argument('--output-tsv', required=False, help="Output TSV file path.")
 
-    def run(self, inputs, output_gbk, output_tsv):
+    def run(self, inputs, output_gbk, output_tsv, pfam_backend, pfam_cpus, hmmsearch_min_proteins):
         first_output = output_gbk or output_tsv
         if not first_output:
             raise ValueError('Specify at least one of --output-gbk or --output-tsv')
@@ -46,7 +53,8 @@ Examples:
         if not os.path.exists(tmp_dir_path):
             os.mkdir(tmp_dir_path)
 
-        prepare_step = DeepBGCAnnotator(tmp_dir_path=tmp_dir_path)
+        prepare_step = DeepBGCAnnotator(tmp_dir_path=tmp_dir_path, pfam_backend=pfam_backend,
+                                        pfam_cpus=pfam_cpus, hmmsearch_min_proteins=hmmsearch_min_proteins)
 
         writers = []
         if output_gbk:
@@ -56,12 +64,7 @@ Examples:
 
         num_records = 0
         for input_path in inputs:
-            fmt = util.guess_format(input_path)
-            if not fmt:
-                raise NotImplementedError("Sequence file type not recognized: {}, ".format(input_path),
-                                          "Please provide a GenBank or FASTA sequence "
-                                          "with an appropriate file extension.")
-            records = SeqIO.parse(input_path, fmt)
+            records = read_records(input_path)
             for record in records:
                 prepare_step.run(record)
                 for writer in writers:
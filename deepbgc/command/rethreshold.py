@@ -0,0 +1,272 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import collections
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from Bio import SeqIO
+
+from deepbgc import util
+from deepbgc.command.base import BaseCommand
+from deepbgc.output.bgc_genbank import BGCGenbankWriter
+from deepbgc.output.cluster_tsv import ClusterTSVWriter
+from deepbgc.output.genbank import GenbankWriter
+from deepbgc.output.score_store import read_score_store, get_protein_scores_key
+from deepbgc.pipeline.detector import detect_clusters, create_cluster_feature
+from deepbgc.vocabulary import get_pfam_vocabulary
+
+
+class RethresholdCommand(BaseCommand):
+    command = 'rethreshold'
+
+    help = """Detect BGCs using different thresholds from scores saved by a previous pipeline run, without running the models.
+
+Examples:
+
+  # Show detailed help
+  deepbgc rethreshold --help
+
+  # Detect BGCs using a stricter score threshold, other parameters are kept from the original run
+  deepbgc rethreshold --score 0.9 --output sequence_90/ sequence/sequence.scores.bin
+
+  # Also create the GenBank outputs with the new BGCs
+  deepbgc rethreshold --score 0.9 --output sequence_90/ --genbank sequence/sequence.full.gbk sequence/sequence.scores.bin
+  """
+
+    # Type of each segmentation parameter, used to parse values saved in the record metadata
+    PARAM_TYPES = collections.OrderedDict([
+        ('score_threshold', float),
+        ('merge_max_nucl_gap', int),
+        ('merge_max_protein_gap', int),
+        ('min_nucl', int),
+        ('min_proteins', int),
+        ('min_domains', int),
+        ('min_bio_domains', int)
+    ])
+
+    def add_arguments(self, parser):
+        parser.add_argument(dest='scores', help="Score store file path (*.scores.bin in the pipeline output directory).")
+        parser.add_argument('-o', '--output', required=True, help="Output directory path.")
+        parser.add_argument('-l', '--label', dest='labels', action='append', default=[],
+                            help="Detector label to apply the new parameters to (all labels by default). "
+                                 "Can be provided multiple times.")
+        parser.add_argument('--genbank', required=False,
+                            help="Full GenBank output of the original run (*.full.gbk), used to create the GenBank outputs with the new BGCs.")
+        group = parser.add_argument_group('BGC detection options', 'Values from the original run are used by default.')
+        group.add_argument('-s', '--score', type=float,
+                           help="Average protein-wise DeepBGC score threshold for extracting BGC regions from Pfam sequences.")
+        group.add_argument('--merge-max-protein-gap', type=int, help="Merge detected BGCs within given number of proteins.")
+        group.add_argument('--merge-max-nucl-gap', type=int, help="Merge detected BGCs within given number of nucleotides.")
+        group.add_argument('--min-nucl', type=int, help="Minimum BGC nucleotide length.")
+        group.add_argument('--min-proteins', type=int, help="Minimum number of proteins in a BGC.")
+        group.add_argument('--min-domains', type=int, help="Minimum number of protein domains in a BGC.")
+        group.add_argument('--min-bio-domains', type=int, help="Minimum number of known biosynthetic protein domains in a BGC (from antiSMASH ClusterFinder).")
+
+    def run(self, scores, output, labels, genbank, score, merge_max_protein_gap, merge_max_nucl_gap, min_nucl,
+            min_proteins, min_domains, min_bio_domains):
+        new_params = dict(
+            score_threshold=score,
+            merge_max_nucl_gap=merge_max_nucl_gap,
+            merge_max_protein_gap=merge_max_protein_gap,
+            min_nucl=min_nucl,
+            min_proteins=min_proteins,
+            min_domains=min_domains,
+            min_bio_domains=min_bio_domains
+        )
+        new_params = {param: value for param, value in new_params.items() if value is not None}
+
+        if not os.path.exists(output):
+            os.mkdir(output)
+        output_file_name = os.path.basename(os.path.normpath(output))
+        tsv_path = os.path.join(output, output_file_name + '.bgc.tsv')
+
+        num_records = 0
+        num_detected = 0
+        if genbank:
+            writers = [
+                GenbankWriter(out_path=os.path.join(output, output_file_name + '.full.gbk')),
+                BGCGenbankWriter(out_path=os.path.join(output, output_file_name + '.bgc.gbk')),
+                ClusterTSVWriter(out_path=tsv_path)
+            ]
+            record_scores = read_score_store(scores)
+            next_scores = next(record_scores, None)
+            for record in SeqIO.parse(genbank, 'genbank'):
+                if next_scores is not None and next_scores.id == record.id:
+                    num_detected += self._update_record(record, next_scores, labels, new_params)
+                    next_scores = next(record_scores, None)
+                    num_records += 1
+                for writer in writers:
+                    writer.write(record)
+            for writer in writers:
+                writer.close()
+            if next_scores is not None:
+                raise ValueError('Record {} from score store not found in GenBank file, '
+                                 'provide the full GenBank output of the same run'.format(next_scores.id))
+        else:
+            tables = []
+            for record_scores in read_score_store(scores):
+                clusters = self._get_cluster_table(record_scores, labels, new_params)
+                tables.append(clusters)
+                num_detected += len(clusters)
+                num_records += 1
+            clusters = pd.concat(tables, sort=False) if tables else pd.DataFrame()
+            clusters.to_csv(tsv_path, index=False, sep='\t')
+
+        logging.info('=' * 80)
+        logging.info('Detected %s total BGCs in %s records', num_detected, num_records)
+        logging.info('Saved result to: %s', output)
+
+    def _get_params(self, meta, labels, new_params):
+        """
+        Get segmentation parameters of given detector, using values from the original run if not overridden
+        """
+        params = collections.OrderedDict()
+        for param, param_type in self.PARAM_TYPES.items():
+            # Values are strings if the original run was done on a GenBank file,
+            # parameters not saved by older versions are left at their defaults
+            if meta.get(param) is not None:
+                params[param] = param_type(meta[param])
+        if not labels or meta['label'] in labels:
+            params.update(new_params)
+        return params
+
+    def _detect_clusters(self, record_scores, meta, params):
+        """
+        Detect clusters from scores of given detector saved in the score store
+        :return: Tuple of arrays (start, end, score) of each cluster
+        """
+        arrays = record_scores.arrays
+        protein_scores = arrays[get_protein_scores_key(meta['label'])]
+        # Proteins without Pfam domains have no BGC score, ignore them
+        scored_idx = np.flatnonzero(~np.isnan(protein_scores))
+        scored_pos = np.full(len(protein_scores), -1, dtype=np.int64)
+        scored_pos[scored_idx] = np.arange(len(scored_idx))
+        pfam_protein_idx = arrays['pfam_protein_idx']
+        pfam_protein_idx = np.where(pfam_protein_idx >= 0, scored_pos[pfam_protein_idx], -1)
+        has_protein = pfam_protein_idx >= 0
+        pfam_codes = get_pfam_vocabulary().encode([pfam_id or None for pfam_id in arrays['pfam_ids'][has_protein]])
+
+        first_idx, last_idx, cluster_scores = detect_clusters(
+            starts=arrays['protein_starts'][scored_idx],
+            ends=arrays['protein_ends'][scored_idx],
+            scores=protein_scores[scored_idx],
+            pfam_protein_idx=pfam_protein_idx[has_protein],
+            pfam_codes=pfam_codes,
+            **params
+        )
+        return arrays['protein_starts'][scored_idx[first_idx]], arrays['protein_ends'][scored_idx[last_idx]], cluster_scores
+
+    def _update_record(self, record, record_scores, labels, new_params):
+        """
+        Replace clusters of all re-detected labels in given record
+        :return: Number of detected clusters
+        """
+        num_detected = 0
+        comments = record.annotations.setdefault('structured_comment', collections.OrderedDict())
+        for meta in record_scores.detectors:
+            params = self._get_params(meta, labels, new_params)
+            starts, ends, cluster_scores = self._detect_clusters(record_scores, meta, params)
+            num_removed = len(record.features)
+            record.features = [f for f in record.features if
+                               not (f.type == 'cluster' and f.qualifiers.get('detector_label') == [meta['label']])]
+            num_removed -= len(record.features)
+            if num_removed and util.get_record_classifier_meta(record):
+                logging.warning('Classification of %s original BGCs with label "%s" is not preserved in %s',
+                                num_removed, meta['label'], record.id)
+            for start, end, cluster_score in zip(starts, ends, cluster_scores):
+                record.features.append(create_cluster_feature(
+                    record_id=record.id,
+                    start=int(start),
+                    end=int(end),
+                    score=cluster_score,
+                    detector_name=meta['name'],
+                    detector_label=meta['label'],
+                    version=meta['version'],
+                    version_timestamp=meta['version_timestamp']
+                ))
+            num_detected += len(starts)
+            new_meta = collections.OrderedDict(meta)
+            new_meta.update(params)
+            comments[util.format_detector_meta_key(meta['label'])] = new_meta
+        util.sort_record_features(record)
+        return num_detected
+
+    def _get_cluster_table(self, record_scores, labels, new_params):
+        """
+        Create table of clusters detected from saved scores, with the same columns as the BGC TSV output
+        (without classification columns)
+        :return: DataFrame with one cluster per row
+        """
+        arrays = record_scores.arrays
+        vocabulary = get_pfam_vocabulary()
+        pfam_codes = vocabulary.encode([pfam_id or None for pfam_id in arrays['pfam_ids']])
+        protein_index = _LocationIndex(arrays['protein_starts'], arrays['protein_ends'])
+        pfam_index = _LocationIndex(arrays['pfam_starts'], arrays['pfam_ends'])
+        rows = []
+        for meta in record_scores.detectors:
+            params = self._get_params(meta, labels, new_params)
+            starts, ends, cluster_scores = self._detect_clusters(record_scores, meta, params)
+            score_column = util.format_bgc_score_column(meta['name'])
+            for start, end, cluster_score in zip(starts, ends, cluster_scores):
+                protein_idx = protein_index.get_contained(start, end)
+                # Pfam domains of proteins fully inside the cluster, same as in util.extract_cluster_record
+                pfam_idx = pfam_index.get_contained(start, end)
+                pfam_protein_idx = arrays['pfam_protein_idx'][pfam_idx]
+                pfam_idx = pfam_idx[(pfam_protein_idx >= 0) & (arrays['pfam_ids'][pfam_idx] != '')]
+                pfam_protein_idx = arrays['pfam_protein_idx'][pfam_idx]
+                pfam_idx = pfam_idx[(arrays['protein_starts'][pfam_protein_idx] >= start)
+                                    & (arrays['protein_ends'][pfam_protein_idx] <= end)]
+                pfam_ids = list(arrays['pfam_ids'][pfam_idx])
+                bio_pfam_ids = vocabulary.decode(util.filter_biosynthetic_pfam_codes(pfam_codes[pfam_idx]))
+                row = collections.OrderedDict()
+                row['sequence_id'] = record_scores.id
+                row['detector'] = meta['name']
+                row['detector_version'] = meta['version']
+                row['detector_label'] = meta['label']
+                row['bgc_candidate_id'] = '{}_{}-{}.1'.format(record_scores.id, int(start), int(end))
+                row['nucl_start'] = int(start)
+                row['nucl_end'] = int(end)
+                row['nucl_length'] = int(end - start)
+                row['num_proteins'] = len(protein_idx)
+                row['num_domains'] = len(pfam_ids)
+                row['num_bio_domains'] = len(bio_pfam_ids)
+                row[score_column] = '{:.5f}'.format(cluster_score)
+                row['pfam_ids'] = ';'.join(pfam_ids)
+                row['bio_pfam_ids'] = ';'.join(bio_pfam_ids)
+                row['protein_ids'] = ';'.join(arrays['protein_ids'][protein_idx])
+                rows.append(row)
+        df = pd.DataFrame(rows)
+        if df.empty:
+            return df
+        # Same order as cluster features sorted by location
+        order = sorted(range(len(rows)), key=lambda i: (rows[i]['nucl_start'], -rows[i]['nucl_end']))
+        df = df.iloc[order].reset_index(drop=True)
+        for column in ['protein_ids', 'bio_pfam_ids', 'pfam_ids']:
+            util.move_column_to_end(df, column)
+        return df
+
+
+class _LocationIndex(object):
+    """
+    Features of a record sorted by start, to find features located within a cluster using binary search
+    """
+
+    def __init__(self, starts, ends):
+        self.order = np.argsort(starts, kind='mergesort')
+        self.sorted_starts = starts[self.order]
+        self.ends = ends
+
+    def get_contained(self, start, end):
+        """
+        :return: Sorted indexes of features with start >= given start and end <= given end
+        """
+        lo = np.searchsorted(self.sorted_starts, start, side='left')
+        hi = np.searchsorted(self.sorted_starts, end, side='right')
+        idx = self.order[lo:hi]
+        return np.sort(idx[self.ends[idx] <= end])
@@ -0,0 +1,183 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import collections
+import itertools
+import logging
+
+import numpy as np
+import pandas as pd
+
+from deepbgc.command.base import BaseCommand
+from deepbgc.output.score_store import read_score_store, get_protein_scores_key
+from deepbgc.pipeline.detector import detect_clusters, get_domain_index
+from deepbgc.vocabulary import get_pfam_vocabulary
+
+
+class SweepCommand(BaseCommand):
+    command = 'sweep'
+
+    help = """Evaluate a grid of BGC detection parameters using scores saved by pipeline runs, without running the models.
+
+For each detector label and combination of parameters, the number of detected BGCs is reported.
+In records with annotated BGCs, protein-level precision and recall of the detected BGCs is reported as well.
+
+Examples:
+
+  # Show detailed help
+  deepbgc sweep --help
+
+  # Evaluate 4 x 3 x 2 parameter combinations
+  deepbgc sweep --score 0.3 0.5 0.7 0.9 --merge-max-protein-gap 0 1 2 --min-proteins 1 2 --output sweep.tsv sequence/sequence.scores.bin
+  """
+
+    def add_arguments(self, parser):
+        parser.add_argument(dest='inputs', nargs='+', help="Score store file paths (*.scores.bin in the pipeline output directory).")
+        parser.add_argument('-o', '--output', required=True, help="Output TSV file path.")
+        parser.add_argument('-l', '--label', dest='labels', action='append', default=[],
+                            help="Evaluate only given detector label (all labels by default). Can be provided multiple times.")
+        group = parser.add_argument_group('BGC detection parameter grid', 'Multiple values can be provided for each parameter.')
+        group.add_argument('-s', '--score', nargs='+', default=[0.5], type=float,
+                           help="Average protein-wise DeepBGC score thresholds (default: %(default)s).")
+        group.add_argument('--merge-max-protein-gap', nargs='+', default=[0], type=int, help="Merge detected BGCs within given number of proteins (default: %(default)s).")
+        group.add_argument('--merge-max-nucl-gap', nargs='+', default=[0], type=int, help="Merge detected BGCs within given number of nucleotides (default: %(default)s).")
+        group.add_argument('--min-nucl', nargs='+', default=[1], type=int, help="Minimum BGC nucleotide length (default: %(default)s).")
+        group.add_argument('--min-proteins', nargs='+', default=[1], type=int, help="Minimum number of proteins in a BGC (default: %(default)s).")
+        group.add_argument('--min-domains', nargs='+', default=[1], type=int, help="Minimum number of protein domains in a BGC (default: %(default)s).")
+        group.add_argument('--min-bio-domains', nargs='+', default=[0], type=int, help="Minimum number of known biosynthetic protein domains in a BGC (default: %(default)s).")
+
+    def run(self, inputs, output, labels, score, merge_max_protein_gap, merge_max_nucl_gap, min_nucl, min_proteins,
+            min_domains, min_bio_domains):
+        grid = collections.OrderedDict([
+            ('score_threshold', score),
+            ('merge_max_protein_gap', merge_max_protein_gap),
+            ('merge_max_nucl_gap', merge_max_nucl_gap),
+            ('min_nucl', min_nucl),
+            ('min_proteins', min_proteins),
+            ('min_domains', min_domains),
+            ('min_bio_domains', min_bio_domains)
+        ])
+        param_sets = [collections.OrderedDict(zip(grid.keys(), values)) for values in itertools.product(*grid.values())]
+
+        sequences = load_concatenated_scores(inputs, labels)
+        if not sequences:
+            raise ValueError('No detector scores found in: {}'.format(', '.join(inputs)))
+
+        results = []
+        for label, sequence in sequences.items():
+            logging.info('Evaluating %s parameter combinations for %s in %s records with %s proteins',
+                         len(param_sets), label, sequence['num_records'], len(sequence['scores']))
+            for params in param_sets:
+                result = collections.OrderedDict(detector_label=label)
+                result.update(params)
+                result.update(evaluate_params(sequence, params))
+                results.append(result)
+
+        results = pd.DataFrame(results)
+        results.to_csv(output, index=False, sep='\t')
+        logging.info('=' * 80)
+        logging.info('Saved %s results to: %s', len(results), output)
+
+
+def load_concatenated_scores(paths, labels=None):
+    """
+    Load scored proteins of all records from given score stores, concatenated into a single sequence
+    for each detector label, so that each parameter combination can be evaluated in a single pass.
+    :param paths: List of score store paths
+    :param labels: List of detector labels to load, all labels by default
+    :return: Dictionary of {detector label: dict of concatenated arrays}
+    """
+    parts = collections.OrderedDict()
+    for path in paths:
+        for record_scores in read_score_store(path):
+            arrays = record_scores.arrays
+            # Proteins are considered to be in an annotated cluster if they start inside it
+            annotated_starts = arrays.get('annotated_starts', np.array([], dtype=np.int64))
+            annotated_ends = arrays.get('annotated_ends', np.array([], dtype=np.int64))
+            protein_starts = arrays['protein_starts']
+            in_annotated = ((protein_starts[:, None] >= annotated_starts[None, :])
+                            & (protein_starts[:, None] < annotated_ends[None, :])).any(axis=1)
+            for meta in record_scores.detectors:
+                label = meta['label']
+                if labels and label not in labels:
+                    continue
+                protein_scores = arrays[get_protein_scores_key(label)]
+                # Proteins without Pfam domains have no BGC score, ignore them
+                scored_idx = np.flatnonzero(~np.isnan(protein_scores))
+                scored_pos = np.full(len(protein_scores), -1, dtype=np.int64)
+                scored_pos[scored_idx] = np.arange(len(scored_idx))
+                pfam_protein_idx = arrays['pfam_protein_idx']
+                pfam_protein_idx = np.where(pfam_protein_idx >= 0, scored_pos[pfam_protein_idx], -1)
+                has_protein = pfam_protein_idx >= 0
+                parts.setdefault(label, []).append(dict(
+                    starts=protein_starts[scored_idx],
+                    ends=arrays['protein_ends'][scored_idx],
+                    scores=protein_scores[scored_idx],
+                    pfam_protein_idx=pfam_protein_idx[has_protein],
+                    pfam_ids=arrays['pfam_ids'][has_protein],
+                    in_annotated=in_annotated[scored_idx],
+                    is_annotated=np.full(len(scored_idx), len(annotated_starts) > 0)
+                ))
+
+    sequences = collections.OrderedDict()
+    vocabulary = get_pfam_vocabulary()
+    for label, record_parts in parts.items():
+        sizes = np.array([len(part['scores']) for part in record_parts], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        pfam_ids = np.concatenate([part['pfam_ids'] for part in record_parts])
+        pfam_protein_idx = np.concatenate([part['pfam_protein_idx'] + offset for part, offset in zip(record_parts, offsets)])
+        pfam_codes = vocabulary.encode([pfam_id or None for pfam_id in pfam_ids])
+        in_annotated = np.concatenate([part['in_annotated'] for part in record_parts])
+        is_annotated = np.concatenate([part['is_annotated'] for part in record_parts])
+        sequences[label] = dict(
+            num_records=len(record_parts),
+            breaks=offsets,
+            starts=np.concatenate([part['starts'] for part in record_parts]),
+            ends=np.concatenate([part['ends'] for part in record_parts]),
+            scores=np.concatenate([part['scores'] for part in record_parts]),
+            pfam_protein_idx=pfam_protein_idx,
+            pfam_codes=pfam_codes,
+            # Data that does not depend on the parameters is computed once and shared by all parameter combinations
+            domain_index=get_domain_index(pfam_protein_idx, pfam_codes, num_proteins=sizes.sum()),
+            num_annotated=int(in_annotated.sum()),
+            # Proteins in annotated records, and in annotated clusters, counted using prefix sums
+            annotated_cumsum=np.concatenate([[0], np.cumsum(is_annotated)]),
+            true_cumsum=np.concatenate([[0], np.cumsum(in_annotated)])
+        )
+    return sequences
+
+
+def evaluate_params(sequence, params):
+    """
+    Detect clusters in concatenated sequence using given parameters and evaluate them
+    :param sequence: Dictionary of concatenated arrays, see load_concatenated_scores
+    :param params: Dictionary of segmentation parameters, see detect_clusters
+    :return: Dictionary with number of BGCs and protein-level precision and recall in records with annotated BGCs
+    """
+    first_idx, last_idx, _ = detect_clusters(
+        starts=sequence['starts'],
+        ends=sequence['ends'],
+        scores=sequence['scores'],
+        pfam_protein_idx=sequence['pfam_protein_idx'],
+        pfam_codes=sequence['pfam_codes'],
+        breaks=sequence['breaks'],
+        domain_index=sequence['domain_index'],
+        **params
+    )
+    annotated_cumsum = sequence['annotated_cumsum']
+    true_cumsum = sequence['true_cumsum']
+    num_predicted = (annotated_cumsum[last_idx + 1] - annotated_cumsum[first_idx]).sum()
+    num_true_positive = (true_cumsum[last_idx + 1] - true_cumsum[first_idx]).sum()
+    num_true = sequence['num_annotated']
+
+    result = collections.OrderedDict()
+    result['num_bgcs'] = len(first_idx)
+    result['num_annotated_bgc_proteins'] = int(num_true)
+    result['num_detected_proteins'] = int(num_predicted)
+    result['num_true_positive_proteins'] = int(num_true_positive)
+    result['precision'] = num_true_positive / num_predicted if num_predicted else np.nan
+    result['recall'] = num_true_positive / num_true if num_true else np.nan
+    return result
@@ -4,10 +4,13 @@
 import logging
 
 import numpy as np
+from scipy import sparse
 from sklearn.base import BaseEstimator, TransformerMixin
 import pandas as pd
 import sys
 
+from deepbgc.vocabulary import PfamIndexMixin
+
 
 class ListTransformer(BaseEstimator, TransformerMixin):
     """
@@ -32,6 +35,19 @@ class ListTransformer(BaseEstimator, TransformerMixin):
             return pd.DataFrame(X_list)
         return X_list
 
+    def transform_sparse(self, samples):
+        """
+        Transform list of samples into a sparse matrix with one row per sample, in a single step for all samples.
+        Only supported in sequence_as_vector mode when all transformers support sparse output (see supports_sparse).
+        :param samples: List of Domain DataFrames
+        :return: scipy CSR matrix with one row per sample, or None if sparse transformation is not supported
+        """
+        if not self.sequence_as_vector or not self.transformers or not isinstance(samples, list):
+            return None
+        if not all(hasattr(t, 'supports_sparse') and t.supports_sparse() for t in self.transformers):
+            return None
+        return sparse.hstack([t.transform_sparse(samples) for t in self.transformers], format='csr')
+
     def _transform_sequence(self, sequence):
         if self.sequence_as_vector:
             # Output of each transformer should be a Series, merge into one long Series
@@ -53,6 +69,19 @@ class ListTransformer(BaseEstimator, TransformerMixin):
                 t.fit(X_merged, y_merged)
         return self
 
+    def get_pfam_vocabulary(self):
+        """
+        Get set of Pfam IDs that can affect the output of the transformers.
+        :return: Set of Pfam IDs, or None if any of the transformers can use an arbitrary Pfam ID.
+        """
+        vocabulary = set()
+        for t in self.transformers:
+            t_vocabulary = t.get_pfam_vocabulary() if hasattr(t, 'get_pfam_vocabulary') else None
+            if t_vocabulary is None:
+                return None
+            vocabulary.update(t_vocabulary)
+        return vocabulary
+
     @classmethod
     def from_config(cls, transformer_configs, sequence_as_vector=False):
         transformers = []
@@ -64,7 +93,7 @@ class ListTransformer(BaseEstimator, TransformerMixin):
         return ListTransformer(transformers, sequence_as_vector=sequence_as_vector)
 
 
-class Pfam2VecTransformer(BaseEstimator, TransformerMixin):
+class Pfam2VecTransformer(PfamIndexMixin, BaseEstimator, TransformerMixin):
     """
     Get pfam2vec matrix for a Domain DataFrame
     """
@@ -96,15 +125,16 @@ class Pfam2VecTransformer(BaseEstimator, TransformerMixin):
             raise ValueError('Pfam2vec vectors should be <= 1, got {} in {}'.format(list(vectors_max[too_high_idx]), cols_too_high))
 
     def transform(self, X):
-        # Turn each pfam ID into a vector
-
-        df = self.vectors.reindex(index=X['pfam_id'], fill_value=0)
-        df.index = X.index
-        return df
+        # Turn each pfam ID into a vector, unknown pfam IDs are indexed by -1 (zero vector)
+        positions = self._get_pfam_positions(X, self.vectors.index)
+        return pd.DataFrame(self._get_pfam_vectors(self.vectors)[positions], index=X.index, columns=self.vectors.columns)
 
     def fit(self, X, y=None):
         return self
 
+    def get_pfam_vocabulary(self):
+        return set(self.vectors.index)
+
 
 class RandomVecTransformer(BaseEstimator, TransformerMixin):
     """
@@ -129,8 +159,11 @@ class RandomVecTransformer(BaseEstimator, TransformerMixin):
                 self.vectors[pfam_id] = self.random.rand(self.dimensions)
         return self
 
+    def get_pfam_vocabulary(self):
+        return set(self.vectors.keys())
 
-class EmissionProbabilityTransformer(BaseEstimator, TransformerMixin):
+
+class EmissionProbabilityTransformer(PfamIndexMixin, BaseEstimator, TransformerMixin):
     """
     Get emission probability feature column for given Domain DataFrame. Based on HMM emissions.
     """
@@ -147,15 +180,20 @@ class EmissionProbabilityTransformer(BaseEstimator, TransformerMixin):
         counts = counts.fillna(0)
         # Divide each state's emission counts by the total number of observations to get emission frequency
         self.emissions = counts / counts.sum(axis=0)
+        self._reset_pfam_positions()
         return self
 
     def transform(self, X):
         # Turn each pfam ID into a vector
-        vectors = self.emissions.reindex(index=X['pfam_id'], fill_value=0)
-        return vectors
+        positions = self._get_pfam_positions(X, self.emissions.index)
+        return pd.DataFrame(self._get_pfam_vectors(self.emissions)[positions], index=pd.Index(X['pfam_id'].values),
+                            columns=self.emissions.columns)
+
+    def get_pfam_vocabulary(self):
+        return set(self.emissions.index)
 
 
-class PositiveProbabilityTransformer(BaseEstimator, TransformerMixin):
+class PositiveProbabilityTransformer(PfamIndexMixin, BaseEstimator, TransformerMixin):
     """
     Get "positive probability" feature columns for given Domain DataFrame.
     Each pfam_id will get two columns: Positive probability and Total probability
@@ -181,15 +219,20 @@ class PositiveProbabilityTransformer(BaseEstimator, TransformerMixin):
             pfam_frac = num_weighted / total_num_weighted
             probs[pfam_id] = [prob, pfam_frac]
         self.probs = pd.DataFrame(probs).transpose()
+        self._reset_pfam_positions()
         return self
 
     def transform(self, X):
         # Turn each pfam ID into a vector
-        vectors = self.probs.reindex(index=X['pfam_id'], fill_value=0)
-        return vectors
+        positions = self._get_pfam_positions(X, self.probs.index)
+        return pd.DataFrame(self._get_pfam_vectors(self.probs)[positions], index=pd.Index(X['pfam_id'].values),
+                            columns=self.probs.columns)
 
+    def get_pfam_vocabulary(self):
+        return set(self.probs.index)
 
-class OneHotEncodingTransformer(BaseEstimator, TransformerMixin):
+
+class OneHotEncodingTransformer(PfamIndexMixin, BaseEstimator, TransformerMixin):
     """
     Create a binary one-hot-encoding vector from Domain CSV files.
     If sequence_as_vector = True, will produce a set-encoding vector of the whole sequence. Otherwise will create one vector per each Pfam domain.
@@ -200,16 +243,55 @@ class OneHotEncodingTransformer(BaseEstimator, TransformerMixin):
         self.sequence_as_vector = sequence_as_vector
 
     def transform(self, X):
+        if self.column == 'pfam_id':
+            return self._transform_pfam_ids(X)
         # Turn each pfam ID into a vector
         values = pd.get_dummies(X[self.column]).reindex(columns=self.unique_values, fill_value=0)
         if self.sequence_as_vector:
             return pd.Series(values.sum().astype(np.bool).astype(np.int))
         return values
 
+    def _transform_pfam_ids(self, X):
+        positions = self._get_pfam_positions(X, self.unique_values)
+        known = positions >= 0
+        if self.sequence_as_vector:
+            vector = np.zeros(len(self.unique_values), dtype=int)
+            vector[positions[known]] = 1
+            return pd.Series(vector, index=self.unique_values)
+        matrix = np.zeros((len(X), len(self.unique_values)), dtype=np.uint8)
+        matrix[np.flatnonzero(known), positions[known]] = 1
+        return pd.DataFrame(matrix, index=X.index, columns=self.unique_values)
+
+    def supports_sparse(self):
+        return self.column == 'pfam_id' and self.sequence_as_vector
+
+    def transform_sparse(self, samples):
+        """
+        Create set-encoding vectors of given samples as a sparse matrix
+        :param samples: List of Domain DataFrames
+        :return: scipy CSR matrix with one row per sample and one column per unique value
+        """
+        codes = [self._get_pfam_positions(X, self.unique_values) for X in samples]
+        rows = np.repeat(np.arange(len(samples)), [len(c) for c in codes])
+        positions = np.concatenate(codes) if codes else np.array([], dtype=np.int64)
+        known = positions >= 0
+        matrix = sparse.csr_matrix((np.ones(known.sum(), dtype=int), (rows[known], positions[known])),
+                                   shape=(len(samples), len(self.unique_values)))
+        # Duplicate domains are summed, set-encoding only marks presence
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix
+
     def fit(self, X, y=None):
         self.unique_values = np.union1d(self.unique_values, X[self.column])
+        self._reset_pfam_positions()
         return self
 
+    def get_pfam_vocabulary(self):
+        if self.column != 'pfam_id':
+            return set()
+        return set(self.unique_values)
+
 
 class ProteinBorderTransformer(BaseEstimator, TransformerMixin):
     """
@@ -230,6 +312,9 @@ class ProteinBorderTransformer(BaseEstimator, TransformerMixin):
     def fit(self, X, y=None):
         return self
 
+    def get_pfam_vocabulary(self):
+        return set()
+
 
 class GeneDistanceTransformer(BaseEstimator, TransformerMixin):
     """
@@ -253,6 +338,9 @@ class GeneDistanceTransformer(BaseEstimator, TransformerMixin):
     def fit(self, X, y=None):
         return self
 
+    def get_pfam_vocabulary(self):
+        return set()
+
 class ColumnSelectTransformer(BaseEstimator, TransformerMixin):
     """
     Select given columns of input DataFrame
@@ -264,4 +352,9 @@ class ColumnSelectTransformer(BaseEstimator, TransformerMixin):
         return X.select(self.columns, axis=1).values
 
     def fit(self, X, y=None):
-        return self
\ No newline at end of file
+        return self
+
+    def get_pfam_vocabulary(self):
+        # Raw Pfam IDs can be selected as features
+        return None if 'pfam_id' in self.columns else set()
+
@@ -0,0 +1,2 @@
+from .reader import read_records, read_inputs, count_records, parse_shard, open_input, sniff_format, strip_compressed_extension
+from .index import RecordIndex
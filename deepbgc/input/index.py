@@ -0,0 +1,282 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import bisect
+import collections
+import io
+import logging
+import os
+
+from Bio import SeqIO, bgzf
+import six
+
+# Version of the index file format, indexes with a different version are rebuilt
+INDEX_VERSION = 1
+INDEX_EXTENSION = '.dbgcidx'
+# Start of the first line of each record
+RECORD_MARKERS = {
+    'fasta': b'>',
+    'genbank': b'LOCUS '
+}
+# Start of lines that end the GenBank header with the record ID
+GENBANK_HEADER_END_MARKERS = [b'\nFEATURES', b'\nORIGIN']
+# Size of blocks of uncompressed files scanned for records when building the index
+SCAN_BLOCK_SIZE = 4 * 1024 * 1024
+
+IndexEntry = collections.namedtuple('IndexEntry', ['id', 'offset', 'length'])
+
+
+def is_bgzf(path):
+    """
+    Check whether given file is BGZF compressed (bgzip), which allows random access unlike plain gzip
+    """
+    with open(path, 'rb') as f:
+        header = f.read(18)
+    # gzip magic, FEXTRA flag and the "BC" extra subfield
+    return len(header) == 18 and header[:2] == b'\x1f\x8b' and bool(six.indexbytes(header, 3) & 4) and header[12:14] == b'BC'
+
+
+def is_indexable(path):
+    """
+    Check whether records of given file can be accessed using a RecordIndex: Uncompressed or BGZF compressed files
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    return magic != b'\x1f\x8b' or is_bgzf(path)
+
+
+def _open_binary(path):
+    return bgzf.BgzfReader(path, 'rb') if is_bgzf(path) else io.open(path, 'rb')
+
+
+class RecordIndex(object):
+    """
+    Offsets of records in a FASTA or GenBank file, used to read selected records without parsing the whole file.
+
+    The index is saved next to the input file (similar to samtools faidx) as a TSV file with record ID, offset
+    (virtual offset for BGZF files) and length in bytes of each record, in the order of the input file.
+    It is rebuilt when the input file is modified.
+    """
+
+    def __init__(self, path, fmt, entries):
+        """
+        :param path: Indexed sequence file path
+        :param fmt: Sequence file format (fasta or genbank)
+        :param entries: List of IndexEntry in the order of the input file
+        """
+        self.path = path
+        self.fmt = fmt
+        self.entries = entries
+        self.handle = None
+
+    @classmethod
+    def get_index_path(cls, path):
+        return path + INDEX_EXTENSION
+
+    @classmethod
+    def open(cls, path, fmt):
+        """
+        Load index of given file if it exists and is up to date, build and save it otherwise
+        :param path: Sequence file path
+        :param fmt: Sequence file format (fasta or genbank)
+        :return: RecordIndex
+        """
+        index_path = cls.get_index_path(path)
+        if os.path.exists(index_path):
+            index = cls.load(path, fmt, index_path)
+            if index is not None:
+                logging.debug('Using record index: %s', index_path)
+                return index
+            logging.info('Record index is outdated, rebuilding: %s', index_path)
+        index = cls.build(path, fmt)
+        try:
+            index.save(index_path)
+        except (IOError, OSError) as e:
+            # Input directory can be read-only, the index is then used just for this run
+            logging.warning('Could not save record index %s: %s', index_path, e)
+        return index
+
+    @classmethod
+    def build(cls, path, fmt):
+        """
+        Scan given file for record start lines and create its index.
+        The file is searched for record markers in large blocks, only the header lines of each record are parsed.
+        """
+        if fmt not in RECORD_MARKERS:
+            raise NotImplementedError('Record index is not supported for format: {}'.format(fmt))
+        logging.info('Indexing records in: %s', path)
+        marker = RECORD_MARKERS[fmt]
+        line_marker = b'\n' + marker
+        starts, keys = [], []
+        # Data position and file offset of each scanned block, used to get virtual offsets in BGZF files
+        block_starts, block_offsets = [], []
+        # Unprocessed data starting at data position buf_pos, record at data position pending has an unparsed header.
+        # Data starts with a newline before the file, so that a record at the start of the file is found as well.
+        buf, buf_pos, search, pending = b'\n', -1, 0, None
+        blocks = cls._read_blocks(path)
+        eof = False
+        while not eof:
+            data, block_offset = next(blocks, (None, None))
+            eof = data is None
+            if not eof:
+                block_starts.append(buf_pos + len(buf))
+                block_offsets.append(block_offset)
+                buf += data
+            while True:
+                if pending is not None:
+                    header_end = cls._find_header_end(fmt, buf, pending - buf_pos, eof)
+                    if header_end is None:
+                        break
+                    keys.append(cls._get_header_key(fmt, buf[pending - buf_pos:header_end]))
+                    pending = None
+                idx = buf.find(line_marker, search)
+                if idx < 0:
+                    break
+                pending = buf_pos + idx + 1
+                starts.append(pending)
+                search = idx + 1
+            # Keep the unparsed header and the end of the block where a marker can continue in the next block
+            cut = pending - buf_pos if pending is not None else max(search, len(buf) - len(marker), 0)
+            buf, buf_pos, search = buf[cut:], buf_pos + cut, max(search - cut, 0)
+
+        end = buf_pos + len(buf)
+        is_compressed = any(offset is not None for offset in block_offsets)
+        entries = []
+        for i, (key, start) in enumerate(zip(keys, starts)):
+            record_end = starts[i + 1] if i + 1 < len(starts) else end
+            if is_compressed:
+                block_idx = bisect.bisect_right(block_starts, start) - 1
+                offset = bgzf.make_virtual_offset(block_offsets[block_idx], start - block_starts[block_idx])
+                # Length is not meaningful for virtual offsets in BGZF files, records are read line by line
+                entries.append(IndexEntry(key, offset, 0))
+            else:
+                entries.append(IndexEntry(key, start, record_end - start))
+        return cls(path, fmt, entries)
+
+    @classmethod
+    def _read_blocks(cls, path):
+        """
+        Read data of given file in large blocks
+        :return: Generator of (data, file offset of BGZF block or None for uncompressed files) tuples
+        """
+        if is_bgzf(path):
+            with io.open(path, 'rb') as raw, bgzf.BgzfReader(path, 'rb') as reader:
+                for block_offset, _, _, data_length in bgzf.BgzfBlocks(raw):
+                    yield reader.read(data_length), block_offset
+        else:
+            with io.open(path, 'rb') as f:
+                while True:
+                    data = f.read(SCAN_BLOCK_SIZE)
+                    if not data:
+                        break
+                    yield data, None
+
+    @classmethod
+    def _find_header_end(cls, fmt, buf, start, eof):
+        """
+        Find end of header lines of record starting at given position
+        :return: Position of the end of the header, or None if more data is needed
+        """
+        if fmt == 'fasta':
+            end_markers = [b'\n']
+        else:
+            end_markers = GENBANK_HEADER_END_MARKERS + [b'\n' + RECORD_MARKERS[fmt]]
+        ends = [idx for idx in (buf.find(end_marker, start) for end_marker in end_markers) if idx >= 0]
+        if ends:
+            return min(ends)
+        return len(buf) if eof else None
+
+    @classmethod
+    def _get_header_key(cls, fmt, header):
+        lines = header.split(b'\n')
+        key = cls._get_marker_key(fmt, lines[0])
+        if fmt == 'genbank':
+            for line in lines[1:]:
+                key = cls._get_genbank_header_key(line, key)
+        return key
+
+    @classmethod
+    def _get_marker_key(cls, fmt, line):
+        if fmt == 'fasta':
+            # Same as the ID of records parsed using SeqIO
+            parts = line[1:].split(None, 1)
+        else:
+            parts = line[5:].split(None, 1)
+        return parts[0].decode('utf-8') if parts else ''
+
+    @classmethod
+    def _get_genbank_header_key(cls, line, key):
+        # Same as the ID of records parsed using SeqIO: VERSION, ACCESSION or LOCUS name
+        if line.startswith(b'ACCESSION '):
+            parts = line.split()
+            if len(parts) > 1:
+                return parts[1].decode('utf-8')
+        elif line.startswith(b'VERSION '):
+            parts = line.split()
+            if len(parts) > 1 and parts[1].count(b'.') == 1 and parts[1].split(b'.')[1].isdigit():
+                return parts[1].decode('utf-8')
+        return key
+
+    @classmethod
+    def load(cls, path, fmt, index_path):
+        """
+        Load saved index of given file
+        :return: RecordIndex or None if the index is outdated
+        """
+        stat = os.stat(path)
+        with open(index_path, 'r') as f:
+            header = f.readline().rstrip('\n').split('\t')
+            if header != ['#deepbgc-index', str(INDEX_VERSION), fmt, str(stat.st_size), str(int(stat.st_mtime))]:
+                return None
+            entries = []
+            for line in f:
+                key, offset, length = line.rstrip('\n').rsplit('\t', 2)
+                entries.append(IndexEntry(key, int(offset), int(length)))
+        return cls(path, fmt, entries)
+
+    def save(self, index_path):
+        stat = os.stat(self.path)
+        tmp_path = index_path + '.part'
+        with open(tmp_path, 'w') as f:
+            f.write('\t'.join(['#deepbgc-index', str(INDEX_VERSION), self.fmt, str(stat.st_size), str(int(stat.st_mtime))]) + '\n')
+            for entry in self.entries:
+                f.write('{}\t{}\t{}\n'.format(*entry))
+        os.rename(tmp_path, index_path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def read(self, entry):
+        """
+        Read and parse record at given index entry
+        :param entry: IndexEntry
+        :return: SeqRecord
+        """
+        if self.handle is None:
+            self.handle = _open_binary(self.path)
+        self.handle.seek(entry.offset)
+        if isinstance(self.handle, bgzf.BgzfReader):
+            marker = RECORD_MARKERS[self.fmt]
+            # Record ends at the next record marker
+            lines = [self.handle.readline()]
+            while True:
+                line = self.handle.readline()
+                if not line or line.startswith(marker):
+                    break
+                lines.append(line)
+            data = b''.join(lines)
+        else:
+            data = self.handle.read(entry.length)
+        record = SeqIO.read(io.StringIO(data.decode('utf-8')), self.fmt)
+        if record.id != entry.id:
+            raise ValueError('Record index {} does not match the input file, expected record {} but found {}. '
+                             'Remove the index to rebuild it'.format(self.get_index_path(self.path), entry.id, record.id))
+        return record
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
@@ -0,0 +1,355 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import gzip
+import io
+import logging
+import os
+import threading
+
+import pandas as pd
+import six
+from six.moves import queue
+from Bio import SeqIO
+from Bio.Alphabet import generic_dna
+from Bio.Seq import UnknownSeq
+from Bio.SeqFeature import SeqFeature, FeatureLocation
+from Bio.SeqRecord import SeqRecord
+
+from deepbgc import util
+from deepbgc.input.index import RecordIndex, is_indexable, RECORD_MARKERS
+
+GZIP_MAGIC = b'\x1f\x8b'
+# Size of read buffer, large buffers reduce the number of reads and decompression calls
+BUFFER_SIZE = 4 * 1024 * 1024
+# Number of records parsed ahead in the background thread
+READAHEAD_RECORDS = 4
+PFAM_TABLE_FORMAT = 'pfam-tsv'
+COMPRESSED_EXTENSIONS = ['.gz', '.bgz']
+
+
+def open_input(path, buffer_size=BUFFER_SIZE):
+    """
+    Open input file for reading in binary mode, transparently decompressing gzip and bgzip files
+    (detected from file content, not from the extension).
+    :param path: Input file path
+    :param buffer_size: Read buffer size
+    :return: Buffered binary file handle supporting peek()
+    """
+    raw = io.open(path, 'rb', buffering=buffer_size)
+    if raw.peek(len(GZIP_MAGIC))[:len(GZIP_MAGIC)] == GZIP_MAGIC:
+        # bgzip files are valid multi-member gzip files
+        return io.BufferedReader(gzip.GzipFile(fileobj=raw, mode='rb'), buffer_size=buffer_size)
+    return raw
+
+
+def strip_compressed_extension(path):
+    """
+    Remove .gz or .bgz extension from given path
+    """
+    base, ext = os.path.splitext(path)
+    return base if ext in COMPRESSED_EXTENSIONS else path
+
+
+def sniff_format(handle, path=None):
+    """
+    Detect input format from the first line of given file handle, fall back to file extension
+    :param handle: Binary file handle supporting peek()
+    :param path: File path used to guess format from extension
+    :return: 'fasta', 'genbank', 'pfam-tsv' or None if not recognized
+    """
+    head = handle.peek(64 * 1024).lstrip()
+    first_line = head.split(b'\n', 1)[0]
+    if first_line.startswith(b'>'):
+        return 'fasta'
+    if first_line.startswith(b'LOCUS'):
+        return 'genbank'
+    if b'pfam_id' in first_line:
+        return PFAM_TABLE_FORMAT
+    if path:
+        fmt = util.guess_format(strip_compressed_extension(path), accept_csv=True)
+        return PFAM_TABLE_FORMAT if fmt == 'csv' else fmt
+    return None
+
+
+def read_records(path, readahead=READAHEAD_RECORDS):
+    """
+    Read sequence records from a FASTA, GenBank or Pfam TSV file, optionally gzip or bgzip compressed.
+    Records are parsed in a background thread while the previous records are being processed.
+    :param path: Input file path
+    :param readahead: Number of records parsed ahead, 0 to parse in the calling thread
+    :return: Generator of SeqRecords
+    """
+    handle = open_input(path)
+    fmt = sniff_format(handle, path)
+    if not fmt:
+        handle.close()
+        raise NotImplementedError("Sequence file type not recognized: {}, ".format(path),
+                                  "Please provide a GenBank, FASTA or Pfam TSV file "
+                                  "(optionally gzip compressed).")
+    logging.debug('Reading %s records from: %s', fmt, path)
+    if fmt == PFAM_TABLE_FORMAT:
+        records = _read_pfam_table_records(handle, path)
+    else:
+        records = _parse_records(handle, fmt)
+    if readahead:
+        records = ReadaheadIterator(records, readahead)
+    return records
+
+
+def count_records(paths, limit=None):
+    """
+    Count records in given input files by searching for record start lines, without parsing the records
+    :param paths: List of input file paths
+    :param limit: Stop counting after reaching given number of records
+    :return: Number of records (at most limit), or None if records of some input cannot be counted (Pfam TSV)
+    """
+    count = 0
+    for path in paths:
+        with open_input(path) as handle:
+            fmt = sniff_format(handle, path)
+            if fmt not in RECORD_MARKERS:
+                return None
+            line_marker = b'\n' + RECORD_MARKERS[fmt]
+            # Data starts with a newline before the file, end of each block is kept for markers split between blocks
+            prev = b'\n'
+            while limit is None or count < limit:
+                data = handle.read(BUFFER_SIZE)
+                if not data:
+                    break
+                block = prev + data
+                count += block.count(line_marker)
+                prev = block[-(len(line_marker) - 1):]
+    return count if limit is None else min(count, limit)
+
+
+def parse_shard(value):
+    """
+    Parse shard definition in the form of "i/N"
+    :param value: Shard definition string, such as "2/8" for the second of 8 shards
+    :return: Tuple (shard number starting from 1, number of shards)
+    """
+    try:
+        index, count = [int(v) for v in value.split('/')]
+    except ValueError:
+        raise ValueError('Invalid shard "{}", expected "i/N" such as "1/8"'.format(value))
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError('Invalid shard "{}", expected "i/N" with 1 <= i <= N'.format(value))
+    return index, count
+
+
+def read_inputs(paths, record_ids=None, shard=None, readahead=READAHEAD_RECORDS):
+    """
+    Read selected sequence records from multiple input files.
+
+    When selecting records in uncompressed or bgzip compressed FASTA and GenBank files, a record index
+    is created next to the input file (or reused), so that only the selected records are parsed.
+    :param paths: List of input file paths
+    :param record_ids: Read only records with given IDs, all records by default
+    :param shard: Tuple (shard number starting from 1, number of shards), read only every N-th record
+    starting from the i-th record (counting records matching record_ids in all inputs).
+    :param readahead: Number of records parsed ahead, 0 to parse in the calling thread
+    :return: Generator of SeqRecords
+    """
+    records = _read_inputs(paths, set(record_ids) if record_ids else None, shard)
+    if readahead:
+        records = ReadaheadIterator(records, readahead)
+    return records
+
+
+def _read_inputs(paths, record_ids, shard):
+    formats = []
+    for path in paths:
+        with open_input(path) as handle:
+            formats.append(sniff_format(handle, path))
+    indexes = [None] * len(paths)
+    if record_ids or shard:
+        indexes = _open_indexes(paths, formats)
+        if record_ids and not _is_index_complete(indexes, record_ids):
+            indexes = [None] * len(paths)
+    ordinal = 0
+    for path, index in zip(paths, indexes):
+        if index is not None:
+            try:
+                for entry in index.entries:
+                    if record_ids and entry.id not in record_ids:
+                        continue
+                    ordinal += 1
+                    if _is_in_shard(ordinal, shard):
+                        yield index.read(entry)
+            finally:
+                index.close()
+        else:
+            if record_ids or shard:
+                logging.info('Reading all records to select records from %s, use uncompressed or bgzip compressed '
+                             'FASTA or GenBank files to read just the selected records', path)
+            for record in read_records(path, readahead=0):
+                if record_ids and record.id not in record_ids:
+                    logging.debug('Skipping record %s not matching filter %s', record.id, record_ids)
+                    continue
+                ordinal += 1
+                if _is_in_shard(ordinal, shard):
+                    yield record
+
+
+def _open_indexes(paths, formats):
+    """
+    Open record index of each input that can be indexed
+    :return: List with RecordIndex of each input, None for inputs that cannot be indexed
+    """
+    return [RecordIndex.open(path, fmt) if fmt in ['fasta', 'genbank'] and is_indexable(path) else None
+            for path, fmt in zip(paths, formats)]
+
+
+def _is_index_complete(indexes, record_ids):
+    """
+    Check that all selected record IDs are found in the record indexes of the inputs.
+
+    Index keys follow the ID logic of Biopython only for common GenBank headers, a record with an unusual header
+    (e.g. VERSION line with a GI number) might not be found by its ID. If any selected record is not found
+    and all inputs are indexed, all inputs are read using SeqIO instead.
+    :param indexes: List with RecordIndex of each input, None for inputs that cannot be indexed, see _open_indexes
+    :return: False if the indexes should not be used to select the records
+    """
+    if any(index is None for index in indexes):
+        # Missing records can be found in inputs without an index
+        return True
+    found = set(entry.id for index in indexes for entry in index.entries)
+    missing = record_ids - found
+    if missing:
+        logging.warning('Records not found in record index: %s, reading all records to select records',
+                        ', '.join(sorted(missing)))
+        return False
+    return True
+
+
+def _is_in_shard(ordinal, shard):
+    if not shard:
+        return True
+    index, count = shard
+    return (ordinal - 1) % count == index - 1
+
+
+def _parse_records(handle, fmt):
+    with handle:
+        text = io.TextIOWrapper(handle) if six.PY3 else handle
+        for record in SeqIO.parse(text, fmt):
+            yield record
+
+
+def _read_pfam_table_records(handle, path):
+    with handle:
+        first_line = handle.peek(64 * 1024).split(b'\n', 1)[0]
+        sep = '\t' if b'\t' in first_line else ','
+        domains = util.check_pfam_csv(pd.read_csv(handle, sep=sep).rename(columns={'contig_id': 'sequence_id'}), path)
+    for sequence_id, sequence_domains in domains.groupby('sequence_id', sort=False):
+        yield create_record_from_pfam_table(sequence_id, sequence_domains)
+
+
+def create_record_from_pfam_table(sequence_id, domains):
+    """
+    Create record with CDS and Pfam domain features (without nucleotide sequence) from a Pfam table
+    :param sequence_id: Record ID
+    :param domains: Pfam DataFrame with protein_id, gene_start, gene_end, gene_strand, pfam_id columns,
+    optionally with domain_start and domain_end protein coordinates
+    :return: SeqRecord
+    """
+    from deepbgc.data import PFAM_DB_VERSION
+    length = int(domains['gene_end'].max()) if len(domains) else 0
+    record = SeqRecord(UnknownSeq(length, alphabet=generic_dna), id=str(sequence_id), name=str(sequence_id)[:16],
+                       description='Created from Pfam table')
+    has_domain_location = 'domain_start' in domains.columns and 'domain_end' in domains.columns
+    proteins = {}
+    for domain in domains.itertuples(index=False):
+        protein_id = str(domain.protein_id)
+        gene_start, gene_end, strand = int(domain.gene_start), int(domain.gene_end), int(domain.gene_strand)
+        if protein_id not in proteins:
+            proteins[protein_id] = SeqFeature(
+                location=FeatureLocation(gene_start, gene_end, strand=strand),
+                type='CDS',
+                qualifiers={'locus_tag': [protein_id]}
+            )
+            record.features.append(proteins[protein_id])
+        if pd.isnull(domain.pfam_id):
+            continue
+        if has_domain_location:
+            # Domain coordinates are in amino acids, relative to the protein start
+            if strand == -1:
+                location = FeatureLocation(gene_end - 3 * int(domain.domain_end), gene_end - 3 * int(domain.domain_start), strand=strand)
+            else:
+                location = FeatureLocation(gene_start + 3 * int(domain.domain_start), gene_start + 3 * int(domain.domain_end), strand=strand)
+        else:
+            location = FeatureLocation(gene_start, gene_end, strand=strand)
+        record.features.append(SeqFeature(
+            location=location,
+            id=domain.pfam_id,
+            type=util.PFAM_FEATURE,
+            qualifiers={
+                'db_xref': [domain.pfam_id],
+                'locus_tag': [protein_id],
+                'database': [PFAM_DB_VERSION]
+            }
+        ))
+    util.sort_record_features(record)
+    return record
+
+
+class ReadaheadIterator(object):
+    """
+    Iterator consuming given iterable in a background thread, keeping up to given number of items ahead.
+    Exceptions raised by the iterable are raised again when the failed item is requested.
+    """
+
+    _END = object()
+
+    def __init__(self, iterable, size=READAHEAD_RECORDS):
+        self.queue = queue.Queue(maxsize=size)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._produce, args=(iterable,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self, iterable):
+        try:
+            for item in iterable:
+                if not self._put((item, None)):
+                    return
+        except Exception as e:
+            self._put((None, e))
+            return
+        self._put((self._END, None))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.stopped.is_set():
+            raise StopIteration()
+        item, error = self.queue.get()
+        if error is not None:
+            self.stopped.set()
+            raise error
+        if item is self._END:
+            self.stopped.set()
+            raise StopIteration()
+        return item
+
+    next = __next__
+
+    def close(self):
+        """
+        Stop reading ahead, used when the remaining items are not needed
+        """
+        self.stopped.set()
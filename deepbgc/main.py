@@ -19,13 +19,14 @@ except ImportError:
     from deepbgc import __version__
 
 import argparse
-import matplotlib
-matplotlib.use('Agg')
 from deepbgc.command.prepare import PrepareCommand
 from deepbgc.command.download import DownloadCommand
 from deepbgc.command.pipeline import PipelineCommand
 from deepbgc.command.train import TrainCommand
 from deepbgc.command.info import InfoCommand
+from deepbgc.command.rethreshold import RethresholdCommand
+from deepbgc.command.sweep import SweepCommand
+from deepbgc.command.merge import MergeCommand
 
 import sys
 
@@ -84,7 +85,10 @@ def run(argv=None):
         DownloadCommand(),
         PrepareCommand(),
         PipelineCommand(),
+        MergeCommand(),
         TrainCommand(),
+        RethresholdCommand(),
+        SweepCommand(),
         InfoCommand()
     ]
 
@@ -0,0 +1,206 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+import numpy as np
+from scipy import sparse
+
+
+class FlatForest(object):
+    """
+    Tree ensemble compiled into contiguous arrays of node features, thresholds, children and leaf values.
+
+    Predicts the same positive class probabilities as the sklearn forest it was created from, evaluating all trees
+    and samples at once using vectorized array indexing. Can be saved and loaded as a NumPy .npz file
+    without unpickling sklearn objects.
+
+    Evaluation is optimized for sparse inputs such as one-hot encoded Pfam IDs. Each tree is split into chains
+    of nodes connected by the child that is followed when the split feature is zero. A sample only leaves a chain
+    at nodes that split on one of its non-zero features, so instead of visiting every node on its path,
+    the sample jumps directly to the next such node, or to the leaf at the end of the chain.
+    """
+
+    ARRAYS = ['feature', 'threshold', 'left', 'right', 'leaf_values', 'roots']
+    # Chain index arrays computed from the trees, saved along with the trees so that they are not recomputed on load
+    INDEX_ARRAYS = ['chain', 'pos', 'chain_leaf', 'split_nodes', 'split_nodes_ptr']
+
+    def __init__(self, feature, threshold, left, right, leaf_values, roots, n_features, index=None):
+        """
+        :param feature: Feature index of each node (-1 in leaves)
+        :param threshold: Split threshold of each node, samples with value <= threshold go left
+        :param left: Index of left child of each node (-1 in leaves), children are numbered after their parent
+        :param right: Index of right child of each node (-1 in leaves)
+        :param leaf_values: Positive class probability of each node and output, shape (n_nodes, n_outputs)
+        :param roots: Index of root node of each tree
+        :param n_features: Number of input features
+        :param index: Dict of chain index arrays and chain_length saved by a previous instance, computed if None
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.n_features = int(n_features)
+        self.is_leaf = self.left < 0
+        if index is None:
+            self._index_chains()
+        else:
+            for name in self.INDEX_ARRAYS:
+                setattr(self, name, index[name])
+            self.chain_length = int(index['chain_length'])
+
+    def _index_chains(self):
+        num_nodes = len(self.feature)
+        zero_child = np.where(self.threshold >= 0, self.left, self.right)
+        zero_child[self.is_leaf] = -1
+
+        # Children are numbered after their parent, so chains can be assigned in a single pass
+        chain = np.full(num_nodes, -1, dtype=np.int64)
+        pos = np.zeros(num_nodes, dtype=np.int64)
+        chain_leaf = []
+        for node, child in enumerate(zero_child.tolist()):
+            if chain[node] < 0:
+                chain[node] = len(chain_leaf)
+                chain_leaf.append(-1)
+            if child >= 0:
+                chain[child] = chain[node]
+                pos[child] = pos[node] + 1
+            else:
+                chain_leaf[chain[node]] = node
+        self.chain = chain
+        self.pos = pos
+        self.chain_leaf = np.array(chain_leaf, dtype=np.int64)
+        self.chain_length = int(pos.max()) + 1 if num_nodes else 1
+
+        # Internal nodes grouped by split feature
+        internal = np.flatnonzero(~self.is_leaf)
+        self.split_nodes = internal[np.argsort(self.feature[internal], kind='mergesort')]
+        self.split_nodes_ptr = np.searchsorted(self.feature[self.split_nodes], np.arange(self.n_features + 1))
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """
+        Compile a trained sklearn RandomForestClassifier with binary outputs
+        :param forest: Trained sklearn forest classifier
+        :return: FlatForest
+        """
+        n_classes = np.atleast_1d(forest.n_classes_)
+        features, thresholds, lefts, rights, leaf_values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            features.append(np.where(is_leaf, -1, tree.feature).astype(np.int64))
+            thresholds.append(np.asarray(tree.threshold, dtype=np.float64))
+            lefts.append(np.where(is_leaf, -1, tree.children_left + offset).astype(np.int64))
+            rights.append(np.where(is_leaf, -1, tree.children_right + offset).astype(np.int64))
+            value = tree.value.reshape(tree.node_count, len(n_classes), -1)
+            tree_values = np.zeros((tree.node_count, len(n_classes)), dtype=np.float64)
+            for k, num_classes in enumerate(n_classes):
+                # Normalize class counts the same way as sklearn's DecisionTreeClassifier.predict_proba
+                proba = value[:, k, :num_classes].astype(np.float64)
+                normalizer = proba.sum(axis=1)
+                normalizer[normalizer == 0.0] = 1.0
+                tree_values[:, k] = proba[:, 1] / normalizer
+            leaf_values.append(tree_values)
+            roots.append(offset)
+            offset += tree.node_count
+
+        return FlatForest(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            leaf_values=np.concatenate(leaf_values),
+            roots=np.array(roots, dtype=np.int64),
+            n_features=forest.n_features_in_ if hasattr(forest, 'n_features_in_') else forest.n_features_
+        )
+
+    def _get_chain_keys(self, rows, nodes):
+        # Nodes of the same sample and chain have consecutive keys ordered by position in the chain
+        return (rows * len(self.chain_leaf) + self.chain[nodes]) * self.chain_length + self.pos[nodes]
+
+    def _get_splits(self, X):
+        """
+        Get all nodes that split on a non-zero feature of each sample, sorted by chain key
+        :param X: CSR matrix with sorted indices and no explicit zeros
+        :return: Tuple of (chain keys, nodes, feature values)
+        """
+        entry_rows = np.repeat(np.arange(X.shape[0], dtype=np.int64), np.diff(X.indptr))
+        starts = self.split_nodes_ptr[X.indices]
+        counts = self.split_nodes_ptr[X.indices + 1] - starts
+        # Position in split_nodes of each node of each sample's non-zero feature
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        nodes = self.split_nodes[offsets]
+        keys = self._get_chain_keys(np.repeat(entry_rows, counts), nodes)
+        order = np.argsort(keys)
+        return keys[order], nodes[order], np.repeat(X.data, counts)[order]
+
+    def predict_proba(self, X):
+        """
+        Predict positive class probability of each output
+        :param X: Dense array or sparse matrix of samples, one sample per row
+        :return: numpy array of shape (n_samples, n_outputs)
+        """
+        if X.shape[1] != self.n_features:
+            raise ValueError('Expected {} features, got {}'.format(self.n_features, X.shape[1]))
+        n_samples = X.shape[0]
+        # Values are compared as float32, same as in sklearn
+        X = sparse.csr_matrix(X, dtype=np.float32)
+        X.sum_duplicates()
+        X.eliminate_zeros()
+        split_keys, split_nodes, split_values = self._get_splits(X)
+
+        # Current node of each sample in each tree, descend until all reach a leaf
+        nodes = np.tile(self.roots, n_samples)
+        rows = np.repeat(np.arange(n_samples, dtype=np.int64), len(self.roots))
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while len(active):
+            active_nodes = nodes[active]
+            keys = self._get_chain_keys(rows[active], active_nodes)
+            idx = np.searchsorted(split_keys, keys)
+            # Next split on a non-zero feature has to be on the same chain as the current node
+            found = idx < len(split_keys)
+            found[found] = split_keys[idx[found]] // self.chain_length == keys[found] // self.chain_length
+            nodes[active[~found]] = self.chain_leaf[self.chain[active_nodes[~found]]]
+
+            active, idx = active[found], idx[found]
+            split = split_nodes[idx]
+            go_left = split_values[idx] <= self.threshold[split]
+            active_nodes = np.where(go_left, self.left[split], self.right[split])
+            nodes[active] = active_nodes
+            active = active[~self.is_leaf[active_nodes]]
+
+        n_outputs = self.leaf_values.shape[1]
+        tree_values = self.leaf_values[nodes].reshape(n_samples, len(self.roots), n_outputs)
+        # Sum trees sequentially in the same order as sklearn to get identical results
+        proba = np.zeros((n_samples, n_outputs), dtype=np.float64)
+        for i in range(len(self.roots)):
+            proba += tree_values[:, i]
+        proba /= len(self.roots)
+        return proba
+
+    def save(self, path):
+        """
+        Save the compiled forest as a NumPy .npz file, see load
+        :param path: Output file path, used as is (.npz suffix is not appended)
+        :return: self
+        """
+        with open(path, 'wb') as f:
+            np.savez(f, n_features=self.n_features, chain_length=self.chain_length,
+                     **{name: getattr(self, name) for name in self.ARRAYS + self.INDEX_ARRAYS})
+        return self
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load forest saved using save, without compiling the trees again
+        :param path: Path to .npz file
+        :return: FlatForest
+        """
+        with np.load(path) as data:
+            index = {name: data[name] for name in cls.INDEX_ARRAYS + ['chain_length']}
+            return FlatForest(n_features=data['n_features'], index=index,
+                              **{name: data[name] for name in cls.ARRAYS})
@@ -18,8 +18,10 @@ from sklearn.base import BaseEstimator, ClassifierMixin
 import pickle
 import os
 
+from deepbgc.vocabulary import PfamIndexMixin
 
-class HMM(BaseEstimator, ClassifierMixin):
+
+class HMM(PfamIndexMixin, BaseEstimator, ClassifierMixin):
     """
     HMM model parent class providing Sklearn mixins and saving/loading functionality
     """
@@ -42,7 +44,7 @@ class DiscreteHMM(HMM):
         :param X: DataFrame of domains with pfam_id column
         :return: numpy array of numbers representing given words in our vocabulary
         """
-        return np.array([self.vocabulary_.get(o, -1) for o in X['pfam_id']])
+        return self._get_pfam_positions(X, self.vocabulary_)
 
     def predict(self, X):
         """
@@ -56,6 +58,12 @@ class DiscreteHMM(HMM):
         # BGC state probability is in second column
         return pd.Series(posteriors[:,1], X.index)
 
+    def get_pfam_vocabulary(self):
+        """
+        Get set of Pfam IDs with a known emission probability, other Pfam IDs get the default emission.
+        """
+        return set(self.vocabulary_.keys())
+
     def _get_pfam_counts(self, X, y):
         """
         Get number of occurences of each pfam ID in negative (non-BGC) and positive (BGC) states
@@ -93,6 +101,7 @@ class DiscreteHMM(HMM):
         self.model_.transmat_ = transmat
         self.model_.emissionprob_ = emissionprob
         self.vocabulary_ = vocabulary
+        self._reset_pfam_positions()
         return self
 
     def fit(self, X_list, y_list, sample_weights=None, startprob=None, transmat=None, verbose=0,
@@ -226,13 +235,15 @@ class GeneBorderHMM(HMM):
 
         return emissionprob,  vocabulary
 
-    def _get_word_index(self, pfam_id, is_gene_end):
-        default_index = -1 if is_gene_end else -2
-        return self.vocabulary_.get((pfam_id, is_gene_end), default_index)
+    def _get_in_gene_vocabulary(self):
+        return {pfam_id: word_index for (pfam_id, is_gene_end), word_index in self.vocabulary_.items() if not is_gene_end}
 
     def get_sample_vector(self, X):
         is_gene_end = get_sample_gene_ends(X['protein_id'])
-        return np.array([self._get_word_index(x, is_gene_end[i]) for i, x in enumerate(X['pfam_id'].values)])
+        positions = self._get_pfam_positions(X, self._get_in_gene_vocabulary)
+        # Words at gene ends are indexed after all words inside genes, unknown words use the default emissions at the end
+        num_words = len(self.vocabulary_) // 2
+        return np.where(positions >= 0, positions + is_gene_end * num_words, np.where(is_gene_end, -1, -2))
 
     def predict(self, X):
         sample_vector = self.get_sample_vector(X)
@@ -244,6 +255,9 @@ class GeneBorderHMM(HMM):
         prediction = posteriors[:,2:]
         return pd.Series(np.max(prediction, axis=1), X.index)
 
+    def get_pfam_vocabulary(self):
+        return set(pfam_id for pfam_id, is_gene_end in self.vocabulary_.keys())
+
     def fit(self, X_list, y_list, startprob=None, transmat=None, verbose=1, debug_progress_path=None, validation_X_list=None, validation_y_list=None):
         if validation_X_list:
             logging.warning('GeneBorderHMM: Validation is present but has no effect yet')
@@ -254,6 +268,7 @@ class GeneBorderHMM(HMM):
         two_state_model.fit(X_list, y_list, startprob=startprob, transmat=transmat, verbose=verbose)
 
         emission, self.vocabulary_ = self._convert_emission(two_state_model.model_.emissionprob_, two_state_model.vocabulary_)
+        self._reset_pfam_positions()
 
         from hmmlearn import hmm
         self.model_ = hmm.MultinomialHMM(n_components=4)
@@ -7,8 +7,15 @@ import pandas as pd
 import numpy as np
 import logging
 import sys
+import copy
+import warnings
+from scipy import sparse
+from deepbgc.models.flat_forest import FlatForest
 
 class RandomForestClassifier(object):
+    # Prediction accepts sparse sample matrices, see SequenceModelWrapper.predict
+    accepts_sparse = True
+
     def __init__(self, **kwargs):
         from sklearn.ensemble import RandomForestClassifier as RFC
         self.rf = RFC(**kwargs)
@@ -16,9 +23,14 @@ class RandomForestClassifier(object):
     def predict(self, X):
         """
         Get BGC class prediction for a set of samples, represented by a DataFrame of sample vectors (e.g. One-hot encoding)
-        :param X: DataFrame of sample vectors, one sample per line
+        :param X: DataFrame or scipy sparse matrix of sample vectors, one sample per line.
+        Columns of the sparse matrix have to be in the same order as the training DataFrame columns.
         :return: DataFrame of per-class prediction scores, one sample per line
         """
+        if getattr(self, 'flat_', None) is not None:
+            return self._predict_flat(X)
+        if sparse.issparse(X):
+            return self._predict_sparse(X)
         if isinstance(X, pd.Series):
             # Turn single sample Series into a single-row DataFrame
             X = pd.DataFrame([X])
@@ -31,6 +43,82 @@ class RandomForestClassifier(object):
             predictions = []
         return pd.DataFrame(predictions, columns=self.targets_, index=X.index)
 
+    def _predict_sparse(self, X):
+        if X.shape[1] != len(self.inputs_):
+            raise ValueError('Expected {} features, got {}'.format(len(self.inputs_), X.shape[1]))
+        if X.shape[0]:
+            with warnings.catch_warnings():
+                # Model was trained using a DataFrame, sparse matrix does not have feature names
+                warnings.filterwarnings('ignore', message='X does not have valid feature names')
+                predictions = np.array([class_pred[:,1] for class_pred in self.rf.predict_proba(X.tocsr())]).T
+        else:
+            predictions = []
+        return pd.DataFrame(predictions, columns=self.targets_)
+
+    def _predict_flat(self, X):
+        if isinstance(X, pd.Series):
+            X = pd.DataFrame([X])
+        index = X.index if isinstance(X, pd.DataFrame) else None
+        if isinstance(X, pd.DataFrame):
+            X = X.values
+        predictions = self.flat_.predict_proba(X) if X.shape[0] else []
+        return pd.DataFrame(predictions, columns=self.targets_, index=index)
+
+    def set_execution_params(self, n_jobs=None, compact=None):
+        """
+        Set inference-time execution parameters, the model does not need to be retrained or saved again.
+        :param n_jobs: Number of threads used for prediction (-1 = all cores), keep the saved value if None
+        :param compact: Predict using the forest compiled into flat arrays (see FlatForest), keep current setting if None
+        :return: self
+        """
+        if n_jobs is not None and self.rf is not None:
+            self.rf.n_jobs = n_jobs
+        if compact is not None:
+            if compact:
+                if getattr(self, 'flat_', None) is None:
+                    self.flat_ = FlatForest.from_sklearn(self.rf)
+            elif self.rf is None:
+                raise ValueError('Model was loaded without the sklearn forest, only compact prediction is supported')
+            else:
+                self.flat_ = None
+        return self
+
+    def without_forest(self):
+        """
+        Get copy of the model that predicts only using the compiled forest, without the sklearn forest.
+        The compiled forest is not pickled with the model, it needs to be saved and loaded using save_flat and load_flat.
+        :return: RandomForestClassifier
+        """
+        self.set_execution_params(compact=True)
+        compact = copy.copy(self)
+        compact.rf = None
+        return compact
+
+    def save_flat(self, path):
+        """
+        Save the compiled forest as a NumPy .npz file
+        :param path: Output file path
+        :return: self
+        """
+        self.set_execution_params(compact=True)
+        self.flat_.save(path)
+        return self
+
+    def load_flat(self, path):
+        """
+        Predict using a compiled forest saved with save_flat
+        :param path: Path to .npz file
+        :return: self
+        """
+        self.flat_ = FlatForest.load(path)
+        return self
+
+    def __getstate__(self):
+        # Compiled forest is saved separately (see save_flat), it is not pickled with the model
+        state = self.__dict__.copy()
+        state.pop('flat_', None)
+        return state
+
     def fit(self, X_list, y_list, sample_weights=None, verbose=0, debug_progress_path=None,
             validation_X_list=None, validation_y_list=None):
         """
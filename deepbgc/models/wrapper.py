@@ -18,6 +18,12 @@ import pprint
 import pandas as pd
 import re
 import time
+import os
+import copy
+
+# Files saved next to a model file for compact prediction, see SequenceModelWrapper.load_compact
+COMPACT_MODEL_SUFFIX = '.compact'
+FLAT_FOREST_SUFFIX = '.flat.npz'
 
 
 class SequenceModelWrapper(BaseEstimator, ClassifierMixin):
@@ -116,12 +122,45 @@ class SequenceModelWrapper(BaseEstimator, ClassifierMixin):
         :param samples: List of DataFrames (sequences) or single DataFrame (sequence)
         :return: Return prediction scores for each sequence in list.
         """
+        if getattr(self.model, 'accepts_sparse', False) and hasattr(self.transformer, 'transform_sparse'):
+            # Encode all samples into a single sparse matrix if supported by the transformers
+            X_sparse = self.transformer.transform_sparse(samples)
+            if X_sparse is not None:
+                return self.model.predict(X_sparse)
         X_list = self.transformer.transform(samples)
         self._debug_samples(X_list)
         if isinstance(X_list, list):
             return [self.model.predict(X) for X in X_list]
         return self.model.predict(X_list)
 
+    def set_execution_params(self, **params):
+        """
+        Set inference-time execution parameters of the model (such as n_jobs), if supported by the model.
+        :param params: Execution parameters, None values keep the current settings
+        :return: self
+        """
+        params = {k: v for k, v in params.items() if v is not None}
+        if hasattr(self.model, 'set_execution_params'):
+            self.model.set_execution_params(**params)
+        elif params:
+            logging.warning('Model %s does not support execution parameters, ignoring: %s', type(self.model).__name__, params)
+        return self
+
+    def get_pfam_vocabulary(self):
+        """
+        Get set of Pfam IDs that can affect the model prediction, other Pfam IDs are treated as unknown by the model.
+        :return: Set of Pfam IDs, or None if the model can use an arbitrary Pfam ID.
+        """
+        vocabulary = self.transformer.get_pfam_vocabulary() if self.transformer is not None else set()
+        if vocabulary is None:
+            return None
+        if hasattr(self.model, 'get_pfam_vocabulary'):
+            vocabulary.update(self.model.get_pfam_vocabulary())
+        elif self.transformer is None or not self.transformer.transformers:
+            # Model receives raw Domain DataFrames, assume it can use any Pfam ID
+            return None
+        return vocabulary
+
     @classmethod
     def from_config(cls, config, meta_only=False, vars=None):
         """
@@ -191,6 +230,44 @@ class SequenceModelWrapper(BaseEstimator, ClassifierMixin):
             raise TypeError("Provided model is not a SequenceModelWrapper: '{}' is a {}".format(path, type(model)))
         return model
 
+    @classmethod
+    def load_compact(cls, path):
+        """
+        Load model for compact prediction (see RandomForestClassifier.set_execution_params).
+        The compiled forest is saved as a NumPy .npz file next to the model, along with a pickled copy of the model
+        without the sklearn forest. Both are reused while they are up to date, so that the sklearn forest does not need
+        to be unpickled and compiled on every load. They are created on first load if the directory is writable.
+        Models that do not support compact prediction are loaded as is.
+        :param path: Path to pickled model
+        :return: SequenceModelWrapper
+        """
+        compact_path = path + COMPACT_MODEL_SUFFIX
+        flat_path = path + FLAT_FOREST_SUFFIX
+        if all(os.path.exists(p) and os.path.getmtime(p) >= os.path.getmtime(path) for p in [compact_path, flat_path]):
+            try:
+                model = cls.load(compact_path)
+                model.model.load_flat(flat_path)
+                return model
+            except Exception as e:
+                logging.warning('Ignoring invalid compact model %s: %s', compact_path, e)
+
+        model = cls.load(path)
+        if not hasattr(model.model, 'without_forest'):
+            logging.warning('Model %s does not support compact prediction, ignoring', type(model.model).__name__)
+            return model
+        model.set_execution_params(compact=True)
+
+        compact = copy.copy(model)
+        compact.model = model.model.without_forest()
+        try:
+            model.model.save_flat(flat_path + '.part')
+            os.rename(flat_path + '.part', flat_path)
+            compact.save(compact_path + '.part')
+            os.rename(compact_path + '.part', compact_path)
+        except (IOError, OSError) as e:
+            logging.debug('Could not save compact model %s: %s', compact_path, e)
+        return model
+
 
 VAR_PATTERN = re.compile("(#{([a-zA-Z_0-9]+)})")
 def fill_vars(d, vars):
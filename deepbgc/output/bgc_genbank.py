@@ -1,15 +1,12 @@
 from Bio import SeqIO
 
-from deepbgc import util
-from deepbgc.output.writer import OutputWriter
+from deepbgc.output.tables import CLUSTER_RECORDS
+from deepbgc.output.writer import FileOutputWriter
 import os
 
 
-class BGCGenbankWriter(OutputWriter):
-
-    def __init__(self, out_path):
-        super(BGCGenbankWriter, self).__init__(out_path)
-        self.fd = open(self.out_path, 'w')
+class BGCGenbankWriter(FileOutputWriter):
+    required_tables = [CLUSTER_RECORDS]
 
     @classmethod
     def get_description(cls):
@@ -17,13 +14,11 @@ class BGCGenbankWriter(OutputWriter):
 
     @classmethod
     def get_name(cls):
-        return 'genbank'
+        return 'bgc-genbank'
 
-    def write(self, record):
-        clusters = util.get_cluster_features(record)
-        for cluster in clusters:
-            cluster_record = util.extract_cluster_record(cluster, record)
-            SeqIO.write(cluster_record, self.fd, 'genbank')
+    def write(self, record, tables=None):
+        for cluster_record in self.get_tables(record, tables).get(CLUSTER_RECORDS):
+            SeqIO.write(cluster_record, self.get_fd(), 'genbank')
 
     def close(self):
-        self.fd.close()
+        self.get_fd().close()
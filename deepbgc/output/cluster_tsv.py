@@ -1,9 +1,11 @@
-from deepbgc import util
+from deepbgc.output.tables import CLUSTER_TABLE
 from deepbgc.output.writer import TSVWriter
 import logging
 
 
 class ClusterTSVWriter(TSVWriter):
+    required_tables = [CLUSTER_TABLE]
+
     @classmethod
     def get_description(cls):
         return 'Table of detected BGCs and their properties'
@@ -12,8 +14,9 @@ class ClusterTSVWriter(TSVWriter):
     def get_name(cls):
         return 'bgc-tsv'
 
-    def record_to_df(self, record):
-        df = util.create_cluster_dataframe(record, add_classification=True)
+    def record_to_df(self, record, tables):
+        # Shallow copy, the shared table is not modified
+        df = tables.get(CLUSTER_TABLE).copy(deep=False)
         df.insert(0, 'sequence_id', record.id)
         logging.debug('Writing %s BGCs to: %s', len(df), self.out_path)
         return df
@@ -3,17 +3,19 @@ from __future__ import (
     division,
     absolute_import,
 )
-from deepbgc.output.writer import OutputWriter
+from deepbgc.output.evaluation.plot_writer import PlotWriter, get_pyplot, MAX_PLOT_SEQUENCES
+from deepbgc.output.evaluation.pfam_score_plot import FIGURE_WIDTH, DPI
+from deepbgc.output.tables import CLUSTER_TABLE
 from deepbgc import util
-from matplotlib import pyplot as plt
 import numpy as np
 import logging
 import warnings
 
-class BGCRegionPlotWriter(OutputWriter):
+class BGCRegionPlotWriter(PlotWriter):
+    required_tables = [CLUSTER_TABLE]
 
-    def __init__(self, out_path, max_sequences=50):
-        super(BGCRegionPlotWriter, self).__init__(out_path)
+    def __init__(self, out_path, max_sequences=MAX_PLOT_SEQUENCES, render_pool=None):
+        super(BGCRegionPlotWriter, self).__init__(out_path, render_pool=render_pool)
         self.detector_labels = []
         self.sequence_clusters = []
         self.sequence_titles = []
@@ -27,14 +29,15 @@ class BGCRegionPlotWriter(OutputWriter):
     def get_name(cls):
         return 'bgc-region-plot'
 
-    def close(self):
-        self.save_plot()
-
     def save_plot(self):
+        plt = get_pyplot()
         num_sequences = len(self.sequence_titles)
         num_detectors = len(self.detector_labels)
+        if not num_sequences:
+            logging.debug('No sequences, skipping plot %s', self.out_path)
+            return
 
-        fig, axes = plt.subplots(num_sequences, 1, figsize=(15, 1 + 0.25 * (num_detectors + 2) * num_sequences))
+        fig, axes = plt.subplots(num_sequences, 1, figsize=(FIGURE_WIDTH, 1 + 0.25 * (num_detectors + 2) * num_sequences))
         if num_sequences == 1:
             axes = [axes]
 
@@ -50,11 +53,10 @@ class BGCRegionPlotWriter(OutputWriter):
                 continue
 
             end = clusters['nucl_end'].max()
+            # Use at most 20 ticks: 100kb, 200kb, 500kb, 1Mb, 2Mb, 5Mb, ...
             x_step = 100000
-            if end / x_step > 20:
-                x_step = 200000
-            if end / x_step > 20:
-                x_step = 500000
+            while end / x_step > 20:
+                x_step = x_step * 5 // 2 if str(x_step).startswith('2') else x_step * 2
 
             clusters_by_detector = clusters.groupby('detector_label')
             cmap = plt.get_cmap("tab10")
@@ -64,22 +66,17 @@ class BGCRegionPlotWriter(OutputWriter):
                     continue
                 detector_clusters = clusters_by_detector.get_group(detector_label)
 
+                # Cluster spans of each detector are drawn as a single collection of bars
+                xranges = list(zip(detector_clusters['nucl_start'], detector_clusters['nucl_end'] - detector_clusters['nucl_start']))
                 if detector_label.lower() == 'annotated':
                     color = 'grey'
-                    for c, cluster in detector_clusters.iterrows():
-                        ax.axvspan(cluster['nucl_start'], cluster['nucl_end'], color='black', alpha=0.13)
+                    ax.broken_barh(xranges, (0.3, num_detectors + 0.4), color='black', alpha=0.13, lw=0)
                 else:
                     color = cmap(color_idx)
                     color_idx += 1
 
-                # Get coordinates as a vector cand1_start, cand1_end, cand2_start, cand2_end, ...
-                x = detector_clusters[['nucl_start', 'nucl_end']].values.reshape(1, -1)[0]
-                # Get y values as a vector y_line_coordinate, nan, y_line_coordinate, nan, ...
-                y = np.ones(x.shape) * (num_detectors - level) # 5, 4, 3, 2, 1
-                y[1::2] = np.nan
-                # Create multiple thin lines to avoid extending actual cluster region due to line width
-                for d in np.arange(-0.08, 0.08, 0.005):
-                    ax.step(x, y + d, color=color, where='post', lw=0.3, label=None)
+                y = num_detectors - level # 5, 4, 3, 2, 1
+                ax.broken_barh(xranges, (y - 0.08, 0.16), color=color, lw=0)
             ax.set_xlabel('')
             xticks = range(0, clusters['nucl_end'].max() + x_step, x_step)
             ax.set_xticks(xticks)
@@ -87,18 +84,34 @@ class BGCRegionPlotWriter(OutputWriter):
         axes[-1].set_xlabel('Nucleotide coordinates')
         fig.tight_layout()
         logging.debug('Saving BGC region plot to: %s', self.out_path)
-        fig.savefig(self.out_path, dpi=150, bbox_inches='tight')
+        fig.savefig(self.out_path, dpi=DPI, bbox_inches='tight')
+        plt.close(fig)
 
-    def write(self, record):
-        if len(self.sequence_titles) > self.max_sequences:
-            warnings.warn('Reached maximum number of {} sequences for plotting, some sequences will not be plotted.'.format(self.max_sequences))
+    def write(self, record, tables=None):
+        if self.is_full():
             return
-        clusters = util.create_cluster_dataframe(record, add_pfams=False, add_proteins=False)
-        title = record.id
-        if record.description and record.description != record.id:
-            title = '{} ({})'.format(record.id, record.description)
+        clusters = self.get_tables(record, tables).get(CLUSTER_TABLE)
+        self.write_clusters(util.format_record_title(record.id, record.description), clusters)
 
+    def is_full(self):
+        if self.is_rendered or len(self.sequence_titles) > self.max_sequences:
+            warnings.warn('Reached maximum number of {} sequences for plotting, some sequences will not be plotted.'.format(self.max_sequences))
+            return True
+        return False
+
+    def write_clusters(self, title, clusters):
+        """
+        Add BGCs of a single sequence to the plot
+        :param title: Sequence title
+        :param clusters: DataFrame of BGCs with detector_label, nucl_start and nucl_end columns
+        """
+        if self.is_full():
+            return
         if len(clusters):
             self.detector_labels = sorted(np.unique(list(clusters['detector_label'].unique()) + self.detector_labels), key=lambda l: l.lower())
-        self.sequence_clusters.append(clusters)
+        # Keep only the columns needed for plotting
+        self.sequence_clusters.append(clusters[['detector_label', 'nucl_start', 'nucl_end']] if len(clusters) else clusters)
         self.sequence_titles.append(title)
+        if len(self.sequence_titles) > self.max_sequences:
+            # Plot is complete, render it without waiting for the remaining records
+            self.render()
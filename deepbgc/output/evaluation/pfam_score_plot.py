@@ -1,16 +1,41 @@
+import collections
 import logging
 
-from deepbgc.output.writer import OutputWriter
+from deepbgc.output.evaluation.plot_writer import PlotWriter, get_pyplot, MAX_PLOT_SEQUENCES
+from deepbgc.output.tables import PFAM_TABLE
 from deepbgc import util
-from matplotlib import pyplot as plt
 import numpy as np
 import warnings
 
-class PfamScorePlotWriter(OutputWriter):
+FIGURE_WIDTH = 15
+DPI = 150
+# Maximum number of points of each plotted score trace, about one per pixel column,
+# longer traces are downsampled and drawn as min-max envelopes
+MAX_TRACE_POINTS = FIGURE_WIDTH * DPI
 
-    def __init__(self, out_path, max_sequences=50):
-        super(PfamScorePlotWriter, self).__init__(out_path)
-        self.sequence_scores = []
+
+def summarize_trace(values, max_points=MAX_TRACE_POINTS):
+    """
+    Downsample score trace to at most max_points bins of consecutive values, keeping the minimum and maximum of each bin
+    :param values: Array of values in genomic order
+    :param max_points: Maximum number of bins
+    :return: Tuple of arrays (index of first value in each bin, minimum of each bin, maximum of each bin)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) <= max_points:
+        return np.arange(len(values)), values, values
+    starts = np.linspace(0, len(values), max_points + 1).astype(np.int64)[:-1]
+    return starts, np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+
+class PfamScorePlotWriter(PlotWriter):
+    required_tables = [PFAM_TABLE]
+
+    def __init__(self, out_path, max_sequences=MAX_PLOT_SEQUENCES, render_pool=None):
+        super(PfamScorePlotWriter, self).__init__(out_path, render_pool=render_pool)
+        # Downsampled score traces of each sequence, see summarize_trace
+        self.sequence_traces = []
+        self.sequence_lengths = []
         self.sequence_titles = []
         self.sequence_thresholds = []
         self.sequence_detector_names = []
@@ -24,41 +49,42 @@ class PfamScorePlotWriter(OutputWriter):
     def get_name(cls):
         return 'pfam-score-plot'
 
-    def close(self):
-        self.save_plot()
-
     def save_plot(self):
+        plt = get_pyplot()
         num_sequences = len(self.sequence_titles)
-        fig, axes = plt.subplots(num_sequences, 1, figsize=(15, 1+1.5*num_sequences))
+        if not num_sequences:
+            logging.debug('No sequences with Pfam domains, skipping plot %s', self.out_path)
+            return
+        fig, axes = plt.subplots(num_sequences, 1, figsize=(FIGURE_WIDTH, 1+1.5*num_sequences))
         if num_sequences == 1:
             axes = [axes]
         offset = 0.05
-        for i, (detector_scores, sequence_title, sequence_thresholds) in enumerate(zip(self.sequence_scores, self.sequence_titles, self.sequence_thresholds)):
+        for i, (traces, length, sequence_title, sequence_thresholds) in enumerate(zip(self.sequence_traces, self.sequence_lengths, self.sequence_titles, self.sequence_thresholds)):
             axes[i].set_ylim(0-offset, 1+offset)
             axes[i].set_xlabel('')
             axes[i].set_ylabel('BGC score')
             axes[i].set_title(sequence_title)
-            x = detector_scores.index
-            xlim = (min(x), max(x))
+            xlim = (0, length - 1)
             axes[i].set_xlim(xlim)
-            if detector_scores.empty:
-                continue
             cmap = plt.get_cmap("tab10")
             # For each detector score column
             color_idx = 0
-            for column, thresholds in zip(detector_scores.columns, sequence_thresholds):
-                y = detector_scores[column]
+            for (column, (x, y_min, y_max)), thresholds in zip(traces.items(), sequence_thresholds):
                 if column == 'in_cluster':
                     color = 'grey'
-                    full_height_val = y * (1 + 2 * offset) - offset
-                    axes[i].fill_between(x, full_height_val, -offset, color=color, alpha=0.3)
+                    full_height_val = y_max * (1 + 2 * offset) - offset
+                    axes[i].fill_between(x, full_height_val, -offset, step='post', color=color, alpha=0.3)
                     axes[i].step(x, full_height_val, where='post', lw=0.75, alpha=0.75, color=color, label='annotated')
                 else:
                     color = cmap(color_idx)
                     color_idx += 1
-                    axes[i].plot(x, y, lw=0.75, alpha=0.6, color=color, label=column)
+                    if len(x) < length:
+                        # Downsampled trace is drawn as a single polygon covering the score range of each bin
+                        axes[i].fill_between(x, y_min, y_max, step='post', lw=0.75, alpha=0.6, color=color, label=column)
+                    else:
+                        axes[i].plot(x, y_max, lw=0.75, alpha=0.6, color=color, label=column)
                     axes[i].hlines(thresholds, xlim[0], xlim[1], color=color, linestyles='--', lw=0.75, alpha=0.5)
-            if len(detector_scores.columns) > 1:
+            if len(traces) > 1:
                 lgnd = axes[i].legend(bbox_to_anchor=(1.02, 1), loc='upper left')
                 for line in lgnd.get_lines():
                     line.set_linewidth(2)
@@ -66,30 +92,51 @@ class PfamScorePlotWriter(OutputWriter):
         axes[-1].set_xlabel('Pfam domains in genomic order')
         fig.tight_layout()
         logging.debug('Saving per-pfam BGC score plot to: %s', self.out_path)
-        fig.savefig(self.out_path, dpi=150, bbox_inches='tight')
+        fig.savefig(self.out_path, dpi=DPI, bbox_inches='tight')
+        plt.close(fig)
 
-    def write(self, record):
-        if len(self.sequence_titles) > self.max_sequences:
-            warnings.warn('Reached maximum number of {} sequences for plotting, some sequences will not be plotted.'.format(self.max_sequences))
+    def write(self, record, tables=None):
+        if self.is_full():
             return
-        scores = util.create_pfam_dataframe(record, add_in_cluster=True)
+        scores = self.get_tables(record, tables).get(PFAM_TABLE)
         if scores.empty:
             logging.debug('Skipping score plot for empty record %s', record.id)
             return
-        detector_meta = util.get_record_detector_meta(record)
-        detector_names = np.unique([meta['name'] for meta in detector_meta.values()])
+        detector_meta = list(util.get_record_detector_meta(record).values())
+        self.write_scores(util.format_record_title(record.id, record.description), scores, detector_meta)
+
+    def is_full(self):
+        if self.is_rendered or len(self.sequence_titles) > self.max_sequences:
+            warnings.warn('Reached maximum number of {} sequences for plotting, some sequences will not be plotted.'.format(self.max_sequences))
+            return True
+        return False
+
+    def write_scores(self, title, scores, detector_meta):
+        """
+        Add BGC detection scores of a single sequence to the plot
+        :param title: Sequence title
+        :param scores: DataFrame of Pfam domains in genomic order, with score column of each detector
+        and "in_cluster" column if the sequence contains annotated BGCs
+        :param detector_meta: List of detector metadata dicts of the sequence
+        """
+        if self.is_full():
+            return
+        detector_names = np.unique([meta['name'] for meta in detector_meta])
         score_columns = [util.format_bgc_score_column(name) for name in detector_names]
         thresholds = []
         if 'in_cluster' in scores.columns:
             score_columns = ['in_cluster'] + score_columns
             thresholds.append([])
-        title = record.id
-        if record.description and record.description != record.id:
-            title = '{} ({})'.format(record.id, record.description)
         # Each model can have multiple labels, each with a different threshold
         for name in detector_names:
-            thresholds.append([float(meta['score_threshold']) for meta in detector_meta.values() if meta['name'] == name])
-        self.sequence_scores.append(scores[score_columns])
+            thresholds.append([float(meta['score_threshold']) for meta in detector_meta if meta['name'] == name])
+        self.sequence_traces.append(collections.OrderedDict(
+            (column, summarize_trace(scores[column].values)) for column in score_columns
+        ))
+        self.sequence_lengths.append(len(scores))
         self.sequence_titles.append(title)
         self.sequence_thresholds.append(thresholds)
         self.sequence_detector_names.append(detector_names)
+        if len(self.sequence_titles) > self.max_sequences:
+            # Plot is complete, render it without waiting for the remaining records
+            self.render()
@@ -0,0 +1,118 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import logging
+import multiprocessing
+
+from deepbgc.output.writer import OutputWriter
+
+# Maximum number of sequences in per-sequence plots (see PfamScorePlotWriter and BGCRegionPlotWriter),
+# the plots are complete and can be rendered once more sequences are written
+MAX_PLOT_SEQUENCES = 50
+
+
+def get_pyplot():
+    """
+    Import pyplot using the non-interactive Agg backend. Matplotlib is imported only when a plot is rendered,
+    so that runs without plot outputs do not load it at all.
+    :return: matplotlib.pyplot module
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot
+    return pyplot
+
+
+def _render_plot(writer):
+    writer.save_plot()
+    return writer.out_path
+
+
+class PlotRenderPool(object):
+    """
+    Pool of worker processes rendering plots in the background.
+
+    Plot writers keep only compact summaries of the records, so they are sent to the worker as a whole.
+    The pool should be created before loading the models, so that the workers are forked from a small process.
+    Workers are not replaced after each task, a replacement would be forked from the main process with the models loaded.
+
+    Plots are submitted when they are complete. Per-sequence plots are complete after MAX_PLOT_SEQUENCES records,
+    other plots only after all records, so rendering overlaps with processing of the records only for inputs
+    with more records. For smaller inputs, the pool only renders the plots in parallel at the end of the run.
+    """
+
+    def __init__(self, processes):
+        self.pool = multiprocessing.Pool(processes=processes)
+        self.results = []
+        self.is_terminated = False
+
+    def submit(self, writer):
+        """
+        Render plot of given writer in a worker process
+        :param writer: PlotWriter
+        """
+        logging.debug('Submitting plot for rendering: %s', writer.out_path)
+        self.results.append(self.pool.apply_async(_render_plot, (writer,)))
+
+    def wait(self):
+        """
+        Wait for all submitted plots to be rendered and stop the workers, errors of the workers are raised again
+        """
+        self.pool.close()
+        try:
+            for result in self.results:
+                logging.debug('Rendered plot: %s', result.get())
+        finally:
+            self.terminate()
+
+    def terminate(self):
+        """
+        Stop the workers without waiting for submitted plots, used when the run fails
+        """
+        if self.is_terminated:
+            return
+        self.is_terminated = True
+        self.pool.terminate()
+        self.pool.join()
+
+
+class PlotWriter(OutputWriter):
+    """
+    Output writer of a single figure, rendered in save_plot either directly or using a PlotRenderPool.
+    """
+
+    def __init__(self, out_path, render_pool=None):
+        """
+        :param out_path: Output file path
+        :param render_pool: PlotRenderPool used to render the figure in the background, render directly if None
+        """
+        super(PlotWriter, self).__init__(out_path)
+        self.render_pool = render_pool
+        self.is_rendered = False
+
+    def save_plot(self):
+        raise NotImplementedError()
+
+    def render(self):
+        """
+        Render the figure, no more records can be added afterwards
+        """
+        if self.is_rendered:
+            return
+        self.is_rendered = True
+        if self.render_pool is not None:
+            self.render_pool.submit(self)
+        else:
+            self.save_plot()
+
+    def close(self):
+        self.render()
+
+    def __getstate__(self):
+        # Pool cannot be sent to the worker process
+        state = self.__dict__.copy()
+        state['render_pool'] = None
+        return state
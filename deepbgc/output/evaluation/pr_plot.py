@@ -1,7 +1,7 @@
 import logging
-from matplotlib import pyplot as plt
-from sklearn.metrics import precision_recall_curve, average_precision_score
-from deepbgc.output.evaluation.roc_plot import CurvePlotWriter
+from deepbgc.output.evaluation.plot_writer import get_pyplot
+import numpy as np
+from deepbgc.output.evaluation.roc_plot import CurvePlotWriter, get_threshold_counts
 
 
 class PrecisionRecallPlotWriter(CurvePlotWriter):
@@ -14,11 +14,11 @@ class PrecisionRecallPlotWriter(CurvePlotWriter):
     def get_name(cls):
         return 'pr-plot'
 
-    def plot_curve(self, true_values, predictions, ax=None, title='Precision-Recall', label='PR', lw=1, **kwargs):
+    def plot_curve(self, positive_counts, negative_counts, ax=None, title='Precision-Recall', label='PR', lw=1, **kwargs):
         """
         Plot Precision-Recall curve of a single model. Can be called repeatedly with same axis to plot multiple curves.
-        :param true_values: Series of true values
-        :param predictions: Series of prediction values
+        :param positive_counts: Number of positive samples in each score bin
+        :param negative_counts: Number of negative samples in each score bin
         :param ax: Use given axis (will create new one if None)
         :param title: Plot title
         :param label: ROC curve label
@@ -26,16 +26,22 @@ class PrecisionRecallPlotWriter(CurvePlotWriter):
         :param kwargs: Additional arguments for plotting function
         :return: Figure axis
         """
-        precision, recall, _ = precision_recall_curve(true_values, predictions)
+        plt = get_pyplot()
+        true_positives, false_positives = get_threshold_counts(positive_counts, negative_counts)
+        # Thresholds without any predicted positives do not change the curve
+        nonempty = (true_positives + false_positives) > 0
+        true_positives, false_positives = true_positives[nonempty], false_positives[nonempty]
+        precision = true_positives / (true_positives + false_positives)
+        recall = true_positives / true_positives[-1]
 
         if ax is None:
             fig, ax = plt.subplots(1, 1, figsize=(6, 5))
 
-        avg_precision = average_precision_score(true_values, predictions)
+        avg_precision = np.sum(np.diff(np.concatenate([[0], recall])) * precision)
         label_pr = label + ': {:.3f} AvgPrec'.format(avg_precision)
         logging.info('Precision-Recall result: %s', label_pr)
 
-        ax.step(recall, precision, where='post', label=label_pr, lw=lw, **kwargs)
+        ax.step(np.concatenate([[0], recall]), np.concatenate([[1], precision]), where='pre', label=label_pr, lw=lw, **kwargs)
 
         ax.set_title(title)
         ax.set_xlabel('Recall')
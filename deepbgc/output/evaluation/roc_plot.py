@@ -1,12 +1,37 @@
+import collections
 import logging
 
+from deepbgc import util
 from deepbgc.output.evaluation.pfam_score_plot import PfamScorePlotWriter
-from matplotlib import pyplot as plt
-import pandas as pd
-from sklearn.metrics import roc_curve, auc
+from deepbgc.output.evaluation.plot_writer import get_pyplot
+import numpy as np
+
+
+# Number of score bins used to count true and false positives at each score threshold
+NUM_SCORE_BINS = 1000
+
+
+def get_threshold_counts(positive_counts, negative_counts):
+    """
+    Get number of true and false positives when using the lower edge of each score bin as threshold
+    :param positive_counts: Number of positive samples in each score bin
+    :param negative_counts: Number of negative samples in each score bin
+    :return: Tuple of arrays (true positives, false positives), starting from the highest threshold
+    """
+    return np.cumsum(positive_counts[::-1]), np.cumsum(negative_counts[::-1])
 
 
 class CurvePlotWriter(PfamScorePlotWriter):
+    """
+    Evaluation curve of per-Pfam BGC scores of all sequences with annotated BGCs.
+    Only the number of positive and negative Pfam domains in each score bin is kept for each detector.
+    """
+
+    def __init__(self, out_path, num_bins=NUM_SCORE_BINS, render_pool=None):
+        super(CurvePlotWriter, self).__init__(out_path, render_pool=render_pool)
+        self.num_bins = num_bins
+        # Dictionary of {detector name: (positive counts, negative counts)}
+        self.detector_counts = collections.OrderedDict()
 
     @classmethod
     def get_description(cls):
@@ -16,43 +41,47 @@ class CurvePlotWriter(PfamScorePlotWriter):
     def get_name(cls):
         return 'roc-plot'
 
-    def get_scores_and_responses(self):
-        scores = []
-        responses = []
-        for i, (detector_scores, detector_names) in enumerate(zip(self.sequence_scores, self.sequence_detector_names)):
-            if 'in_cluster' not in detector_scores.columns:
-                continue
-            sample_responses = detector_scores['in_cluster']
-            responses.append(sample_responses)
-            sample_scores = detector_scores.drop('in_cluster', axis=1)
-            sample_scores.columns = detector_names
-            scores.append(sample_scores)
+    def is_full(self):
+        # All sequences are evaluated
+        return False
 
-        return scores, responses
-
-    def plot_curve(self, true_values, predictions, ax=None, title=None, label=None, **kwargs):
+    def write_scores(self, title, scores, detector_meta):
+        if 'in_cluster' not in scores.columns:
+            return
+        responses = scores['in_cluster'].values.astype(bool)
+        for name in np.unique([meta['name'] for meta in detector_meta]):
+            values = scores[util.format_bgc_score_column(name)].values.astype(np.float64)
+            valid = ~np.isnan(values)
+            bins = np.clip((values[valid] * self.num_bins).astype(np.int64), 0, self.num_bins - 1)
+            if name not in self.detector_counts:
+                self.detector_counts[name] = (np.zeros(self.num_bins, dtype=np.int64), np.zeros(self.num_bins, dtype=np.int64))
+            positive_counts, negative_counts = self.detector_counts[name]
+            positive_counts += np.bincount(bins[responses[valid]], minlength=self.num_bins)
+            negative_counts += np.bincount(bins[~responses[valid]], minlength=self.num_bins)
+
+    def plot_curve(self, positive_counts, negative_counts, ax=None, title=None, label=None, **kwargs):
         raise NotImplementedError()
 
     def plot_extras(self, ax):
         pass
 
     def save_plot(self):
-        scores, responses = self.get_scores_and_responses()
-
-        if not scores:
+        plt = get_pyplot()
+        if not self.detector_counts:
             logging.debug('No clusters were annotated, skipping evaluation plot %s', self.out_path)
             return
 
-        merged_scores = pd.concat(scores, sort=False)
-        merged_responses = pd.concat(responses, sort=False)
-
         fig, ax = plt.subplots(1, 1, figsize=(5, 5))
         self.plot_extras(ax)
-        for name in merged_scores.columns:
-            self.plot_curve(merged_responses, merged_scores[name], label=name, ax=ax)
+        for name, (positive_counts, negative_counts) in self.detector_counts.items():
+            if not positive_counts.sum() or not negative_counts.sum():
+                logging.debug('Skipping evaluation curve of %s, both positive and negative Pfam domains are needed', name)
+                continue
+            self.plot_curve(positive_counts, negative_counts, label=name, ax=ax)
 
         logging.debug('Saving evaluation curve plot to: %s', self.out_path)
         fig.savefig(self.out_path, dpi=150, bbox_inches='tight')
+        plt.close(fig)
 
 
 class ROCPlotWriter(CurvePlotWriter):
@@ -68,28 +97,31 @@ class ROCPlotWriter(CurvePlotWriter):
     def plot_extras(self, ax):
         ax.plot([0, 1], [0, 1], color='grey', lw=0.5, linestyle='--')
 
-    def plot_curve(self, true_values, predictions, ax=None, title='ROC', label='ROC', lw=1, add_auc=True, **kwargs):
+    def plot_curve(self, positive_counts, negative_counts, ax=None, title='ROC', label='ROC', lw=1, add_auc=True, **kwargs):
         """
         Plot ROC curve of a single model. Can be called repeatedly with same axis to plot multiple curves.
-        :param true_values: Series of true values
-        :param predictions: Series of prediction values
+        :param positive_counts: Number of positive samples in each score bin
+        :param negative_counts: Number of negative samples in each score bin
         :param ax: Use given axis (will create new one if None)
         :param title: Plot title
         :param label: ROC curve label
         :param lw: Line width
         :param add_auc: Add AUC value to label
-        :param baseline: Plot baseline that indicates performance of random model (AUC 0.5)
-        :param figsize: Figure size
         :param kwargs: Additional arguments for plotting function
         :return: Figure axis
         """
-        fpr, tpr, _ = roc_curve(true_values, predictions)
-        roc_auc = auc(fpr, tpr)
+        plt = get_pyplot()
+        true_positives, false_positives = get_threshold_counts(positive_counts, negative_counts)
+        tpr = np.concatenate([[0], true_positives / true_positives[-1]])
+        fpr = np.concatenate([[0], false_positives / false_positives[-1]])
+        roc_auc = np.trapz(tpr, fpr)
         label_auc = label + ': {:.3f} AUC'.format(roc_auc)
         logging.info('ROC result: %s', label_auc)
+        if ax is None:
+            fig, ax = plt.subplots(1, 1, figsize=(5, 5))
         ax.plot(fpr, tpr, lw=lw, label=label_auc if add_auc else label, **kwargs)
         ax.set_title(title)
         ax.set_xlabel('FPR')
         ax.set_ylabel('TPR')
         ax.legend(loc='lower right', frameon=False)
-        return ax
\ No newline at end of file
+        return ax
@@ -1,13 +1,12 @@
 from Bio import SeqIO
-from deepbgc.output.writer import OutputWriter
+from deepbgc.output.writer import FileOutputWriter
 import os
 
 
-class GenbankWriter(OutputWriter):
+class GenbankWriter(FileOutputWriter):
     def __init__(self, out_path):
-        super(GenbankWriter, self).__init__(out_path)
-        self.tmp_out_path = self.out_path + '.part'
-        self.fd = open(self.tmp_out_path, 'w')
+        super(GenbankWriter, self).__init__(out_path, write_path=out_path + '.part')
+        self.tmp_out_path = self.write_path
 
     @classmethod
     def get_description(cls):
@@ -17,10 +16,10 @@ class GenbankWriter(OutputWriter):
     def get_name(cls):
         return 'genbank'
 
-    def write(self, record):
-        SeqIO.write(record, self.fd, 'genbank')
+    def write(self, record, tables=None):
+        SeqIO.write(record, self.get_fd(), 'genbank')
 
     def close(self):
-        self.fd.close()
+        self.get_fd().close()
         # Move file.gbk.part to file.gbk
         os.rename(self.tmp_out_path, self.out_path)
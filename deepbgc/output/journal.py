@@ -0,0 +1,110 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import hashlib
+import json
+import logging
+import os
+
+
+def get_record_hash(record):
+    """
+    Get hash of record ID and sequence, used to check that resumed runs process the same input
+    :param record: SeqRecord
+    :return: Hex digest string
+    """
+    md5 = hashlib.md5()
+    md5.update(record.id.encode('utf-8'))
+    md5.update(b'\n')
+    md5.update(str(record.seq).encode('utf-8'))
+    return md5.hexdigest()
+
+
+class RecordJournal(object):
+    """
+    Append-only journal of records whose outputs have been completely written, used to resume interrupted runs.
+
+    Each line is a JSON object with the record ordinal number, ID, content hash and checkpoint of each
+    resumable output writer (see OutputWriter.checkpoint), synced to disk after the record outputs if enabled.
+    """
+
+    def __init__(self, path, resume=False, sync=True):
+        """
+        :param path: Journal file path
+        :param resume: Load entries of an existing journal and continue appending to it, start a new journal otherwise
+        :param sync: Sync outputs and the journal to disk after each record, needed only to resume interrupted runs,
+        offsets of records in the outputs are recorded either way
+        """
+        self.path = path
+        self.sync = sync
+        self.entries = []
+        if resume:
+            if os.path.exists(path):
+                self._load()
+            else:
+                logging.warning('No checkpoint found in %s, starting from the first record', path)
+        self.fd = open(path, 'a' if resume else 'w')
+
+    def _load(self):
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                # Last line can be incomplete if the run was interrupted while writing it
+                if not line.endswith(b'\n'):
+                    break
+                self.entries.append(json.loads(line.decode('utf-8')))
+                valid_size += len(line)
+        with open(self.path, 'r+') as f:
+            f.truncate(valid_size)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_last_checkpoints(self):
+        """
+        Get output writer checkpoints saved after the last completed record
+        :return: Dictionary of {output path: checkpoint}, empty if no records were completed
+        """
+        return self.entries[-1]['outputs'] if self.entries else {}
+
+    def is_completed(self, ordinal, record):
+        """
+        Check whether given input record was completed in the previous run
+        :param ordinal: Record ordinal number in the input, starting from 1
+        :param record: Input SeqRecord
+        :return: True if the record was completed, False otherwise
+        """
+        if ordinal > len(self.entries):
+            return False
+        entry = self.entries[ordinal - 1]
+        if entry['id'] != record.id or entry['hash'] != get_record_hash(record):
+            raise ValueError('Input record #{} ({}) does not match record {} completed in the previous run, '
+                             'input files have changed since the checkpoint'.format(ordinal, record.id, entry['id']))
+        return True
+
+    def append(self, ordinal, record, writers):
+        """
+        Checkpoint all output writers and record given record as completed
+        :param ordinal: Record ordinal number in the input, starting from 1
+        :param record: Processed SeqRecord
+        :param writers: List of OutputWriters the record was written to
+        """
+        outputs = {}
+        for writer in writers:
+            checkpoint = writer.checkpoint(sync=self.sync)
+            if checkpoint is not None:
+                outputs[writer.out_path] = checkpoint
+        entry = dict(ordinal=ordinal, id=record.id, hash=get_record_hash(record), outputs=outputs)
+        self.fd.write(json.dumps(entry, sort_keys=True) + '\n')
+        if self.sync:
+            self.fd.flush()
+            os.fsync(self.fd.fileno())
+        self.entries.append(entry)
+
+    def close(self, remove=False):
+        self.fd.close()
+        if remove:
+            os.remove(self.path)
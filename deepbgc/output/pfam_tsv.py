@@ -1,10 +1,12 @@
 import logging
 
-from deepbgc import util
+from deepbgc.output.tables import PFAM_TABLE
 from deepbgc.output.writer import TSVWriter
+from deepbgc.vocabulary import PFAM_CODE_COLUMN
 
 
 class PfamTSVWriter(TSVWriter):
+    required_tables = [PFAM_TABLE]
 
     @classmethod
     def get_description(cls):
@@ -14,7 +16,9 @@ class PfamTSVWriter(TSVWriter):
     def get_name(cls):
         return 'pfam-tsv'
 
-    def record_to_df(self, record):
-        df = util.create_pfam_dataframe(record, add_scores=True, add_in_cluster=True)
+    def record_to_df(self, record, tables):
+        df = tables.get(PFAM_TABLE)
+        # Pfam codes are only valid in the current process
+        df = df.drop(columns=[PFAM_CODE_COLUMN], errors='ignore')
         logging.debug('Writing %s Pfams to: %s', len(df), self.out_path)
         return df
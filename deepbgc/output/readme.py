@@ -24,7 +24,7 @@ class ReadmeWriter(OutputWriter):
     def get_name(cls):
         return 'readme'
 
-    def write(self, record):
+    def write(self, record, tables=None):
         pass
 
     def close(self):
@@ -0,0 +1,79 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import collections
+import importlib
+import os
+
+# Output writers by name (see OutputWriter.get_name): writer class path, output file suffix, whether the output is a plot.
+# Writer classes are imported only when the output is enabled, so that disabled outputs (and matplotlib) are never loaded.
+# Names must match get_name() of the writer classes.
+OUTPUT_WRITERS = collections.OrderedDict([
+    ('genbank', ('deepbgc.output.genbank.GenbankWriter', '.full.gbk', False)),
+    ('bgc-genbank', ('deepbgc.output.bgc_genbank.BGCGenbankWriter', '.bgc.gbk', False)),
+    ('bgc-tsv', ('deepbgc.output.cluster_tsv.ClusterTSVWriter', '.bgc.tsv', False)),
+    ('pfam-tsv', ('deepbgc.output.pfam_tsv.PfamTSVWriter', '.pfam.tsv', False)),
+    ('score-store', ('deepbgc.output.score_store.ScoreStoreWriter', '.scores.bin', False)),
+    ('pfam-score-plot', ('deepbgc.output.evaluation.pfam_score_plot.PfamScorePlotWriter', '.score.png', True)),
+    ('bgc-region-plot', ('deepbgc.output.evaluation.bgc_region_plot.BGCRegionPlotWriter', '.bgc.png', True)),
+    ('roc-plot', ('deepbgc.output.evaluation.roc_plot.ROCPlotWriter', '.roc.png', True)),
+    ('pr-plot', ('deepbgc.output.evaluation.pr_plot.PrecisionRecallPlotWriter', '.pr.png', True)),
+])
+
+# Outputs produced with --minimal-output
+MINIMAL_OUTPUTS = ['genbank']
+
+
+def is_plot_output(name):
+    return OUTPUT_WRITERS[name][2]
+
+
+def parse_outputs(value, is_minimal_output=False):
+    """
+    Get names of enabled outputs, writers are created and called in the given order
+    :param value: Comma-separated output names, or None to enable all outputs in the order of the registry
+    :param is_minimal_output: Enable only the minimal outputs if no names are provided
+    :return: List of output names
+    """
+    if not value:
+        return list(MINIMAL_OUTPUTS if is_minimal_output else OUTPUT_WRITERS)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in OUTPUT_WRITERS]
+    if unknown:
+        raise ValueError('Unknown output: {}'.format(', '.join(unknown)),
+                         'Available outputs: {}'.format(', '.join(OUTPUT_WRITERS)))
+    return [name for i, name in enumerate(names) if name not in names[:i]]
+
+
+def get_output_writer_class(name):
+    """
+    Import output writer class of given output
+    :param name: Output name
+    :return: OutputWriter subclass
+    """
+    module_name, class_name = OUTPUT_WRITERS[name][0].rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_output_writers(names, output_path, evaluation_path, output_file_name, render_pool=None):
+    """
+    Create output writers of the report directory
+    :param names: List of output names
+    :param output_path: Report directory path
+    :param evaluation_path: Evaluation plot directory path
+    :param output_file_name: Prefix of output file names
+    :param render_pool: PlotRenderPool used to render plots in the background, render directly if None
+    :return: List of OutputWriters
+    """
+    writers = []
+    for name in names:
+        writer_class = get_output_writer_class(name)
+        _, suffix, is_plot = OUTPUT_WRITERS[name]
+        if is_plot:
+            writers.append(writer_class(out_path=os.path.join(evaluation_path, output_file_name + suffix), render_pool=render_pool))
+        else:
+            writers.append(writer_class(out_path=os.path.join(output_path, output_file_name + suffix)))
+    return writers
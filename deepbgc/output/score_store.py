@@ -0,0 +1,129 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import collections
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+
+from deepbgc import util
+from deepbgc.output.writer import FileOutputWriter
+
+
+class ScoreStoreWriter(FileOutputWriter):
+    """
+    Binary store of BGC detection scores with protein and Pfam domain coordinates, used to detect BGCs
+    with different thresholds without parsing the GenBank output or running the models (see "deepbgc rethreshold").
+
+    Each record is saved as a sequence of NumPy .npy blocks: A JSON header with the record ID, detector metadata
+    and names of the following arrays, then the arrays themselves. Scores are saved with the precision of the
+    score qualifiers, so that BGCs detected from the store are identical to the ones detected by the pipeline.
+    """
+    binary = True
+
+    @classmethod
+    def get_description(cls):
+        return 'Per-domain and per-protein BGC detection scores, used to change detection thresholds ' \
+               'using "deepbgc rethreshold" without running the models'
+
+    @classmethod
+    def get_name(cls):
+        return 'score-store'
+
+    def write(self, record, tables=None):
+        detectors = list(util.get_record_detector_meta(record).values())
+        if not detectors:
+            return
+        proteins = util.get_protein_features(record)
+        pfams = util.get_pfam_features(record)
+        protein_idx = {}
+        for i, protein in enumerate(proteins):
+            for protein_id in util.get_protein_ids(protein):
+                protein_idx.setdefault(protein_id, i)
+
+        arrays = collections.OrderedDict()
+        arrays['protein_ids'] = np.array([util.get_protein_id(protein) for protein in proteins], dtype=np.unicode_)
+        arrays['protein_starts'] = np.array([int(protein.location.start) for protein in proteins], dtype=np.int64)
+        arrays['protein_ends'] = np.array([int(protein.location.end) for protein in proteins], dtype=np.int64)
+        arrays['pfam_ids'] = np.array([util.get_pfam_id(pfam) or '' for pfam in pfams], dtype=np.unicode_)
+        arrays['pfam_starts'] = np.array([int(pfam.location.start) for pfam in pfams], dtype=np.int64)
+        arrays['pfam_ends'] = np.array([int(pfam.location.end) for pfam in pfams], dtype=np.int64)
+        arrays['pfam_protein_idx'] = np.array([protein_idx.get(util.get_pfam_protein_id(pfam), -1) for pfam in pfams],
+                                              dtype=np.int64)
+        # Annotated clusters are used to evaluate detection, see "deepbgc sweep"
+        annotated = util.get_cluster_features(record, 'annotated')
+        arrays['annotated_starts'] = np.array([int(f.location.start) for f in annotated], dtype=np.int64)
+        arrays['annotated_ends'] = np.array([int(f.location.end) for f in annotated], dtype=np.int64)
+        for meta in detectors:
+            score_column = util.format_bgc_score_column(meta['name'])
+            arrays[get_domain_scores_key(meta['label'])] = _get_scores(pfams, score_column, np.float32)
+            arrays[get_protein_scores_key(meta['label'])] = _get_scores(proteins, score_column, np.float64)
+
+        header = dict(id=record.id, description=record.description, detectors=detectors, arrays=list(arrays.keys()))
+        fd = self.get_fd()
+        np.save(fd, np.array(json.dumps(header), dtype=np.unicode_))
+        for values in arrays.values():
+            np.save(fd, values)
+
+
+def _get_scores(features, score_column, dtype):
+    return np.array([float(feature.qualifiers[score_column][0]) if feature.qualifiers.get(score_column) else np.nan
+                     for feature in features], dtype=dtype)
+
+
+def get_domain_scores_key(detector_label):
+    return 'domain_scores:' + detector_label
+
+
+def get_protein_scores_key(detector_label):
+    return 'protein_scores:' + detector_label
+
+
+RecordScores = collections.namedtuple('RecordScores', ['id', 'description', 'detectors', 'arrays'])
+
+
+def read_score_store(path):
+    """
+    Read records saved using ScoreStoreWriter
+    :param path: Score store file path
+    :return: Generator of RecordScores with record ID, description, list of detector metadata dicts and dict of arrays
+    """
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                header = np.load(f)
+            except (EOFError, ValueError):
+                # ValueError is raised by older NumPy versions at the end of the file
+                break
+            header = json.loads(str(header))
+            arrays = collections.OrderedDict((key, np.load(f)) for key in header['arrays'])
+            yield RecordScores(id=header['id'], description=header.get('description'), detectors=header['detectors'],
+                               arrays=arrays)
+    logging.debug('Finished reading scores from: %s', path)
+
+
+def get_pfam_score_table(record_scores):
+    """
+    Create table of Pfam domain BGC scores of given record, with the score columns of the Pfam TSV output
+    :param record_scores: RecordScores
+    :return: DataFrame with score column of each detector and "in_cluster" column if the record has annotated BGCs
+    """
+    arrays = record_scores.arrays
+    df = pd.DataFrame(index=np.arange(len(arrays['pfam_starts'])))
+    annotated_starts = arrays.get('annotated_starts', np.array([], dtype=np.int64))
+    annotated_ends = arrays.get('annotated_ends', np.array([], dtype=np.int64))
+    if len(annotated_starts):
+        pfam_starts = arrays['pfam_starts']
+        df['in_cluster'] = ((pfam_starts[:, None] >= annotated_starts[None, :])
+                            & (pfam_starts[:, None] < annotated_ends[None, :])).any(axis=1).astype(int)
+    for meta in record_scores.detectors:
+        # Labels of the same detector share the same scores
+        score_column = util.format_bgc_score_column(meta['name'])
+        if score_column not in df.columns:
+            df[score_column] = arrays[get_domain_scores_key(meta['label'])].astype(np.float64)
+    return df
@@ -0,0 +1,137 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import importlib
+import json
+import logging
+import os
+
+from deepbgc.output.writer import FileOutputWriter, TSVWriter
+
+SHARD_MANIFEST_FILENAME = 'shard.json'
+SHARD_RECORDS_FILENAME = 'shard.records.jsonl'
+# Size of blocks copied when merging shard outputs
+COPY_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def save_shard_manifest(output, output_file_name, shard, journal, writers, plots):
+    """
+    Describe outputs of a completed shard run, so that they can be merged with other shards (see "deepbgc merge").
+    The record journal with output offsets after each record is kept in the shard directory.
+    :param output: Shard output directory path
+    :param output_file_name: Prefix of output file names
+    :param shard: Tuple (shard number starting from 1, number of shards)
+    :param journal: RecordJournal of the run
+    :param writers: List of output writers of the run
+    :param plots: Names of evaluation plot outputs rendered when merging
+    """
+    outputs = []
+    for writer in writers:
+        if not isinstance(writer, FileOutputWriter):
+            continue
+        outputs.append(dict(
+            name=writer.get_name(),
+            writer='{}.{}'.format(type(writer).__module__, type(writer).__name__),
+            key=writer.out_path,
+            suffix=os.path.basename(writer.out_path)[len(output_file_name):],
+            header=isinstance(writer, TSVWriter)
+        ))
+    num_records = len(journal)
+    journal.close()
+    os.rename(journal.path, os.path.join(output, SHARD_RECORDS_FILENAME))
+    manifest = dict(shard=shard[0], num_shards=shard[1], num_records=num_records, plots=plots, outputs=outputs)
+    with open(os.path.join(output, SHARD_MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    logging.info('Saved shard %s of %s with %s records, merge all shards using "deepbgc merge"',
+                 shard[0], shard[1], num_records)
+
+
+def load_shard_manifest(shard_path):
+    """
+    Load manifest of a completed shard run
+    :param shard_path: Shard output directory path
+    :return: Manifest dict, see save_shard_manifest
+    """
+    manifest_path = os.path.join(shard_path, SHARD_MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        raise ValueError('Shard manifest not found: {}'.format(manifest_path),
+                         'Make sure the path is an output directory of a completed "deepbgc pipeline --shard" run.')
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def get_writer_class(output):
+    """
+    Get output writer class of given shard output
+    :param output: Output dict from the shard manifest
+    :return: OutputWriter subclass
+    """
+    module_name, class_name = output['writer'].rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class ShardReader(object):
+    """
+    Reads outputs of a single shard record by record, using output offsets saved in the record journal.
+    """
+
+    def __init__(self, shard_path, manifest):
+        self.shard_path = shard_path
+        self.manifest = manifest
+        self.records_fd = open(os.path.join(shard_path, SHARD_RECORDS_FILENAME), 'r')
+        self.fds = {}
+        self.positions = {}
+
+    def next_record(self):
+        """
+        :return: Journal entry of the next record with its ID and output offsets
+        """
+        line = self.records_fd.readline()
+        if not line:
+            raise ValueError('Unexpected end of shard records: {}'.format(self.shard_path))
+        return json.loads(line)
+
+    def _get_fd(self, output):
+        suffix = output['suffix']
+        if suffix not in self.fds:
+            self.fds[suffix] = open(os.path.join(self.shard_path, os.path.basename(output['key'])), 'rb')
+        return self.fds[suffix]
+
+    def copy_record(self, output, entry, out_fd, skip_header):
+        """
+        Copy part of given output written for given record
+        :param output: Output dict from the shard manifest
+        :param entry: Journal entry of the record
+        :param out_fd: Binary file handle of the merged output
+        :param skip_header: Do not copy the TSV header line
+        :return: True if a TSV header was copied
+        """
+        start = self.positions.get(output['suffix'], 0)
+        end = entry['outputs'][output['key']]
+        self.positions[output['suffix']] = end
+        if end <= start:
+            return False
+        fd = self._get_fd(output)
+        copied_header = False
+        if output['header'] and start == 0:
+            header = fd.readline()
+            start += len(header)
+            if not skip_header:
+                out_fd.write(header)
+                copied_header = True
+        remaining = end - start
+        while remaining > 0:
+            block = fd.read(min(COPY_BLOCK_SIZE, remaining))
+            if not block:
+                raise ValueError('Unexpected end of shard output: {}'.format(fd.name))
+            out_fd.write(block)
+            remaining -= len(block)
+        return copied_header
+
+    def close(self):
+        self.records_fd.close()
+        for fd in self.fds.values():
+            fd.close()
@@ -0,0 +1,84 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import collections
+
+from deepbgc import util
+
+PFAM_TABLE = 'pfam-table'
+CLUSTER_TABLE = 'cluster-table'
+CLUSTER_RECORDS = 'cluster-records'
+
+
+def create_pfam_table(record):
+    """
+    :return: DataFrame of Pfam domains in genomic order, with detection scores and in_cluster column
+    """
+    return util.create_pfam_dataframe(record, add_scores=True, add_in_cluster=True)
+
+
+def create_cluster_table(record):
+    """
+    :return: DataFrame of detected BGCs with their Pfam domains, proteins and classification scores
+    """
+    return util.create_cluster_dataframe(record, add_classification=True)
+
+
+def create_cluster_records(record):
+    """
+    :return: List of SeqRecords of detected BGCs
+    """
+    return [util.extract_cluster_record(cluster, record) for cluster in util.get_cluster_features(record)]
+
+
+# Tables derived from a record that can be required by output writers (see OutputWriter.required_tables)
+RECORD_TABLES = collections.OrderedDict([
+    (PFAM_TABLE, create_pfam_table),
+    (CLUSTER_TABLE, create_cluster_table),
+    (CLUSTER_RECORDS, create_cluster_records),
+])
+
+
+def get_required_tables(writers):
+    """
+    :param writers: List of output writers
+    :return: Names of tables required by any of the writers
+    """
+    required = set()
+    for writer in writers:
+        required.update(writer.required_tables)
+    return [name for name in RECORD_TABLES if name in required]
+
+
+class RecordTables(object):
+    """
+    Tables derived from a single record, each computed at most once and shared by all output writers that need it.
+    Shared tables should not be modified by the writers.
+    """
+
+    def __init__(self, record, names):
+        """
+        :param record: SeqRecord
+        :param names: Names of tables that can be used, see RECORD_TABLES
+        """
+        unknown = [name for name in names if name not in RECORD_TABLES]
+        if unknown:
+            raise ValueError('Unknown record table: {}'.format(', '.join(unknown)))
+        self.record = record
+        self.names = list(names)
+        self.tables = {}
+
+    def get(self, name):
+        """
+        Get table of the record, computing it on first use
+        :param name: Table name, see RECORD_TABLES
+        :return: Table of the record
+        """
+        if name not in self.names:
+            raise ValueError('Record table "{}" was not declared as required by the output writer'.format(name))
+        if name not in self.tables:
+            self.tables[name] = RECORD_TABLES[name](self.record)
+        return self.tables[name]
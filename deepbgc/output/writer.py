@@ -1,15 +1,47 @@
+import os
+
+from deepbgc.output.tables import RecordTables
+
 
 class OutputWriter(object):
+    # Names of tables derived from each record used by the writer, computed once and shared by all writers (see RecordTables)
+    required_tables = []
 
     def __init__(self, out_path):
         self.out_path = out_path
 
-    def write(self, record):
+    def write(self, record, tables=None):
+        """
+        Write a single record
+        :param record: SeqRecord
+        :param tables: RecordTables of the record shared with other writers, created by the writer if None
+        """
         raise NotImplementedError()
 
+    def get_tables(self, record, tables=None):
+        """
+        :return: Given shared RecordTables, or new RecordTables with tables required by this writer if None
+        """
+        return tables if tables is not None else RecordTables(record, self.required_tables)
+
     def close(self):
         pass
 
+    def checkpoint(self, sync=True):
+        """
+        Get position after all written records, used to resume interrupted runs and merge shards (see RecordJournal)
+        :param sync: Make all written records durable on disk
+        :return: JSON-serializable checkpoint, or None if the writer keeps its state in memory and cannot be resumed
+        """
+        return None
+
+    def resume(self, checkpoint):
+        """
+        Continue writing from given checkpoint, discarding anything written after it
+        :param checkpoint: Checkpoint returned by checkpoint()
+        """
+        raise NotImplementedError()
+
     @classmethod
     def get_name(cls):
         raise NotImplementedError()
@@ -19,26 +51,70 @@ class OutputWriter(object):
         raise NotImplementedError()
 
 
-class TSVWriter(OutputWriter):
+class FileOutputWriter(OutputWriter):
+    """
+    Output writer appending records to a single file. The file is opened on first write
+    and can be resumed from a checkpoint (file size after the last completed record).
+    """
+    # Open the file in binary mode
+    binary = False
+
+    def __init__(self, out_path, write_path=None):
+        """
+        :param out_path: Output file path
+        :param write_path: Path of the file being written, if different from the final output path
+        """
+        super(FileOutputWriter, self).__init__(out_path)
+        self.write_path = write_path or out_path
+        self.fd = None
+        self.is_resumed = False
+
+    def get_fd(self):
+        if self.fd is None:
+            mode = 'a' if self.is_resumed else 'w'
+            self.fd = open(self.write_path, mode + 'b' if self.binary else mode)
+        return self.fd
+
+    def checkpoint(self, sync=True):
+        if self.fd is None:
+            return 0
+        if sync:
+            self.fd.flush()
+            os.fsync(self.fd.fileno())
+        return self.fd.tell()
+
+    def resume(self, checkpoint):
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+        if os.path.exists(self.write_path):
+            with open(self.write_path, 'r+') as f:
+                f.truncate(checkpoint)
+        self.is_resumed = True
+
+    def close(self):
+        if self.fd is not None:
+            self.fd.close()
+
+
+class TSVWriter(FileOutputWriter):
 
     def __init__(self, out_path):
         super(TSVWriter, self).__init__(out_path)
         self.written = False
 
-    def record_to_df(self, record):
+    def record_to_df(self, record, tables):
         raise NotImplementedError()
 
-    def write(self, record):
-        df = self.record_to_df(record)
+    def write(self, record, tables=None):
+        df = self.record_to_df(record, self.get_tables(record, tables))
         if df.empty:
             return
 
-        if self.written:
-            mode = 'a'
-            header = False
-        else:
-            mode = 'w'
-            header = True
-
-        df.to_csv(self.out_path, mode=mode, header=header, index=False, sep='\t')
+        # Header is written only before the first row
+        df.to_csv(self.get_fd(), header=not self.written, index=False, sep='\t')
         self.written = True
+
+    def resume(self, checkpoint):
+        super(TSVWriter, self).resume(checkpoint)
+        self.written = checkpoint > 0
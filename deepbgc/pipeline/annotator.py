@@ -1,15 +1,50 @@
 import logging
-from deepbgc.pipeline.pfam import HmmscanPfamRecordAnnotator
+from deepbgc.pipeline.pfam import HmmscanPfamRecordAnnotator, PfamSearchBackend, HmmscanPfamSearch, \
+    HmmsearchPfamSearch, create_pfam_search_backend
 from deepbgc.pipeline.protein import ProdigalProteinRecordAnnotator
 from deepbgc import util
 from deepbgc.pipeline.step import PipelineStep
 import os
 
 
+# Records with at least this number of proteins are searched using hmmsearch instead of hmmscan by default
+HMMSEARCH_MIN_PROTEINS = 5000
+
+
 class DeepBGCAnnotator(PipelineStep):
 
-    def __init__(self, tmp_dir_path):
+    def __init__(self, tmp_dir_path, pfam_backend='hmmscan', pfam_cpus=None, hmmsearch_min_proteins=HMMSEARCH_MIN_PROTEINS,
+                 pfam_db_path=None, pfam_num_profiles=None):
+        """
+        :param tmp_dir_path: Directory for temporary files
+        :param pfam_backend: Pfam search backend name (hmmscan, hmmsearch, pyhmmer) or PfamSearchBackend instance,
+        the backend is shared by all annotated records.
+        :param pfam_cpus: Number of CPUs used by the Pfam search backend.
+        :param hmmsearch_min_proteins: Use hmmsearch instead of hmmscan for records with at least given number of proteins.
+        Set to None or 0 to always use the selected backend.
+        :param pfam_db_path: Custom Pfam DB path (such as Pfam DB reduced to profiles used by models), downloaded Pfam DB is used by default.
+        :param pfam_num_profiles: Number of profiles used as database size for E-value calculation,
+        provide number of profiles in full Pfam DB when using a reduced Pfam DB.
+        """
         self.tmp_dir_path = tmp_dir_path
+        if isinstance(pfam_backend, PfamSearchBackend):
+            self.pfam_backend = pfam_backend
+        else:
+            self.pfam_backend = create_pfam_search_backend(pfam_backend, db_path=pfam_db_path, cpus=pfam_cpus,
+                                                           num_profiles=pfam_num_profiles)
+        self.hmmsearch_min_proteins = hmmsearch_min_proteins
+        self.hmmsearch_backend = None
+
+    def _get_pfam_backend(self, num_proteins):
+        if not self.hmmsearch_min_proteins or num_proteins < self.hmmsearch_min_proteins:
+            return self.pfam_backend
+        if type(self.pfam_backend) != HmmscanPfamSearch:
+            return self.pfam_backend
+        if self.hmmsearch_backend is None:
+            self.hmmsearch_backend = HmmsearchPfamSearch(db_path=self.pfam_backend.db_path, cpus=self.pfam_backend.cpus,
+                                                         num_profiles=self.pfam_backend.num_profiles)
+        logging.info('Using HMMER hmmsearch for record with %s >= %s proteins', num_proteins, self.hmmsearch_min_proteins)
+        return self.hmmsearch_backend
 
     def run(self, record):
         logging.info('Preparing record %s', record.id)
@@ -32,7 +67,9 @@ class DeepBGCAnnotator(PipelineStep):
         if num_pfams:
             logging.info('Sequence already contains %s Pfam features, skipping Pfam detection', num_pfams)
         else:
-            pfam_annotator = HmmscanPfamRecordAnnotator(record=record, tmp_path_prefix=record_tmp_path)
+            pfam_backend = self._get_pfam_backend(len(util.get_protein_features(record)))
+            pfam_annotator = HmmscanPfamRecordAnnotator(record=record, tmp_path_prefix=record_tmp_path,
+                                                        backend=pfam_backend)
             pfam_annotator.annotate()
 
         util.sort_record_features(record)
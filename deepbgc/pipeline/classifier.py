@@ -9,34 +9,61 @@ import six
 
 class DeepBGCClassifier(PipelineStep):
 
-    def __init__(self, classifier, score_threshold=0.5):
+    def __init__(self, classifier, score_threshold=0.5, n_jobs=None, compact=False, skip_unchanged=False):
+        """
+        :param classifier: Classifier model name
+        :param score_threshold: Minimum class score to assign the class to a BGC (inclusive)
+        :param n_jobs: Number of threads used for prediction (-1 = all cores), the model default is used if None
+        :param compact: Predict using the model compiled into a compact flat-array representation, if supported
+        :param skip_unchanged: Skip BGCs already classified using the same model version and score threshold
+        """
         if classifier is None or not isinstance(classifier, six.string_types):
             raise ValueError('Expected classifier name, got {}'.format(classifier))
         self.classifier_name = classifier
         self.score_threshold = score_threshold
-        classifier_path = util.get_model_path(self.classifier_name, 'classifier')
-        self.model = SequenceModelWrapper.load(classifier_path)
+        self.model_path = util.get_model_path(self.classifier_name, 'classifier')
+        if compact:
+            self.model = SequenceModelWrapper.load_compact(self.model_path)
+        else:
+            self.model = SequenceModelWrapper.load(self.model_path)
+        self.model.set_execution_params(n_jobs=n_jobs)
+        self.skip_unchanged = skip_unchanged
         self.total_class_counts = pd.Series()
+        self.num_skipped = 0
 
     def run(self, record):
-        cluster_features = util.get_cluster_features(record)
-        if not len(cluster_features):
+        self.run_batch([record])
+
+    def run_batch(self, records):
+        """
+        Classify BGCs of all given records using a single model prediction
+        :param records: List of records
+        """
+        clusters = [(record, feature) for record in records for feature in util.get_cluster_features(record)]
+        if self.skip_unchanged:
+            num_clusters = len(clusters)
+            clusters = [(record, feature) for record, feature in clusters if not self._is_classified(record, feature)]
+            if num_clusters > len(clusters):
+                logging.info('Skipping %s BGCs already classified using same %s model',
+                             num_clusters - len(clusters), self.classifier_name)
+                self.num_skipped += num_clusters - len(clusters)
+        if not clusters:
             return
 
-        logging.info('Classifying %s BGCs using %s model in %s', len(cluster_features), self.classifier_name, record.id)
+        logging.info('Classifying %s BGCs in %s records using %s model', len(clusters), len(records), self.classifier_name)
 
         # Create list of DataFrames with Pfam sequences (one for each cluster)
         cluster_pfam_sequences = []
-        for feature in cluster_features:
+        for record, feature in clusters:
             cluster_record = util.extract_cluster_record(feature, record)
             cluster_pfam_sequences.append(util.create_pfam_dataframe(cluster_record, add_scores=False))
 
-        # Predict BGC score of each Pfam
+        # Predict class scores of each cluster
         class_scores = self.model.predict(cluster_pfam_sequences)
 
         predicted_classes = []
         # Annotate classes to all cluster features
-        for i, feature in enumerate(cluster_features):
+        for i, (record, feature) in enumerate(clusters):
             scores = class_scores.iloc[i]
             # Add predicted score for each class
             score_column = util.format_classification_score_column(self.classifier_name)
@@ -52,23 +79,41 @@ class DeepBGCClassifier(PipelineStep):
                 feature.qualifiers[class_column] = ['-'.join(all_classes)]
             predicted_classes += new_classes or ['no confident class']
 
-        # Add detector metadata to the record as a structured comment
-        if 'structured_comment' not in record.annotations:
-            record.annotations['structured_comment'] = {}
-
-        comment_key = util.format_classifier_meta_key(self.classifier_name)
-        record.annotations['structured_comment'][comment_key] = collections.OrderedDict(
-            name=self.classifier_name,
-            version=self.model.version,
-            version_timestamp=self.model.timestamp,
-            classification_timestamp_utc=datetime.utcnow().isoformat(),
-            score_threshold=self.score_threshold
-        )
+        # Add classifier metadata to each record with BGCs as a structured comment
+        classified_records = collections.OrderedDict((id(record), record) for record, feature in clusters)
+        for record in classified_records.values():
+            if 'structured_comment' not in record.annotations:
+                record.annotations['structured_comment'] = {}
+
+            comment_key = util.format_classifier_meta_key(self.classifier_name)
+            record.annotations['structured_comment'][comment_key] = collections.OrderedDict(
+                name=self.classifier_name,
+                version=self.model.version,
+                version_timestamp=self.model.timestamp,
+                classification_timestamp_utc=datetime.utcnow().isoformat(),
+                score_threshold=self.score_threshold
+            )
 
         class_counts = pd.Series(predicted_classes).value_counts()
         self.total_class_counts = self.total_class_counts.add(class_counts, fill_value=0)
 
+    def _is_classified(self, record, feature):
+        """
+        Check whether given BGC was already classified using the same model version and score threshold
+        """
+        if not feature.qualifiers.get(util.format_classification_score_column(self.classifier_name)):
+            return False
+        meta = util.get_record_classifier_meta(record).get(self.classifier_name)
+        if not meta:
+            return False
+        # Values are strings when loaded from a GenBank file
+        return str(meta.get('version')) == str(self.model.version) \
+            and str(meta.get('version_timestamp')) == str(self.model.timestamp) \
+            and str(meta.get('score_threshold')) == str(self.score_threshold)
+
     def print_summary(self):
+        if self.num_skipped:
+            logging.info('Skipped %s BGCs already classified using %s model', self.num_skipped, self.classifier_name)
         # Print class counts
         sorted_counts = self.total_class_counts.sort_values(ascending=False).astype('int64')
         class_list = '\n'.join(' {}: {}'.format(cls, count) for cls, count in sorted_counts.items())
@@ -6,12 +6,30 @@ from Bio.SeqFeature import SeqFeature, FeatureLocation
 from deepbgc.models.wrapper import SequenceModelWrapper
 from deepbgc import util
 from deepbgc.pipeline.step import PipelineStep
+from deepbgc.vocabulary import get_pfam_codes, PfamVocabulary
 import collections
 import six
 
 class DeepBGCDetector(PipelineStep):
+    # Parameters used to segment clusters from protein scores, saved in the record metadata
+    SEGMENTATION_PARAMS = ['score_threshold', 'merge_max_nucl_gap', 'merge_max_protein_gap', 'min_nucl',
+                           'min_proteins', 'min_domains', 'min_bio_domains']
+
     def __init__(self, detector, label=None, score_threshold=0.5, merge_max_protein_gap=0,
-                 merge_max_nucl_gap=0, min_nucl=1, min_proteins=1, min_domains=1, min_bio_domains=0):
+                 merge_max_nucl_gap=0, min_nucl=1, min_proteins=1, min_domains=1, min_bio_domains=0, skip_unchanged=False):
+        """
+        :param detector: Detector model name
+        :param label: Label of detected clusters, detector name by default
+        :param score_threshold: Minimum protein score to be included in a cluster (inclusive)
+        :param merge_max_protein_gap: Merge clusters separated by at most given number of proteins
+        :param merge_max_nucl_gap: Merge clusters separated by at most given number of nucleotides
+        :param min_nucl: Minimum cluster nucleotide length
+        :param min_proteins: Minimum number of proteins in a cluster
+        :param min_domains: Minimum number of protein domains in a cluster
+        :param min_bio_domains: Minimum number of known biosynthetic protein domains in a cluster
+        :param skip_unchanged: Skip records already processed with the same label, model version and parameters,
+        segment clusters from stored protein scores if only the segmentation parameters changed
+        """
         self.score_threshold = score_threshold
         if detector is None or not isinstance(detector, six.string_types):
             raise ValueError('Expected detector name, got {}'.format(detector))
@@ -24,9 +42,12 @@ class DeepBGCDetector(PipelineStep):
         self.min_proteins = min_proteins
         self.min_domains = min_domains
         self.min_bio_domains = min_bio_domains
-        model_path = util.get_model_path(self.detector_name, 'detector')
-        self.model = SequenceModelWrapper.load(model_path)
+        self.skip_unchanged = skip_unchanged
+        self.model_path = util.get_model_path(self.detector_name, 'detector')
+        self.model = SequenceModelWrapper.load(self.model_path)
         self.num_detected = 0
+        self.num_skipped = 0
+        self.num_rescored = 0
 
     def run(self, record):
         logging.info('Detecting BGCs using %s model in %s', self.detector_label, record.id)
@@ -39,12 +60,22 @@ class DeepBGCDetector(PipelineStep):
             logging.warning('Warning: No Pfam domains in record %s, skipping BGC detection', record.id)
             return
 
+        previous_meta = self._get_previous_meta(record) if self.skip_unchanged else None
+        if previous_meta is not None and self._has_same_segmentation_params(previous_meta):
+            num_previous = len([f for f in util.get_cluster_features(record)
+                                if f.qualifiers.get('detector_label') == [self.detector_label]])
+            logging.info('Skipping BGC detection in %s, already done using same %s model and parameters',
+                         record.id, self.detector_label)
+            self.num_detected += num_previous
+            self.num_skipped += 1
+            return
+
         # Filter out previous clusters detected with the same detector label
         num_prev_features = len(record.features)
         record.features = [f for f in record.features if
                            not(f.type == 'cluster' and f.qualifiers.get('detector_label') == [self.detector_label])]
         num_removed_features = num_prev_features - len(record.features)
-        if num_removed_features:
+        if num_removed_features and previous_meta is None:
             logging.warning('Warning: Removed %s previously clusters detected clusters with same label "%s". '
                   'Use --label DeepBGCMyLabel to preserve original clusters and add second set of clusters detected '
                   'with same model but different parameters.', num_removed_features, self.detector_label)
@@ -52,107 +83,48 @@ class DeepBGCDetector(PipelineStep):
         # Create DataFrame with Pfam sequence
         pfam_sequence = util.create_pfam_dataframe_from_features(pfam_features, proteins_by_id)
 
-        # Predict BGC score of each Pfam
-        pfam_sequence[self.score_column] = self.model.predict(pfam_sequence)
+        scores_by_protein = None
+        if previous_meta is not None:
+            scores_by_protein = self._get_stored_protein_scores(pfam_sequence, proteins_by_id)
+            if scores_by_protein is not None:
+                logging.info('Segmenting BGCs in %s using stored %s protein scores', record.id, self.detector_label)
+                self.num_rescored += 1
+        if scores_by_protein is None:
+            scores_by_protein = self._score_proteins(pfam_sequence, pfam_features, proteins_by_id)
 
-        # Get average BGC score for each protein
-        protein_scores = pfam_sequence.groupby('protein_id', sort=False)[self.score_column].mean()
+        # TODO: Should proteins with no Pfam domains also be considered?
+        # Proteins without Pfam domains have no BGC score, ignore them
+        scored_proteins = [protein for protein in protein_features if id(protein) in scores_by_protein]
+        starts = np.array([int(protein.location.start) for protein in scored_proteins], dtype=np.int64)
+        ends = np.array([int(protein.location.end) for protein in scored_proteins], dtype=np.int64)
+        scores = np.array([scores_by_protein[id(protein)] for protein in scored_proteins], dtype=np.float64)
+        protein_idx = {id(protein): i for i, protein in enumerate(scored_proteins)}
+        pfam_protein_idx = np.array([protein_idx[id(proteins_by_id[protein_id])]
+                                     for protein_id in pfam_sequence['protein_id']], dtype=np.int64)
 
-        # Add score to all Pfam features
-        for i, feature in enumerate(pfam_features):
-            feature.qualifiers[self.score_column] = ['{:.5f}'.format(pfam_sequence[self.score_column].iloc[i])]
-
-        # Add score to all protein features
-        for protein_id, score in protein_scores.items():
-            proteins_by_id[protein_id].qualifiers[self.score_column] = ['{:.5f}'.format(score)]
-
-        clusters = []
-        active_proteins = []
-        gap_proteins = []
-
-        # Create a list of cluster features by merging consecutive proteins with score satisfying given threshold
-        # Neighboring clusters within given number of nucleotides/proteins are merged
-        for protein in protein_features:
-            if self.score_column not in protein.qualifiers:
-                # TODO: Should proteins with no Pfam domains also be considered?
-                # Current protein did not have any Pfam domains, therefore it has no BGC score, ignore it
-                continue
-            score = float(protein.qualifiers[self.score_column][0])
-            # Inactive protein, add to gap
-            if score < self.score_threshold:
-                gap_proteins.append(protein)
-                # We just changed from active to inactive, add current list of active proteins as a cluster
-                if active_proteins:
-                    clusters.append(active_proteins)
-                    active_proteins = []
-            # Active protein
-            else:
-                # If no cluster is open, check if we should merge with the previous cluster
-                if not active_proteins and clusters:
-                    prev_cluster_proteins = clusters[-1]
-                    prev_end = prev_cluster_proteins[-1].location.end
-                    if len(gap_proteins) <= self.merge_max_protein_gap or \
-                            (protein.location.start - prev_end) <= self.merge_max_nucl_gap:
-                        # Remove previous candidate and continue where it left off
-                        clusters = clusters[:-1]
-                        active_proteins = prev_cluster_proteins + gap_proteins
-
-                # Add current protein to cluster
-                active_proteins.append(protein)
-                gap_proteins = []
-
-        # Last protein was active, add list of active proteins as a cluster
-        if active_proteins:
-            clusters.append(active_proteins)
+        first_idx, last_idx, cluster_scores = detect_clusters(
+            starts=starts,
+            ends=ends,
+            scores=scores,
+            pfam_protein_idx=pfam_protein_idx,
+            pfam_codes=get_pfam_codes(pfam_sequence),
+            **self.get_segmentation_params()
+        )
 
         # Add detected clusters as features
-        record_num_detected = 0
-        for cluster_proteins in clusters:
-            start = cluster_proteins[0].location.start
-            end = cluster_proteins[-1].location.end
-            candidate_id = '{}_{}-{}.1'.format(record.id, int(start), int(end))
-
-            if self.min_nucl > 1:
-                nucl_length = end - start
-                if nucl_length < self.min_nucl:
-                    logging.debug('Skipping cluster %s with %s < %s nucleotides', candidate_id, nucl_length, self.min_nucl)
-                    continue
-
-            if self.min_proteins > 1:
-                num_proteins = len(cluster_proteins)
-                if num_proteins < self.min_proteins:
-                    logging.debug('Skipping cluster %s with %s < %s proteins', candidate_id, num_proteins, self.min_proteins)
-                    continue
-
-            if self.min_domains > 1 or self.min_bio_domains > 0:
-                pfam_ids = util.get_pfam_feature_ids(record)
-                num_domains = len(pfam_features)
-                if num_domains < self.min_domains:
-                    logging.debug('Skipping cluster %s with %s < %s protein domains', candidate_id, num_domains, self.min_domains)
-                    continue
-                num_bio_domains = len(util.filter_biosynthetic_pfam_ids(pfam_ids))
-                if num_bio_domains < self.min_bio_domains:
-                    logging.debug('Skipping cluster %s with %s < %s known biosynthetic protein domains', candidate_id, num_bio_domains, self.min_bio_domains)
-                    continue
-
-            scores = [float(feature.qualifiers[self.score_column][0]) for feature in cluster_proteins]
-            location = FeatureLocation(start, end)
-            qualifiers = {
-                self.score_column: ['{:.5f}'.format(np.mean(scores))],
-                'detector': [self.detector_name],
-                'detector_label': [self.detector_label],
-                'detector_version': [self.model.version],
-                'detector_version_timestamp': [self.model.timestamp],
-                'product': ['{}_putative'.format(self.detector_name)],
-                'bgc_candidate_id': [candidate_id]
-            }
-            record.features.append(SeqFeature(
-                location=location,
-                type="cluster",
-                qualifiers=qualifiers
+        for first, last, cluster_score in zip(first_idx, last_idx, cluster_scores):
+            record.features.append(create_cluster_feature(
+                record_id=record.id,
+                start=scored_proteins[first].location.start,
+                end=scored_proteins[last].location.end,
+                score=cluster_score,
+                detector_name=self.detector_name,
+                detector_label=self.detector_label,
+                version=self.model.version,
+                version_timestamp=self.model.timestamp
             ))
-            record_num_detected += 1
-            self.num_detected += 1
+        record_num_detected = len(first_idx)
+        self.num_detected += record_num_detected
 
         # Sort all features by location
         util.sort_record_features(record)
@@ -170,11 +142,279 @@ class DeepBGCDetector(PipelineStep):
             score_threshold=self.score_threshold,
             merge_max_nucl_gap=self.merge_max_nucl_gap,
             merge_max_protein_gap=self.merge_max_protein_gap,
+            min_nucl=self.min_nucl,
             min_proteins=self.min_proteins,
             min_domains=self.min_domains,
             min_bio_domains=self.min_bio_domains
         )
         logging.info('Detected %s BGCs using %s model in %s', record_num_detected, self.detector_label, record.id)
 
+    def _score_proteins(self, pfam_sequence, pfam_features, proteins_by_id):
+        """
+        Predict BGC score of each Pfam domain and protein and save them in the feature qualifiers
+        :return: Dictionary of {id(protein feature): average protein score parsed from its score qualifier}
+        """
+        # Predict BGC score of each Pfam
+        pfam_sequence[self.score_column] = self.model.predict(pfam_sequence)
+
+        # Get average BGC score for each protein
+        protein_scores = pfam_sequence.groupby('protein_id', sort=False)[self.score_column].mean()
+
+        # Add score to all Pfam features
+        pfam_scores = pfam_sequence[self.score_column].values
+        for feature, score in zip(pfam_features, pfam_scores):
+            feature.qualifiers[self.score_column] = ['{:.5f}'.format(score)]
+
+        # Add score to all protein features
+        scores_by_protein = {}
+        for protein_id, score in protein_scores.items():
+            protein = proteins_by_id[protein_id]
+            score_value = '{:.5f}'.format(score)
+            protein.qualifiers[self.score_column] = [score_value]
+            # Use the score with the precision of the qualifier, same as when loaded from a GenBank file
+            scores_by_protein[id(protein)] = float(score_value)
+        return scores_by_protein
+
+    def _get_previous_meta(self, record):
+        """
+        Get metadata of previous detection with the same label, if it was done using the same model version
+        :return: Detector metadata dictionary or None
+        """
+        meta = util.get_record_detector_meta(record).get(self.detector_label)
+        if not meta or meta.get('name') != self.detector_name:
+            return None
+        # Values are strings when loaded from a GenBank file
+        if str(meta.get('version')) != str(self.model.version) \
+                or str(meta.get('version_timestamp')) != str(self.model.timestamp):
+            return None
+        return meta
+
+    def get_segmentation_params(self):
+        return collections.OrderedDict((param, getattr(self, param)) for param in self.SEGMENTATION_PARAMS)
+
+    def _has_same_segmentation_params(self, meta):
+        return all(str(meta.get(param)) == str(value) for param, value in self.get_segmentation_params().items())
+
+    def _get_stored_protein_scores(self, pfam_sequence, proteins_by_id):
+        """
+        Get protein scores saved in the protein feature qualifiers by a previous run
+        :return: Dictionary of {id(protein feature): protein score}, None if some protein with Pfam domains has no score
+        """
+        scores_by_protein = {}
+        for protein_id in pfam_sequence['protein_id'].unique():
+            protein = proteins_by_id[protein_id]
+            score = protein.qualifiers.get(self.score_column)
+            if not score:
+                return None
+            scores_by_protein[id(protein)] = float(score[0])
+        return scores_by_protein
+
     def print_summary(self):
         logging.info('Detected %s total BGCs using %s model', self.num_detected, self.detector_label)
+        if self.num_skipped or self.num_rescored:
+            logging.info('Skipped %s unchanged records, segmented %s records using stored %s scores',
+                         self.num_skipped, self.num_rescored, self.detector_label)
+
+
+def detect_clusters(starts, ends, scores, pfam_protein_idx, pfam_codes, score_threshold=0.5, merge_max_protein_gap=0,
+                    merge_max_nucl_gap=0, min_nucl=1, min_proteins=1, min_domains=1, min_bio_domains=0, breaks=None,
+                    domain_index=None):
+    """
+    Segment clusters from protein scores (see segment_clusters) and filter them by number of protein domains.
+
+    :param starts: Array of protein start positions, in record order
+    :param ends: Array of protein end positions
+    :param scores: Array of protein BGC scores
+    :param pfam_protein_idx: Array with index of protein of each Pfam domain
+    :param pfam_codes: Array with Pfam ID of each Pfam domain, encoded using the shared Pfam vocabulary
+    :param min_domains: Minimum number of protein domains in a cluster
+    :param min_bio_domains: Minimum number of known biosynthetic protein domains in a cluster
+    :param breaks: Array of protein indices where a new record starts, see segment_clusters
+    :param domain_index: Domain data precomputed using get_domain_index, when detecting clusters
+    in the same proteins repeatedly, computed from the Pfam domains if None
+    :return: Tuple of arrays (first protein index, last protein index, average protein score) of each cluster
+    """
+    first_idx, last_idx, cluster_scores = segment_clusters(
+        starts=starts,
+        ends=ends,
+        scores=scores,
+        score_threshold=score_threshold,
+        merge_max_protein_gap=merge_max_protein_gap,
+        merge_max_nucl_gap=merge_max_nucl_gap,
+        min_nucl=min_nucl,
+        min_proteins=min_proteins,
+        breaks=breaks
+    )
+    if min_domains <= 1 and min_bio_domains <= 0:
+        return first_idx, last_idx, cluster_scores
+
+    num_domains, num_bio_domains = count_cluster_domains(
+        pfam_protein_idx=pfam_protein_idx,
+        pfam_codes=pfam_codes,
+        num_proteins=len(scores),
+        first_idx=first_idx,
+        last_idx=last_idx,
+        count_bio_domains=min_bio_domains > 0,
+        domain_index=domain_index
+    )
+    keep = num_domains >= min_domains
+    if num_bio_domains is not None:
+        keep &= num_bio_domains >= min_bio_domains
+    num_skipped = len(keep) - keep.sum()
+    if num_skipped:
+        logging.debug('Skipping %s clusters with less than %s protein domains or %s known biosynthetic protein domains',
+                      num_skipped, min_domains, min_bio_domains)
+    return first_idx[keep], last_idx[keep], cluster_scores[keep]
+
+
+def create_cluster_feature(record_id, start, end, score, detector_name, detector_label, version, version_timestamp):
+    """
+    Create cluster feature of a BGC detected using given detector
+    :return: SeqFeature of type "cluster"
+    """
+    qualifiers = {
+        util.format_bgc_score_column(detector_name): ['{:.5f}'.format(score)],
+        'detector': [detector_name],
+        'detector_label': [detector_label],
+        'detector_version': [version],
+        'detector_version_timestamp': [version_timestamp],
+        'product': ['{}_putative'.format(detector_name)],
+        'bgc_candidate_id': ['{}_{}-{}.1'.format(record_id, int(start), int(end))]
+    }
+    return SeqFeature(
+        location=FeatureLocation(start, end),
+        type="cluster",
+        qualifiers=qualifiers
+    )
+
+
+def segment_clusters(starts, ends, scores, score_threshold=0.5, merge_max_protein_gap=0, merge_max_nucl_gap=0,
+                     min_nucl=1, min_proteins=1, breaks=None):
+    """
+    Find clusters of consecutive proteins with score satisfying given threshold.
+    Neighboring clusters within given number of nucleotides or proteins are merged.
+
+    Proteins of multiple records can be segmented at once by concatenating them and providing the index
+    of the first protein of each record as breaks, clusters never span or merge across a break.
+
+    :param starts: Array of protein start positions, in record order
+    :param ends: Array of protein end positions
+    :param scores: Array of protein BGC scores
+    :param score_threshold: Minimum protein score to be included in a cluster (inclusive)
+    :param merge_max_protein_gap: Merge clusters separated by at most given number of proteins
+    :param merge_max_nucl_gap: Merge clusters separated by at most given number of nucleotides
+    :param min_nucl: Minimum cluster nucleotide length
+    :param min_proteins: Minimum number of proteins in a cluster
+    :param breaks: Array of protein indices where a new record starts
+    :return: Tuple of arrays (first protein index, last protein index, average protein score) of each cluster
+    """
+    starts = np.asarray(starts)
+    ends = np.asarray(ends)
+    scores = np.asarray(scores, dtype=np.float64)
+    empty = np.array([], dtype=np.int64)
+    if not len(scores):
+        return empty, empty, np.array([])
+
+    # Find runs of consecutive active proteins
+    active = scores >= score_threshold
+    is_break = np.zeros(len(scores) + 1, dtype=bool)
+    is_break[[0, -1]] = True
+    if breaks is not None:
+        is_break[np.asarray(breaks, dtype=np.int64)] = True
+    continues_prev = np.concatenate([[False], active[:-1]]) & ~is_break[:-1]
+    continues_next = np.concatenate([active[1:], [False]]) & ~is_break[1:]
+    run_first = np.flatnonzero(active & ~continues_prev)
+    run_last = np.flatnonzero(active & ~continues_next)
+    if not len(run_first):
+        return empty, empty, np.array([])
+
+    # Merge each run with the previous one if the gap between them is small enough
+    protein_gaps = run_first[1:] - run_last[:-1] - 1
+    nucl_gaps = starts[run_first[1:]] - ends[run_last[:-1]]
+    merge = (protein_gaps <= merge_max_protein_gap) | (nucl_gaps <= merge_max_nucl_gap)
+    if breaks is not None:
+        record_idx = np.cumsum(is_break[:-1]) - 1
+        merge &= record_idx[run_first[1:]] == record_idx[run_last[:-1]]
+    cluster_first = run_first[np.concatenate([[True], ~merge])]
+    cluster_last = run_last[np.concatenate([~merge, [True]])]
+
+    # Filter by cluster size
+    keep = np.ones(len(cluster_first), dtype=bool)
+    if min_nucl > 1:
+        keep &= (ends[cluster_last] - starts[cluster_first]) >= min_nucl
+    if min_proteins > 1:
+        keep &= (cluster_last - cluster_first + 1) >= min_proteins
+    num_skipped = len(keep) - keep.sum()
+    if num_skipped:
+        logging.debug('Skipping %s clusters with less than %s nucleotides or %s proteins', num_skipped, min_nucl, min_proteins)
+    cluster_first = cluster_first[keep]
+    cluster_last = cluster_last[keep]
+
+    # Average score of all proteins in the cluster, including merged gaps
+    score_cumsum = np.concatenate([[0], np.cumsum(scores)])
+    cluster_scores = (score_cumsum[cluster_last + 1] - score_cumsum[cluster_first]) / (cluster_last - cluster_first + 1)
+    return cluster_first, cluster_last, cluster_scores
+
+
+def get_domain_index(pfam_protein_idx, pfam_codes, num_proteins):
+    """
+    Get protein domain data used to count domains of clusters, see count_cluster_domains.
+    The index depends only on the proteins and their domains, so it can be computed once
+    and reused for clusters detected with different parameters.
+
+    :param pfam_protein_idx: Array with index of protein of each Pfam domain
+    :param pfam_codes: Array with Pfam ID of each Pfam domain, encoded using the shared Pfam vocabulary
+    :param num_proteins: Number of proteins
+    :return: Dictionary with prefix sums of protein domain counts, and protein index and Pfam code of each
+    known biosynthetic domain
+    """
+    pfam_protein_idx = np.asarray(pfam_protein_idx, dtype=np.int64)
+    pfam_codes = np.asarray(pfam_codes)
+    has_id = pfam_codes != PfamVocabulary.UNKNOWN
+    domain_counts = np.bincount(pfam_protein_idx[has_id], minlength=num_proteins)
+    is_bio = util.get_biosynthetic_pfam_table()[pfam_codes]
+    return dict(
+        domain_cumsum=np.concatenate([[0], np.cumsum(domain_counts)]),
+        bio_protein_idx=pfam_protein_idx[is_bio],
+        bio_codes=pfam_codes[is_bio].astype(np.int64)
+    )
+
+
+def count_cluster_domains(pfam_protein_idx, pfam_codes, num_proteins, first_idx, last_idx, count_bio_domains=True,
+                          domain_index=None):
+    """
+    Count protein domains and unique known biosynthetic Pfam IDs in each cluster. Domains are counted using prefix sums,
+    so that each cluster is counted in constant time regardless of its length, unique biosynthetic Pfam IDs are counted
+    from (cluster, Pfam ID) pairs of biosynthetic domains, using memory proportional to the number of domains.
+
+    :param pfam_protein_idx: Array with index of protein of each Pfam domain
+    :param pfam_codes: Array with Pfam ID of each Pfam domain, encoded using the shared Pfam vocabulary
+    :param num_proteins: Number of proteins
+    :param first_idx: Array with index of first protein of each cluster, sorted, clusters should not overlap
+    :param last_idx: Array with index of last protein of each cluster (inclusive)
+    :param count_bio_domains: Whether to count known biosynthetic Pfam IDs
+    :param domain_index: Domain data precomputed using get_domain_index, computed from the Pfam domains if None
+    :return: Tuple of arrays (number of domains, number of unique biosynthetic Pfam IDs), second is None if not counted
+    """
+    if domain_index is None:
+        domain_index = get_domain_index(pfam_protein_idx, pfam_codes, num_proteins)
+    first_idx = np.asarray(first_idx, dtype=np.int64)
+    last_idx = np.asarray(last_idx, dtype=np.int64)
+
+    domain_cumsum = domain_index['domain_cumsum']
+    num_domains = domain_cumsum[last_idx + 1] - domain_cumsum[first_idx]
+    if not count_bio_domains:
+        return num_domains, None
+
+    bio_protein_idx = domain_index['bio_protein_idx']
+    bio_codes = domain_index['bio_codes']
+    if not len(first_idx) or not len(bio_codes):
+        return num_domains, np.zeros(len(first_idx), dtype=np.int64)
+    # Cluster of each biosynthetic domain, clusters are sorted and do not overlap
+    bio_cluster_idx = np.searchsorted(first_idx, bio_protein_idx, side='right') - 1
+    in_cluster = (bio_cluster_idx >= 0) & (bio_protein_idx <= last_idx[np.maximum(bio_cluster_idx, 0)])
+    # Unique (cluster, Pfam ID) pairs, counted for each cluster
+    num_codes = bio_codes.max() + 1
+    pairs = np.unique(bio_cluster_idx[in_cluster] * num_codes + bio_codes[in_cluster])
+    num_bio_domains = np.bincount(pairs // num_codes, minlength=len(first_idx))
+    return num_domains, num_bio_domains
@@ -5,11 +5,15 @@ from __future__ import (
 )
 import subprocess
 import os
+import collections
+import hashlib
+import json
 
 import pandas as pd
 
-from deepbgc.data import PFAM_DB_FILE_NAME, PFAM_DB_VERSION, PFAM_CLANS_FILE_NAME
+from deepbgc.data import PFAM_DB_FILE_NAME, PFAM_DB_VERSION
 from Bio import SeqIO, SearchIO
+from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 from Bio.SeqFeature import SeqFeature, FeatureLocation
 import numpy as np
@@ -18,40 +22,66 @@ import logging
 from distutils.spawn import find_executable
 from datetime import datetime
 
+PFAM_HIT_COLUMNS = ['protein_id', 'pfam_id', 'query_start', 'query_end', 'evalue']
 
-class HmmscanPfamRecordAnnotator(object):
-    def __init__(self, record, tmp_path_prefix, max_evalue=0.01, db_path=None, clans_path=None):
-        self.record = record
-        self.tmp_path_prefix = tmp_path_prefix
-        self.db_path = db_path or util.get_downloaded_file_path(PFAM_DB_FILE_NAME, versioned=False)
-        self.clans_path = clans_path or util.get_downloaded_file_path(PFAM_CLANS_FILE_NAME, versioned=False)
-        self.max_evalue = max_evalue
 
-    def _write_proteins(self, proteins, protein_path):
-        records = []
-        for feature in proteins:
-            translation = feature.extract(self.record.seq).translate()
-            records.append(SeqRecord(translation, util.get_protein_id(feature), description=''))
-        SeqIO.write(records, protein_path, 'fasta')
+class PfamSearchBackend(object):
+    """
+    Base class for Pfam domain search backends used by the HmmscanPfamRecordAnnotator.
+    A backend instance is shared by all records processed by a DeepBGCAnnotator,
+    so it can keep expensive resources (e.g. loaded Pfam profiles) for the life of the process.
+    """
+    name = None
 
-    def _get_pfam_loc(self, query_start, query_end, feature):
-        if feature.strand == 1:
-            start = feature.location.start + 3 * query_start
-            end = feature.location.start + 3 * query_end
-        elif feature.strand == -1:
-            end = feature.location.end - 3 * query_start
-            start = feature.location.end - 3 * query_end
-        else:
-            raise ValueError('Invalid strand for feature: {}'.format(feature))
-        return FeatureLocation(start, end, strand=feature.strand)
+    def __init__(self, db_path=None, cpus=None, num_profiles=None):
+        """
+        :param db_path: Path to pressed Pfam-A HMM database, downloaded Pfam DB is used by default.
+        :param cpus: Number of CPUs to use for the search, HMMER default is used if not provided.
+        :param num_profiles: Number of profiles used as database size for E-value calculation (-Z).
+        Provide the size of the full Pfam DB when searching a reduced Pfam DB to get the same E-values.
+        """
+        self._db_path = db_path
+        self.cpus = cpus
+        self.num_profiles = num_profiles
+
+    @property
+    def db_path(self):
+        # Resolve downloaded Pfam DB path lazily so that backends can be created even for pre-annotated inputs
+        if not self._db_path:
+            self._db_path = util.get_downloaded_file_path(PFAM_DB_FILE_NAME, versioned=False)
+        return self._db_path
+
+    def search(self, sequences, tmp_path_prefix):
+        """
+        Search given protein sequences for Pfam domains.
+        :param sequences: OrderedDict of protein ID -> amino acid sequence string
+        :param tmp_path_prefix: Path prefix of temporary files that can be used by the backend
+        :return: DataFrame of hits (protein_id, pfam_id, query_start, query_end, evalue columns)
+        with the best domain of each matched Pfam family in each protein.
+        Query coordinates are 0-based amino acid positions in the protein sequence.
+        """
+        raise NotImplementedError()
+
+
+class HmmscanPfamSearch(PfamSearchBackend):
+    """
+    Search Pfam domains by running HMMER hmmscan in a subprocess on a temporary protein FASTA file.
+    The hmmscan domain table is kept in the temporary directory and reused in subsequent runs.
+    """
+    name = 'hmmscan'
 
     def _run_hmmscan(self, protein_path, domtbl_path):
         if not find_executable('hmmscan'):
             raise RuntimeError("HMMER hmmscan needs to be installed and available on PATH "
                                "in order to detect Pfam domains.")
 
+        args = ['hmmscan', '--nobias', '--domtblout', domtbl_path]
+        if self.num_profiles:
+            args += ['-Z', str(self.num_profiles)]
+        if self.cpus is not None:
+            args += ['--cpu', str(self.cpus)]
         p = subprocess.Popen(
-            ['hmmscan', '--nobias', '--domtblout', domtbl_path, self.db_path, protein_path],
+            args + [self.db_path, protein_path],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             universal_newlines=True
@@ -63,80 +93,374 @@ class HmmscanPfamRecordAnnotator(object):
             logging.warning('== End HMMER hmmscan Error. ============')
             raise Exception("Unexpected error detecting protein domains using HMMER hmmscan")
 
-    def annotate(self):
+    def search(self, sequences, tmp_path_prefix):
+        domtbl_path = tmp_path_prefix + '.pfam.domtbl.txt'
 
-        proteins = util.get_protein_features(self.record)
-        proteins_by_id = util.get_proteins_by_id(proteins)
-        domtbl_path = self.tmp_path_prefix + '.pfam.domtbl.txt'
+        if util.is_valid_hmmscan_output(domtbl_path):
+            logging.info('Reusing already existing HMMER hmmscan result: %s', domtbl_path)
+            hits = read_domtbl_hits(domtbl_path, 'hmmscan3-domtab')
+            invalid_ids = set(hits['protein_id']).difference(sequences)
+            if invalid_ids:
+                raise ValueError('Found invalid protein ID "{}" in cached HMMER hmmscan result, '
+                                 'disable caching or delete the file: {}'.format(sorted(invalid_ids)[0], domtbl_path))
+            return hits
 
-        if not proteins:
-            logging.warning('No	proteins in sequence %s, skipping protein domain detection', self.record.id)
-            return
+        protein_path = tmp_path_prefix + '.pfam.proteins.fa'
+        write_protein_fasta(sequences, protein_path)
+
+        logging.info('Detecting Pfam domains using HMMER hmmscan, this might take a while...')
+        start_time = datetime.now()
+        self._run_hmmscan(protein_path, domtbl_path)
+        logging.info('HMMER hmmscan Pfam detection done in %s', util.print_elapsed_time(start_time))
+
+        return read_domtbl_hits(domtbl_path, 'hmmscan3-domtab')
+
+
+class HmmsearchPfamSearch(PfamSearchBackend):
+    """
+    Search Pfam domains by running HMMER hmmsearch in a subprocess, searching each Pfam profile against the whole protein set.
+    This is much faster than hmmscan for large protein sets, especially with multiple CPUs.
+    E-values are computed using the number of Pfam profiles as the database size (-Z), same as in hmmscan.
+    The profiles are counted from the Pfam DB if num_profiles is not provided.
+    """
+    name = 'hmmsearch'
+
+    def _run_hmmsearch(self, protein_path, domtbl_path):
+        if not find_executable('hmmsearch'):
+            raise RuntimeError("HMMER hmmsearch needs to be installed and available on PATH "
+                               "in order to detect Pfam domains.")
+
+        num_profiles = self.num_profiles or count_hmm_profiles(self.db_path)
+        args = ['hmmsearch', '--nobias', '-Z', str(num_profiles), '-o', os.devnull, '--domtblout', domtbl_path]
+        if self.cpus is not None:
+            args += ['--cpu', str(self.cpus)]
+        p = subprocess.Popen(
+            args + [self.db_path, protein_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        out, err = p.communicate()
+        if p.returncode or not os.path.exists(domtbl_path):
+            logging.warning('== HMMER hmmsearch Error: ================')
+            logging.warning(err.strip())
+            logging.warning('== End HMMER hmmsearch Error. ============')
+            raise Exception("Unexpected error detecting protein domains using HMMER hmmsearch")
+
+    def search(self, sequences, tmp_path_prefix):
+        domtbl_path = tmp_path_prefix + '.pfam.hmmsearch.domtbl.txt'
 
         if util.is_valid_hmmscan_output(domtbl_path):
-            cached = True
-            logging.info('Reusing already existing HMMER hmmscan result: %s', domtbl_path)
+            logging.info('Reusing already existing HMMER hmmsearch result: %s', domtbl_path)
         else:
-            cached = False
-            protein_path = self.tmp_path_prefix + '.pfam.proteins.fa'
+            protein_path = tmp_path_prefix + '.pfam.proteins.fa'
+            write_protein_fasta(sequences, protein_path)
+
+            logging.info('Detecting Pfam domains in %s proteins using HMMER hmmsearch, this might take a while...', len(sequences))
+            start_time = datetime.now()
+            self._run_hmmsearch(protein_path, domtbl_path)
+            logging.info('HMMER hmmsearch Pfam detection done in %s', util.print_elapsed_time(start_time))
+
+        hits = read_domtbl_hits(domtbl_path, 'hmmsearch3-domtab')
+        invalid_ids = set(hits['protein_id']).difference(sequences)
+        if invalid_ids:
+            raise ValueError('Found invalid protein ID "{}" in cached HMMER hmmsearch result, '
+                             'disable caching or delete the file: {}'.format(sorted(invalid_ids)[0], domtbl_path))
+
+        # Order hits by protein and E-value, same as in hmmscan output
+        protein_order = {protein_id: i for i, protein_id in enumerate(sequences)}
+        hits['protein_order'] = hits['protein_id'].map(protein_order)
+        hits = hits.sort_values(by=['protein_order', 'evalue'], kind='mergesort')
+        return hits[PFAM_HIT_COLUMNS].reset_index(drop=True)
 
-            # Write proteins to fasta file
-            self._write_proteins(proteins, protein_path)
 
-            logging.info('Detecting Pfam domains in "%s" using HMMER hmmscan, this might take a while...', self.record.id)
+class PyhmmerPfamSearch(PfamSearchBackend):
+    """
+    Search Pfam domains in-process using pyhmmer.
+    Pfam profiles are loaded once and kept in memory for the life of the backend,
+    protein sequences are passed as in-memory buffers, no temporary files are created.
+    """
+    name = 'pyhmmer'
+
+    def __init__(self, db_path=None, cpus=None, num_profiles=None):
+        super(PyhmmerPfamSearch, self).__init__(db_path=db_path, cpus=cpus, num_profiles=num_profiles)
+        try:
+            import pyhmmer
+        except ImportError:
+            raise ImportError('Package "pyhmmer" needs to be installed to use the pyhmmer Pfam search backend. '
+                              'Install extra dependencies using: \n    pip install "deepbgc[pyhmmer]"')
+        self.alphabet = pyhmmer.easel.Alphabet.amino()
+        self.profiles = None
+
+    def _load_profiles(self):
+        import pyhmmer
+        if self.profiles is None:
+            logging.info('Loading Pfam profiles into memory: %s', self.db_path)
             start_time = datetime.now()
-            self._run_hmmscan(protein_path, domtbl_path)
+            with pyhmmer.plan7.HMMFile(self.db_path) as hmm_file:
+                if hmm_file.is_pressed():
+                    self.profiles = list(hmm_file.optimized_profiles())
+                else:
+                    self.profiles = list(hmm_file)
+            logging.info('Loaded %s Pfam profiles in %s', len(self.profiles), util.print_elapsed_time(start_time))
+        return self.profiles
+
+    def search(self, sequences, tmp_path_prefix=None):
+        import pyhmmer
+        profiles = self._load_profiles()
+        digital_sequences = [
+            pyhmmer.easel.TextSequence(name=protein_id.encode('utf-8'), sequence=sequence).digitize(self.alphabet)
+            for protein_id, sequence in sequences.items()
+        ]
+        logging.info('Detecting Pfam domains using pyhmmer...')
+        start_time = datetime.now()
+        hits = collections.OrderedDict((column, []) for column in PFAM_HIT_COLUMNS)
+        # Same settings as "hmmscan --nobias"
+        options = dict(Z=self.num_profiles) if self.num_profiles else {}
+        results = pyhmmer.hmmer.hmmscan(digital_sequences, profiles, cpus=self.cpus or 0, bias_filter=False, **options)
+        for top_hits in results:
+            protein_id = _decode(top_hits.query.name)
+            for hit in top_hits:
+                if not hit.reported:
+                    continue
+                domains = [domain for domain in hit.domains if domain.reported]
+                if not domains:
+                    continue
+                best_domain = domains[int(np.argmin([domain.i_evalue for domain in domains]))]
+                hits['protein_id'].append(protein_id)
+                hits['pfam_id'].append(_decode(hit.accession or hit.name))
+                hits['query_start'].append(best_domain.alignment.target_from - 1)
+                hits['query_end'].append(best_domain.alignment.target_to)
+                hits['evalue'].append(float(best_domain.i_evalue))
+        logging.info('pyhmmer Pfam detection done in %s', util.print_elapsed_time(start_time))
+        return pd.DataFrame(hits, columns=PFAM_HIT_COLUMNS)
+
 
-            logging.info('HMMER hmmscan Pfam detection done in %s', util.print_elapsed_time(start_time))
+PFAM_SEARCH_BACKENDS = collections.OrderedDict([
+    (HmmscanPfamSearch.name, HmmscanPfamSearch),
+    (HmmsearchPfamSearch.name, HmmsearchPfamSearch),
+    (PyhmmerPfamSearch.name, PyhmmerPfamSearch),
+])
 
-        # Read domain matches in all proteins
-        queries = SearchIO.parse(domtbl_path, 'hmmscan3-domtab')
 
-        # Read descriptions from Pfam clan TSV
-        pfam_descriptions = self._get_pfam_descriptions()
+def create_pfam_search_backend(name, **kwargs):
+    """
+    Create Pfam search backend by name
+    :param name: Backend name (see PFAM_SEARCH_BACKENDS)
+    :param kwargs: Backend arguments (db_path, cpus, num_profiles)
+    :return: PfamSearchBackend instance
+    """
+    if name not in PFAM_SEARCH_BACKENDS:
+        raise ValueError('Unknown Pfam search backend "{}", choose one of: {}'.format(name, ', '.join(PFAM_SEARCH_BACKENDS)))
+    return PFAM_SEARCH_BACKENDS[name](**kwargs)
 
-        # Extract all matched domain hits
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def write_protein_fasta(sequences, protein_path):
+    records = [SeqRecord(Seq(sequence), protein_id, description='') for protein_id, sequence in sequences.items()]
+    SeqIO.write(records, protein_path, 'fasta')
+
+
+_NUM_PROFILES_CACHE = {}
+
+
+def count_hmm_profiles(db_path):
+    """
+    Count number of profiles in a HMMER HMM database file, the result is cached for the whole process.
+    :param db_path: Path to HMM file
+    :return: Number of profiles
+    """
+    key = os.path.abspath(db_path)
+    if key not in _NUM_PROFILES_CACHE:
+        num_profiles = 0
+        with open(db_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                # Every profile is terminated by a "//" line
+                num_profiles += chunk.count(b'\n//')
+        _NUM_PROFILES_CACHE[key] = num_profiles
+    return _NUM_PROFILES_CACHE[key]
+
+
+REDUCED_PFAM_DB_DIRNAME = 'reduced_pfam'
+
+
+def _read_hmm_profiles(db_path):
+    """
+    Iterate over profiles in a HMMER HMM text file
+    :param db_path: Path to HMM file
+    :return: Generator of (accession, model length, list of profile lines) tuples
+    """
+    with open(db_path, 'rb') as f:
+        lines = []
+        accession = None
+        length = 0
+        for line in f:
+            lines.append(line)
+            if line.startswith(b'ACC '):
+                accession = line.split()[1].decode('utf-8')
+            elif line.startswith(b'LENG '):
+                length = int(line.split()[1])
+            elif line.startswith(b'//'):
+                yield accession, length, lines
+                lines = []
+                accession = None
+                length = 0
+
+
+def get_reduced_pfam_db(pfam_ids, model_paths, db_path=None):
+    """
+    Get Pfam DB reduced to profiles of given Pfam families, build and press it if it does not exist yet.
+    The reduced DB is cached in the downloads directory, keyed by checksums of the models that use it.
+
+    :param pfam_ids: Set of Pfam IDs (without version suffix) to keep in the reduced DB
+    :param model_paths: Paths of models that determined the Pfam IDs, used as the cache key
+    :param db_path: Path to full Pfam-A HMM database, downloaded Pfam DB is used by default.
+    :return: Tuple (path to reduced pressed Pfam DB, number of profiles in the full Pfam DB)
+    """
+    db_path = db_path or util.get_downloaded_file_path(PFAM_DB_FILE_NAME, versioned=False)
+    pfam_ids = set(pfam_id.split('.')[0] for pfam_id in pfam_ids)
+    key_hash = hashlib.md5()
+    key_hash.update(os.path.basename(db_path).encode('utf-8'))
+    for model_path in sorted(model_paths):
+        key_hash.update(util.file_md5(model_path).encode('utf-8'))
+    key = key_hash.hexdigest()[:12]
+
+    reduced_dir = util.get_downloaded_file_path('', dirname=REDUCED_PFAM_DB_DIRNAME, check_exists=False, versioned=False)
+    if not os.path.exists(reduced_dir):
+        os.makedirs(reduced_dir)
+    name, ext = os.path.splitext(os.path.basename(db_path))
+    reduced_path = os.path.join(reduced_dir, '{}.{}{}'.format(name, key, ext))
+    report_path = reduced_path + '.report.json'
+
+    if os.path.exists(report_path) and os.path.exists(reduced_path + '.h3f'):
+        logging.info('Using cached reduced Pfam DB: %s', reduced_path)
+        with open(report_path) as f:
+            report = json.load(f)
+    else:
+        logging.info('Creating Pfam DB reduced to %s Pfam IDs used by models: %s', len(pfam_ids), reduced_path)
+        report = collections.OrderedDict(num_profiles=0, num_kept=0, total_length=0, kept_length=0, dropped=[])
+        tmp_path = reduced_path + '.part'
+        with open(tmp_path, 'wb') as out:
+            for accession, length, lines in _read_hmm_profiles(db_path):
+                report['num_profiles'] += 1
+                report['total_length'] += length
+                if accession and accession.split('.')[0] in pfam_ids:
+                    out.writelines(lines)
+                    report['num_kept'] += 1
+                    report['kept_length'] += length
+                else:
+                    report['dropped'].append(accession)
+        os.rename(tmp_path, reduced_path)
+        util.run_hmmpress(reduced_path, force=True)
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    speedup = report['total_length'] / max(report['kept_length'], 1)
+    logging.info('Reduced Pfam DB contains %s of %s profiles, dropped %s profiles not used by the models '
+                 '(expected Pfam search speedup: %.1fx). List of dropped profiles: %s',
+                 report['num_kept'], report['num_profiles'], len(report['dropped']), speedup, report_path)
+    return reduced_path, report['num_profiles']
+
+
+def read_domtbl_hits(domtbl_path, fmt):
+    """
+    Read HMMER domain table and get the best domain of each matched Pfam family in each protein
+    :param domtbl_path: Path to HMMER domain table
+    :param fmt: Biopython SearchIO format (hmmscan3-domtab or hmmsearch3-domtab)
+    :return: DataFrame of hits (protein_id, pfam_id, query_start, query_end, evalue columns)
+    """
+    # In hmmscan, queries are proteins and hits are Pfam profiles, hmmsearch is the other way around
+    profile_as_query = (fmt == 'hmmsearch3-domtab')
+    hits = collections.OrderedDict((column, []) for column in PFAM_HIT_COLUMNS)
+    for query in SearchIO.parse(domtbl_path, fmt):
+        for hit in query.hits:
+            best_index = np.argmin([hsp.evalue for hsp in hit.hsps])
+            best_hsp = hit.hsps[best_index]
+            if profile_as_query:
+                hits['protein_id'].append(hit.id)
+                hits['pfam_id'].append(query.accession)
+                hits['query_start'].append(best_hsp.hit_start)
+                hits['query_end'].append(best_hsp.hit_end)
+            else:
+                hits['protein_id'].append(query.id)
+                hits['pfam_id'].append(hit.accession)
+                hits['query_start'].append(best_hsp.query_start)
+                hits['query_end'].append(best_hsp.query_end)
+            hits['evalue'].append(float(best_hsp.evalue))
+    return pd.DataFrame(hits, columns=PFAM_HIT_COLUMNS)
+
+
+class HmmscanPfamRecordAnnotator(object):
+    def __init__(self, record, tmp_path_prefix, max_evalue=0.01, db_path=None, clans_path=None, backend=None):
+        self.record = record
+        self.tmp_path_prefix = tmp_path_prefix
+        self.backend = backend or HmmscanPfamSearch(db_path=db_path)
+        self.clans_path = clans_path
+        self.max_evalue = max_evalue
+
+    def _get_protein_sequences(self, proteins):
+        sequences = collections.OrderedDict()
+        for feature in proteins:
+            translation = feature.extract(self.record.seq).translate()
+            sequences[util.get_protein_id(feature)] = str(translation)
+        return sequences
+
+    def _get_pfam_loc(self, query_start, query_end, feature):
+        if feature.strand == 1:
+            start = feature.location.start + 3 * query_start
+            end = feature.location.start + 3 * query_end
+        elif feature.strand == -1:
+            end = feature.location.end - 3 * query_start
+            start = feature.location.end - 3 * query_end
+        else:
+            raise ValueError('Invalid strand for feature: {}'.format(feature))
+        return FeatureLocation(start, end, strand=feature.strand)
+
+    def annotate(self):
+
+        proteins = util.get_protein_features(self.record)
+        proteins_by_id = util.get_proteins_by_id(proteins)
+
+        if not proteins:
+            logging.warning('No	proteins in sequence %s, skipping protein domain detection', self.record.id)
+            return
+
+        logging.info('Detecting Pfam domains in "%s" using %s backend', self.record.id, self.backend.name)
+        hits = self.backend.search(self._get_protein_sequences(proteins), self.tmp_path_prefix)
+
+        # Read descriptions from Pfam clan TSV (loaded only once per process)
+        pfam_metadata = util.get_pfam_metadata(self.clans_path)
+
+        # Add all matched domain hits
         num = 0
         pfam_ids = set()
-        for query in queries:
-            if cached and query.id not in proteins_by_id:
-                raise ValueError('Found invalid protein ID "{}" in cached HMMER hmmscan result for record "{}", '
-                                     'disable caching or delete the file: {}'.format(query.id, self.record.id, domtbl_path))
-            protein = proteins_by_id.get(query.id)
-            for hit in query.hits:
-                best_index = np.argmin([hsp.evalue for hsp in hit.hsps])
-                best_hsp = hit.hsps[best_index]
-                pfam_id = hit.accession
-                evalue = float(best_hsp.evalue)
-                if evalue > self.max_evalue:
-                    continue
-                location = self._get_pfam_loc(best_hsp.query_start, best_hsp.query_end, protein)
-                qualifiers = {
-                    'db_xref': [pfam_id],
-                    'evalue': evalue,
-                    'locus_tag': [query.id],
-                    'database': [PFAM_DB_VERSION],
-                }
-                description = pfam_descriptions.get(pfam_id)
-                if description:
-                    qualifiers['description'] = [description]
-                pfam = SeqFeature(
-                    location=location,
-                    id=pfam_id,
-                    type="PFAM_domain",
-                    qualifiers=qualifiers
-                )
-                self.record.features.append(pfam)
-                num += 1
-                pfam_ids.add(pfam_id)
+        hits = hits[hits['evalue'] <= self.max_evalue]
+        for protein_id, pfam_id, query_start, query_end, evalue in hits[PFAM_HIT_COLUMNS].itertuples(index=False):
+            protein = proteins_by_id.get(protein_id)
+            if protein is None:
+                raise ValueError('Found invalid protein ID "{}" in Pfam search result for record "{}"'.format(protein_id, self.record.id))
+            location = self._get_pfam_loc(int(query_start), int(query_end), protein)
+            qualifiers = {
+                'db_xref': [pfam_id],
+                'evalue': float(evalue),
+                'locus_tag': [protein_id],
+                'database': [PFAM_DB_VERSION],
+            }
+            description = pfam_metadata.get_description(pfam_id)
+            if description:
+                qualifiers['description'] = [description]
+            pfam = SeqFeature(
+                location=location,
+                id=pfam_id,
+                type="PFAM_domain",
+                qualifiers=qualifiers
+            )
+            self.record.features.append(pfam)
+            num += 1
+            pfam_ids.add(pfam_id)
 
         util.sort_record_features(self.record)
         logging.info('Added %s Pfam domains (%s unique PFAM_IDs)', num, len(pfam_ids))
-
-    def _get_clans(self):
-        clans = pd.read_csv(self.clans_path, sep='\t', header=None)
-        clans.columns = ['pfam_id', 'clan_id', 'clan_name', 'pfam_name', 'description']
-        return clans.set_index('pfam_id')
-
-    def _get_pfam_descriptions(self):
-        return self._get_clans()['description'].to_dict()
@@ -3,5 +3,13 @@ class PipelineStep(object):
     def run(self, record):
         raise NotImplementedError()
 
+    def run_batch(self, records):
+        """
+        Run step on a batch of records, steps that benefit from processing multiple records at once override this
+        :param records: List of records
+        """
+        for record in records:
+            self.run(record)
+
     def print_summary(self):
         raise NotImplementedError()
@@ -12,11 +12,15 @@ import glob
 import numpy as np
 import re
 import gzip
+import weakref
 
 import six
 from Bio import SeqIO
+from Bio.SeqFeature import SeqFeature
+from Bio.SeqRecord import SeqRecord
 from Bio.Alphabet import SingleLetterAlphabet, generic_dna
 from appdirs import user_data_dir
+from deepbgc.vocabulary import get_pfam_vocabulary, PfamLookupTable, PFAM_CODE_COLUMN
 try:
     from urllib.request import urlretrieve
 except ImportError:
@@ -97,8 +101,40 @@ ANTISMASH_BIO_PFAMS = frozenset(["PF00109", "PF02801", "PF08659", "PF00378", "PF
                           "PF01596", "PF04820", "PF02522", "PF08484", "PF08421"])
 
 
+_BIOSYNTHETIC_PFAM_TABLE = None
+
+
+def get_biosynthetic_pfam_table():
+    """
+    Get boolean lookup table of known biosynthetic Pfam IDs, indexed by Pfam IDs encoded using the shared vocabulary.
+    The table is created on first use and shared by the whole process.
+    :return: PfamLookupTable
+    """
+    global _BIOSYNTHETIC_PFAM_TABLE
+    if _BIOSYNTHETIC_PFAM_TABLE is None:
+        _BIOSYNTHETIC_PFAM_TABLE = PfamLookupTable(ANTISMASH_BIO_PFAMS.__contains__, dtype=bool, default=False)
+    return _BIOSYNTHETIC_PFAM_TABLE
+
+
 def filter_biosynthetic_pfam_ids(pfam_ids):
-    return ANTISMASH_BIO_PFAMS.intersection(pfam_ids)
+    """
+    Get unique known biosynthetic Pfam IDs, in order of first occurrence
+    :param pfam_ids: List of Pfam IDs
+    :return: List of unique biosynthetic Pfam IDs
+    """
+    return [pfam_id for pfam_id in collections.OrderedDict.fromkeys(pfam_ids) if pfam_id in ANTISMASH_BIO_PFAMS]
+
+
+def filter_biosynthetic_pfam_codes(pfam_codes):
+    """
+    Get unique known biosynthetic Pfam IDs encoded using the shared vocabulary, in order of first occurrence
+    :param pfam_codes: Array of encoded Pfam IDs
+    :return: Array of unique encoded biosynthetic Pfam IDs
+    """
+    pfam_codes = np.asarray(pfam_codes)
+    bio_codes = pfam_codes[get_biosynthetic_pfam_table()[pfam_codes]]
+    _, first_idx = np.unique(bio_codes, return_index=True)
+    return bio_codes[np.sort(first_idx)]
 
 
 def get_cluster_features(record, detector=None):
@@ -141,6 +177,12 @@ def get_record_detector_meta(record):
     return {value['label']: value for comment_key, value in comments.items() if comment_key.startswith(STRUCTURED_COMMENT_DETECTOR_PREFIX)}
 
 
+def format_record_title(record_id, description=None):
+    if description and description != record_id:
+        return '{} ({})'.format(record_id, description)
+    return record_id
+
+
 def get_record_detector_names(record):
     return sorted(list(set([meta['name'] for meta in get_record_detector_meta(record).values()])))
 
@@ -154,27 +196,118 @@ def get_record_classifier_names(record):
     return sorted(list(set([meta['name'] for meta in get_record_classifier_meta(record).values()])))
 
 
-def extract_cluster_record(cluster_feature, record):
+class RecordFeatureIndex(object):
     """
-    Extract cluster record, remove pfams that belong to proteins that are not fully present
-    in the cluster (e.g. overlapping protein on complimentary strand)
+    Index of record features sorted by location, used to find features inside a region using binary search
+    instead of scanning all record features. Also memoizes extracted cluster records.
 
-    :param cluster_feature: cluster feature
-    :param record: sequence record
-    :return: extracted cluster region from the record
+    The index is valid only as long as the record feature list is not replaced or resized, see is_valid().
     """
 
-    cluster_record = cluster_feature.extract(record)
+    def __init__(self, record):
+        self.features = record.features
+        self.num_features = len(self.features)
+        indexed = [i for i, f in enumerate(self.features) if f.location is not None and not (f.ref or f.ref_db)]
+        starts = np.array([self.features[i].location.nofuzzy_start for i in indexed], dtype=np.int64)
+        ends = np.array([self.features[i].location.nofuzzy_end for i in indexed], dtype=np.int64)
+        order = np.argsort(starts, kind='mergesort')
+        self.feature_idx = np.array(indexed, dtype=np.int64)[order]
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.cluster_records = {}
+
+    def is_valid(self, record):
+        return record.features is self.features and len(record.features) == self.num_features
+
+    def get_features_inside(self, start, end):
+        """
+        Get features located fully inside given region, in the order of record features
+        :param start: Region start (0-based, inclusive)
+        :param end: Region end (0-based, exclusive)
+        :return: List of features
+        """
+        lo = np.searchsorted(self.starts, start, side='left')
+        hi = np.searchsorted(self.starts, end, side='right')
+        inside = self.feature_idx[lo:hi][self.ends[lo:hi] <= end]
+        return [self.features[i] for i in np.sort(inside)]
+
+    def get_cluster_record(self, cluster_feature, record):
+        start = cluster_feature.location.nofuzzy_start
+        end = cluster_feature.location.nofuzzy_end
+        cached = self.cluster_records.get(id(cluster_feature))
+        if cached is not None and cached[0] is cluster_feature and cached[1] == (start, end):
+            return cached[2]
+
+        cluster_record = SeqRecord(record.seq[start:end], id=record.id, name=record.name, description=record.description)
+        for key, value in record.letter_annotations.items():
+            cluster_record.letter_annotations[key] = value[start:end]
+        for feature in self.get_features_inside(start, end):
+            # Qualifiers are shared with the record features so that later annotations are reflected
+            cluster_record.features.append(SeqFeature(
+                location=feature.location._shift(-start),
+                type=feature.type,
+                location_operator=feature.location_operator,
+                id=feature.id,
+                qualifiers=feature.qualifiers
+            ))
+        _finalize_cluster_record(cluster_record, cluster_feature, record)
+        self.cluster_records[id(cluster_feature)] = (cluster_feature, (start, end), cluster_record)
+        return cluster_record
+
+
+_RECORD_FEATURE_INDEX_CACHE = {}
+
+
+def get_record_feature_index(record):
+    """
+    Get feature index of given record, the index is reused until the record features are modified
+    :param record: sequence record
+    :return: RecordFeatureIndex
+    """
+    key = id(record)
+    cached = _RECORD_FEATURE_INDEX_CACHE.get(key)
+    if cached is not None:
+        record_ref, index = cached
+        if record_ref() is record and index.is_valid(record):
+            return index
+    index = RecordFeatureIndex(record)
+    record_ref = weakref.ref(record, lambda ref: _RECORD_FEATURE_INDEX_CACHE.pop(key, None))
+    _RECORD_FEATURE_INDEX_CACHE[key] = (record_ref, index)
+    return index
+
+
+def _finalize_cluster_record(cluster_record, cluster_feature, record):
     cluster_record.id = cluster_feature.qualifiers.get('bgc_candidate_id', ['unknown_cluster_id'])[0]
     cluster_record.description = ''
     cluster_record.annotations['source'] = record.annotations.get('source', '')
     cluster_record.annotations['organism'] = record.annotations.get('organism', '')
-    
+
     proteins_by_id = get_proteins_by_id(get_protein_features(cluster_record))
     # Remove pfams with protein not fully inside cluster borders (therefore not present in cluster_record)
     cluster_record.features = [f for f in cluster_record.features
                                if not(f.type == PFAM_FEATURE and get_pfam_protein_id(f) not in proteins_by_id)]
-    return cluster_record
+
+
+def extract_cluster_record(cluster_feature, record):
+    """
+    Extract cluster record, remove pfams that belong to proteins that are not fully present
+    in the cluster (e.g. overlapping protein on complimentary strand)
+
+    Features are looked up using the record feature index and the result is memoized per record and cluster,
+    so the returned record is shared by all callers and should not be modified.
+
+    :param cluster_feature: cluster feature
+    :param record: sequence record
+    :return: extracted cluster region from the record
+    """
+    location = cluster_feature.location
+    if location.strand == -1 or len(location.parts) > 1 or location.ref or location.ref_db:
+        # Reverse complemented or compound region, extract using Biopython
+        cluster_record = cluster_feature.extract(record)
+        _finalize_cluster_record(cluster_record, cluster_feature, record)
+        return cluster_record
+
+    return get_record_feature_index(record).get_cluster_record(cluster_feature, record)
 
 
 def create_pfam_dataframe(record, add_scores=True, add_in_cluster=False):
@@ -189,7 +322,11 @@ def create_pfam_dataframe(record, add_scores=True, add_in_cluster=False):
 
 
 def create_pfam_dataframe_from_features(pfam_features, proteins_by_id, detector_names=[], cluster_locations=[]):
-    return pd.DataFrame([create_pfam_dict(pfam, proteins_by_id, detector_names, cluster_locations) for pfam in pfam_features])
+    df = pd.DataFrame([create_pfam_dict(pfam, proteins_by_id, detector_names, cluster_locations) for pfam in pfam_features])
+    if 'pfam_id' in df.columns:
+        # Encode Pfam IDs once, so that transformers and models can look them up by array indexing
+        df[PFAM_CODE_COLUMN] = get_pfam_vocabulary().encode(df['pfam_id'].values)
+    return df
 
 
 def get_pfam_protein_id(pfam_feature):
@@ -202,6 +339,93 @@ def get_pfam_id(feature):
     return None
 
 
+PFAM_CLANS_COLUMNS = ['pfam_id', 'clan_id', 'clan_name', 'pfam_name', 'description']
+PFAM_METADATA_SIDECAR_SUFFIX = '.pkl'
+
+
+class PfamMetadata(object):
+    """
+    Pfam family metadata (clan IDs and descriptions) loaded from the Pfam-A clans TSV file.
+    Use get_pfam_metadata to obtain an instance shared by the whole process.
+    """
+    def __init__(self, clans):
+        """
+        :param clans: DataFrame indexed by pfam_id with clan_id, clan_name, pfam_name and description columns
+        """
+        self.clans = clans
+        self.descriptions = clans['description'].dropna().to_dict()
+        self.clan_ids = clans['clan_id'].dropna().to_dict()
+
+    def __len__(self):
+        return len(self.clans)
+
+    def get_description(self, pfam_id):
+        """
+        Get description of given Pfam family
+        :param pfam_id: Pfam accession with or without version suffix (PF00005 or PF00005.26)
+        :return: Description string or None if not available
+        """
+        return self.descriptions.get(pfam_id.split('.')[0])
+
+    def get_clan_id(self, pfam_id):
+        """
+        Get Pfam clan ID of given Pfam family
+        :param pfam_id: Pfam accession with or without version suffix (PF00005 or PF00005.26)
+        :return: Clan ID (e.g. CL0023) or None if the family does not belong to a clan
+        """
+        return self.clan_ids.get(pfam_id.split('.')[0])
+
+    @classmethod
+    def read_clans_tsv(cls, clans_path):
+        clans = pd.read_csv(clans_path, sep='\t', header=None)
+        clans.columns = PFAM_CLANS_COLUMNS
+        return clans.set_index('pfam_id')
+
+    @classmethod
+    def load(cls, clans_path):
+        """
+        Load Pfam metadata from clans TSV, using a pickled sidecar file next to the TSV when it is up to date.
+        The sidecar is created on first load if the directory is writable.
+        :param clans_path: Path to Pfam-A clans TSV file
+        :return: PfamMetadata instance
+        """
+        sidecar_path = clans_path + PFAM_METADATA_SIDECAR_SUFFIX
+        if os.path.exists(sidecar_path) and os.path.getmtime(sidecar_path) >= os.path.getmtime(clans_path):
+            try:
+                return cls(pd.read_pickle(sidecar_path))
+            except Exception as e:
+                logging.warning('Ignoring invalid Pfam metadata cache %s: %s', sidecar_path, e)
+
+        clans = cls.read_clans_tsv(clans_path)
+        tmp_sidecar_path = sidecar_path + '.part'
+        try:
+            clans.to_pickle(tmp_sidecar_path, protocol=2)
+            os.rename(tmp_sidecar_path, sidecar_path)
+        except (IOError, OSError) as e:
+            logging.debug('Could not save Pfam metadata cache %s: %s', sidecar_path, e)
+        return cls(clans)
+
+
+_PFAM_METADATA_CACHE = {}
+
+
+def get_pfam_metadata(clans_path=None):
+    """
+    Get Pfam metadata for given clans TSV path (downloaded Pfam clans TSV by default).
+    The metadata is loaded only once and shared by the whole process.
+    :param clans_path: Path to Pfam-A clans TSV file
+    :return: PfamMetadata instance
+    """
+    if clans_path is None:
+        from deepbgc.data import PFAM_CLANS_FILE_NAME
+        clans_path = get_downloaded_file_path(PFAM_CLANS_FILE_NAME, versioned=False)
+    key = os.path.abspath(clans_path)
+    if key not in _PFAM_METADATA_CACHE:
+        logging.debug('Loading Pfam metadata from: %s', clans_path)
+        _PFAM_METADATA_CACHE[key] = PfamMetadata.load(clans_path)
+    return _PFAM_METADATA_CACHE[key]
+
+
 def create_pfam_dict(pfam, proteins_by_id, detector_names, cluster_locations):
     locus_tag = get_pfam_protein_id(pfam)
     if locus_tag not in proteins_by_id:
@@ -512,9 +736,14 @@ def read_compatible_csv(path):
 
 
 def read_pfam_csv(path):
-    df = read_compatible_csv(path)
+    return check_pfam_csv(read_compatible_csv(path), path)
+
+
+def check_pfam_csv(df, path):
     if 'pfam_id' not in df.columns:
         raise ValueError('File is not a Pfam CSV sequence, missing "pfam_id" column: {}'.format(path))
+    if 'sequence_id' not in df.columns:
+        raise ValueError('Pfam CSV is missing "sequence_id" (or "contig_id") column: {}'.format(path))
     if 'evalue' in df.columns:
         # Make sure we are not loading the old version of Pfam CSVs where e-value filtering was not yet performed
         raise ValueError('Old Pfam CSV format with the "evalue" column is not supported anymore. Create the Pfam CSV again using "deepbgc pfam" command or filter on e-value yourself and remove the column.')
@@ -0,0 +1,178 @@
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import threading
+
+import numpy as np
+
+
+PFAM_CODE_COLUMN = 'pfam_code'
+
+
+class PfamVocabulary(object):
+    """
+    Append-only mapping of Pfam IDs to integer codes, shared by the whole process (see get_pfam_vocabulary).
+
+    Code 0 is reserved for missing Pfam IDs. Codes of Pfam IDs never change, so arrays of codes and lookup tables
+    aligned with the vocabulary stay valid when new Pfam IDs are added.
+    """
+
+    UNKNOWN = 0
+
+    def __init__(self):
+        self.pfam_ids = [None]
+        self.codes = {None: self.UNKNOWN}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.pfam_ids)
+
+    def add(self, pfam_id):
+        """
+        Get code of given Pfam ID, add it to the vocabulary if not present
+        :param pfam_id: Pfam ID
+        :return: Integer code
+        """
+        code = self.codes.get(pfam_id)
+        if code is not None:
+            return code
+        with self._lock:
+            code = self.codes.get(pfam_id)
+            if code is None:
+                code = len(self.pfam_ids)
+                self.pfam_ids.append(pfam_id)
+                self.codes[pfam_id] = code
+        return code
+
+    def encode(self, pfam_ids):
+        """
+        Encode Pfam IDs as integer codes, adding new Pfam IDs to the vocabulary
+        :param pfam_ids: Iterable of Pfam IDs
+        :return: int32 numpy array of codes
+        """
+        codes = self.codes
+        return np.array([codes[pfam_id] if pfam_id in codes else self.add(pfam_id) for pfam_id in pfam_ids],
+                        dtype=np.int32)
+
+    def decode(self, codes):
+        """
+        Decode integer codes back to Pfam IDs
+        :param codes: Iterable of integer codes
+        :return: List of Pfam IDs
+        """
+        return [self.pfam_ids[code] for code in codes]
+
+
+class PfamLookupTable(object):
+    """
+    Vector of values aligned with the shared Pfam vocabulary, indexed by encoded Pfam IDs.
+    Values are computed using given function and the table is extended lazily when new Pfam IDs are encoded.
+    """
+
+    def __init__(self, func, dtype=bool, default=None, vocabulary=None):
+        """
+        :param func: Function returning value for given Pfam ID
+        :param dtype: Numpy dtype of the values
+        :param default: Value for missing Pfam IDs (code 0), func(None) is used by default
+        :param vocabulary: PfamVocabulary, shared process-wide vocabulary is used by default
+        """
+        self.func = func
+        self.dtype = dtype
+        self.default = default
+        self.vocabulary = vocabulary or get_pfam_vocabulary()
+        self.values = np.array([], dtype=dtype)
+
+    def _extend(self):
+        num_values = len(self.values)
+        pfam_ids = self.vocabulary.pfam_ids[num_values:]
+        new_values = [self.func(pfam_id) if (code or self.default is None) else self.default
+                      for code, pfam_id in enumerate(pfam_ids, num_values)]
+        self.values = np.concatenate([self.values, np.array(new_values, dtype=self.dtype)])
+
+    def __getitem__(self, codes):
+        if len(self.values) < len(self.vocabulary):
+            self._extend()
+        return self.values[codes]
+
+
+def create_pfam_index_table(pfam_ids, vocabulary=None):
+    """
+    Create lookup table with position of each Pfam ID in given list, -1 for Pfam IDs not present in the list
+    :param pfam_ids: List of Pfam IDs, or dictionary with {pfam_id: position}
+    :param vocabulary: PfamVocabulary, shared process-wide vocabulary is used by default
+    :return: PfamLookupTable with int64 positions
+    """
+    if isinstance(pfam_ids, dict):
+        positions = pfam_ids
+    else:
+        positions = {pfam_id: i for i, pfam_id in enumerate(pfam_ids)}
+    return PfamLookupTable(lambda pfam_id: positions.get(pfam_id, -1), dtype=np.int64, default=-1, vocabulary=vocabulary)
+
+
+class PfamIndexMixin(object):
+    """
+    Mixin for transformers and models that look up Pfam IDs in a fixed list (vectors, emissions, vocabulary).
+    Positions are looked up by encoded Pfam IDs using a cached lookup table. The table is aligned with the
+    process-wide vocabulary, so it is dropped when pickling and created again on first use.
+    """
+
+    def _get_pfam_positions(self, X, pfam_ids):
+        """
+        Get position of each domain's Pfam ID in given list of Pfam IDs
+        :param X: Domain DataFrame with pfam_id or pfam_code column
+        :param pfam_ids: List of Pfam IDs or dictionary with {pfam_id: position} (or function returning them),
+        should not change until _reset_pfam_positions is called
+        :return: numpy array of positions, -1 for Pfam IDs not present in the list
+        """
+        table = getattr(self, '_pfam_index_table', None)
+        if table is None:
+            table = create_pfam_index_table(pfam_ids() if callable(pfam_ids) else pfam_ids)
+            self._pfam_index_table = table
+        return table[get_pfam_codes(X)]
+
+    def _get_pfam_vectors(self, vectors):
+        """
+        Get matrix of given Pfam vectors with an additional zero vector at the end, indexed by -1 for unknown Pfam IDs
+        :param vectors: DataFrame of vectors, should not change until _reset_pfam_positions is called
+        :return: numpy matrix
+        """
+        matrix = getattr(self, '_pfam_vectors', None)
+        if matrix is None:
+            matrix = np.vstack([vectors.values, np.zeros((1, vectors.shape[1]), dtype=vectors.values.dtype)])
+            self._pfam_vectors = matrix
+        return matrix
+
+    def _reset_pfam_positions(self):
+        self._pfam_index_table = None
+        self._pfam_vectors = None
+
+    def __getstate__(self):
+        state = dict(super(PfamIndexMixin, self).__getstate__() or {})
+        state.pop('_pfam_index_table', None)
+        state.pop('_pfam_vectors', None)
+        return state
+
+
+def get_pfam_codes(X):
+    """
+    Get Pfam IDs of given Domain DataFrame encoded using the process-wide vocabulary
+    :param X: Domain DataFrame with pfam_code column (see util.create_pfam_dataframe) or pfam_id column
+    :return: int32 numpy array of Pfam codes
+    """
+    if PFAM_CODE_COLUMN in X.columns:
+        return X[PFAM_CODE_COLUMN].values
+    return get_pfam_vocabulary().encode(X['pfam_id'].values)
+
+
+_PFAM_VOCABULARY = PfamVocabulary()
+
+
+def get_pfam_vocabulary():
+    """
+    Get Pfam ID vocabulary shared by the whole process
+    :return: PfamVocabulary
+    """
+    return _PFAM_VOCABULARY
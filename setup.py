@@ -12,6 +12,7 @@ install_requires = [
     'scikit-learn>=0.18.2', # needed for antiSMASH compatibility
     'pandas>=0.24.1',
     'numpy>=1.16.1',
+    'scipy>=1.0.0',
     'keras>=2.2.4',
     'tensorflow>=1.12.0',
     'matplotlib>=2.2.3',
@@ -42,7 +43,8 @@ setup(
     install_requires=install_requires,
     keywords='biosynthetic gene clusters, bgc detection, deep learning, pfam2vec',
     extras_require={
-        'hmm': ['hmmlearn>=0.2.1']
+        'hmm': ['hmmlearn>=0.2.1'],
+        'pyhmmer': ['pyhmmer>=0.7.0']
     },
     classifiers=[
         'Development Status :: 4 - Beta',
@@ -0,0 +1,94 @@
+from deepbgc.main import run
+from deepbgc.output.bgc_genbank import BGCGenbankWriter
+from deepbgc.output.cluster_tsv import ClusterTSVWriter
+from deepbgc.output.genbank import GenbankWriter
+from deepbgc.output.journal import RecordJournal
+from deepbgc.output.pfam_tsv import PfamTSVWriter
+from deepbgc.output.score_store import ScoreStoreWriter
+from deepbgc.output.shard import save_shard_manifest
+from deepbgc.pipeline.detector import DeepBGCDetector
+from deepbgc import util
+from test.unit.pipeline.test_unit_detector import _create_pfam_record
+import numpy as np
+import logging
+import os
+
+SUFFIXES = ['.full.gbk', '.bgc.gbk', '.bgc.tsv', '.pfam.tsv', '.scores.bin']
+
+
+def _create_writers(output_dir):
+    name = os.path.basename(output_dir)
+    return [
+        GenbankWriter(out_path=os.path.join(output_dir, name + '.full.gbk')),
+        BGCGenbankWriter(out_path=os.path.join(output_dir, name + '.bgc.gbk')),
+        ClusterTSVWriter(out_path=os.path.join(output_dir, name + '.bgc.tsv')),
+        PfamTSVWriter(out_path=os.path.join(output_dir, name + '.pfam.tsv')),
+        ScoreStoreWriter(out_path=os.path.join(output_dir, name + '.scores.bin'))
+    ]
+
+
+def _create_records(mocker, num_records):
+    mocker.patch('deepbgc.pipeline.detector.util.get_model_path')
+    model = mocker.patch('deepbgc.pipeline.detector.SequenceModelWrapper.load').return_value
+    model.version = '0.1.0'
+    model.timestamp = 123.0
+    detector = DeepBGCDetector('mydetector', score_threshold=0.5, min_proteins=2)
+    records = []
+    for i in range(num_records):
+        record = _create_pfam_record()
+        record.id = 'record{}.1'.format(i)
+        model.predict.return_value = np.sin(np.arange(len(util.get_pfam_features(record))) + i) ** 2
+        detector.run(record)
+        records.append(record)
+    return records
+
+
+def test_unit_merge(tmpdir, mocker):
+    tmpdir = str(tmpdir)
+    records = _create_records(mocker, 5)
+
+    expected_dir = os.path.join(tmpdir, 'expected')
+    os.mkdir(expected_dir)
+    writers = _create_writers(expected_dir)
+    for record in records:
+        for writer in writers:
+            writer.write(record)
+    for writer in writers:
+        writer.close()
+
+    num_shards = 2
+    shard_dirs = []
+    for shard in range(1, num_shards + 1):
+        shard_dir = os.path.join(tmpdir, 'shard{}'.format(shard))
+        os.mkdir(shard_dir)
+        writers = _create_writers(shard_dir)
+        journal = RecordJournal(os.path.join(shard_dir, 'checkpoint.jsonl'))
+        for ordinal, record in enumerate(records[shard - 1::num_shards], start=1):
+            for writer in writers:
+                writer.write(record)
+            journal.append(ordinal, record, writers)
+        for writer in writers:
+            writer.close()
+        save_shard_manifest(shard_dir, 'shard{}'.format(shard), (shard, num_shards), journal, writers,
+                            plots=['pfam-score-plot', 'bgc-region-plot', 'roc-plot', 'pr-plot'])
+        shard_dirs.append(shard_dir)
+
+    merged_dir = os.path.join(tmpdir, 'merged')
+    # Shards can be provided in any order
+    run(['merge', '--output', merged_dir] + list(reversed(shard_dirs)))
+
+    for suffix in SUFFIXES:
+        with open(os.path.join(expected_dir, 'expected' + suffix), 'rb') as f:
+            expected = f.read()
+        with open(os.path.join(merged_dir, 'merged' + suffix), 'rb') as f:
+            merged = f.read()
+        assert merged == expected, suffix
+
+    assert os.path.exists(os.path.join(merged_dir, 'evaluation', 'merged.score.png'))
+    assert os.path.exists(os.path.join(merged_dir, 'evaluation', 'merged.bgc.png'))
+    assert os.path.exists(os.path.join(merged_dir, 'README.txt'))
+
+    # Remove logging handlers to avoid affecting other tests
+    logger = logging.getLogger('')
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
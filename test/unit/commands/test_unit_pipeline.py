@@ -1,7 +1,9 @@
 import logging
 
 from deepbgc.main import run
+from deepbgc.output.registry import get_output_writer_class
 import os
+import pytest
 from Bio.SeqRecord import SeqRecord
 
 
@@ -9,27 +11,27 @@ def test_unit_pipeline_default(tmpdir, mocker):
     tmpdir = str(tmpdir)
     mocker.patch('os.mkdir')
     mocker.patch('deepbgc.command.pipeline.logging.FileHandler')
-    mock_seqio = mocker.patch('deepbgc.command.pipeline.deepbgc.command.pipeline.SeqIO')
+    mock_render_pool = mocker.patch('deepbgc.command.pipeline.PlotRenderPool')
+    mock_read_inputs = mocker.patch('deepbgc.command.pipeline.read_inputs')
+    # Plots are rendered in the background only for inputs with more records than fit into a plot
+    mocker.patch('deepbgc.command.pipeline.count_records', return_value=100)
 
     record1 = SeqRecord('ABC')
     record2 = SeqRecord('DEF')
-    mock_seqio.parse.return_value = [record1, record2]
+    mock_read_inputs.return_value = [record1, record2]
 
     mock_annotator = mocker.patch('deepbgc.command.pipeline.DeepBGCAnnotator')
     mock_classifier = mocker.patch('deepbgc.command.pipeline.DeepBGCClassifier')
     mock_detector = mocker.patch('deepbgc.command.pipeline.DeepBGCDetector')
 
-    writer_paths = [
-        'deepbgc.command.pipeline.BGCRegionPlotWriter',
-        'deepbgc.command.pipeline.ClusterTSVWriter',
-        'deepbgc.command.pipeline.PfamScorePlotWriter',
-        'deepbgc.command.pipeline.PfamTSVWriter',
-        'deepbgc.command.pipeline.GenbankWriter',
-        'deepbgc.command.pipeline.BGCGenbankWriter',
-        'deepbgc.command.pipeline.ReadmeWriter'
-        # Note: We are mocking classes imported in deepbgc.command.pipeline, not at their original location!
-    ]
-    writers = [mocker.patch(path) for path in writer_paths]
+    # Output writers are created through the registry, ROC and PR plot writers are not mocked
+    mock_writers = {name: mocker.MagicMock() for name in [
+        'bgc-region-plot', 'bgc-tsv', 'pfam-score-plot', 'pfam-tsv', 'score-store', 'genbank', 'bgc-genbank'
+    ]}
+    mocker.patch('deepbgc.output.registry.get_output_writer_class',
+                 side_effect=lambda name: mock_writers.get(name) or get_output_writer_class(name))
+    # Note: We are mocking the README writer imported in deepbgc.command.pipeline, not at its original location!
+    writers = list(mock_writers.values()) + [mocker.patch('deepbgc.command.pipeline.ReadmeWriter')]
 
     report_dir = os.path.join(tmpdir, 'report')
     report_tmp_dir = os.path.join(report_dir, 'tmp')
@@ -54,14 +56,27 @@ def test_unit_pipeline_default(tmpdir, mocker):
     os.mkdir.assert_any_call(report_dir)
     os.mkdir.assert_any_call(report_tmp_dir)
 
-    mock_annotator.assert_called_with(tmp_dir_path=report_tmp_dir)
+    mock_annotator.assert_called_with(
+        tmp_dir_path=report_tmp_dir,
+        pfam_backend='hmmscan',
+        pfam_cpus=None,
+        hmmsearch_min_proteins=5000,
+        pfam_db_path=None,
+        pfam_num_profiles=None
+    )
     mock_classifier.assert_any_call(
         classifier='myclassifier1', 
-        score_threshold=0.2
+        score_threshold=0.2,
+        n_jobs=None,
+        compact=False,
+        skip_unchanged=False
     )
     mock_classifier.assert_any_call(
         classifier='myclassifier2', 
-        score_threshold=0.2
+        score_threshold=0.2,
+        n_jobs=None,
+        compact=False,
+        skip_unchanged=False
     )
     mock_detector.assert_called_with(
         detector='mydetector',
@@ -72,12 +87,14 @@ def test_unit_pipeline_default(tmpdir, mocker):
         min_nucl=10,
         min_proteins=20,
         min_domains=30,
-        min_bio_domains=40
+        min_bio_domains=40,
+        skip_unchanged=False
     )
 
-    assert mock_annotator.return_value.run.call_count == 2     # Two records
-    assert mock_detector.return_value.run.call_count == 2    # Two records
-    assert mock_classifier.return_value.run.call_count == 4  # Two records for each of the two classifiers
+    # Both records are processed in a single batch
+    mock_annotator.return_value.run_batch.assert_called_once_with([record1, record2])
+    mock_detector.return_value.run_batch.assert_called_once_with([record1, record2])
+    assert mock_classifier.return_value.run_batch.call_count == 2  # One batch for each of the two classifiers
 
     mock_annotator.return_value.print_summary.assert_called_once_with()
     mock_detector.return_value.print_summary.assert_called_once_with()
@@ -87,7 +104,51 @@ def test_unit_pipeline_default(tmpdir, mocker):
         assert writer.return_value.write.call_count == 2  # Two records
         writer.return_value.close.assert_called_once_with()
 
+    # ROC and PR plots (not mocked) are rendered in the background
+    assert mock_render_pool.return_value.submit.call_count == 2
+    mock_render_pool.return_value.wait.assert_called_once_with()
+
     # Remove logging handlers to avoid affecting other tests
     logger = logging.getLogger('')
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
+
+
+def test_unit_pipeline_error_stops_render_pool(tmpdir, mocker):
+    mocker.patch('os.mkdir')
+    mocker.patch('deepbgc.command.pipeline.logging.FileHandler')
+    mock_render_pool = mocker.patch('deepbgc.command.pipeline.PlotRenderPool')
+    mocker.patch('deepbgc.command.pipeline.count_records', return_value=100)
+
+    with pytest.raises(ValueError):
+        run(['pipeline', '--output', os.path.join(str(tmpdir), 'report'),
+             '--detector', 'first', '--detector', 'second', '--label', 'mylabel', 'mySequence.gbk'])
+    mock_render_pool.return_value.terminate.assert_called_once_with()
+
+    logger = logging.getLogger('')
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+
+
+def test_unit_pipeline_small_input_without_render_pool(tmpdir, mocker):
+    mocker.patch('os.mkdir')
+    mocker.patch('deepbgc.command.pipeline.logging.FileHandler')
+    mock_render_pool = mocker.patch('deepbgc.command.pipeline.PlotRenderPool')
+    mocker.patch('deepbgc.command.pipeline.count_records', return_value=2)
+
+    with pytest.raises(ValueError):
+        run(['pipeline', '--output', os.path.join(str(tmpdir), 'report'),
+             '--detector', 'first', '--detector', 'second', '--label', 'mylabel', 'mySequence.gbk'])
+    # Plots of small inputs would not be rendered while processing the records
+    assert not mock_render_pool.called
+
+    logger = logging.getLogger('')
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+
+
+@pytest.mark.parametrize("option", ['--checkpoint', '--resume'])
+def test_unit_pipeline_resume_plots_without_genbank(option):
+    # Plots could not be restored after resuming without the GenBank output
+    with pytest.raises(ValueError, match='genbank'):
+        run(['pipeline', option, '--outputs', 'bgc-tsv,pfam-score-plot', 'mySequence.gbk'])
@@ -0,0 +1,65 @@
+from deepbgc.main import run
+from deepbgc.command.rethreshold import _LocationIndex
+from deepbgc.output.cluster_tsv import ClusterTSVWriter
+from deepbgc.output.genbank import GenbankWriter
+from deepbgc.output.score_store import ScoreStoreWriter
+from deepbgc.pipeline.detector import DeepBGCDetector
+from deepbgc import util
+from test.unit.pipeline.test_unit_detector import _create_pfam_record
+from Bio.SeqFeature import SeqFeature, FeatureLocation
+import numpy as np
+import pandas as pd
+import os
+
+
+def _detect(mocker, output_dir, score_threshold, annotated=False):
+    mocker.patch('deepbgc.pipeline.detector.util.get_model_path')
+    model = mocker.patch('deepbgc.pipeline.detector.SequenceModelWrapper.load').return_value
+    model.version = '0.1.0'
+    model.timestamp = 123.0
+    record = _create_pfam_record()
+    model.predict.return_value = np.sin(np.arange(len(util.get_pfam_features(record)))) ** 2
+    DeepBGCDetector('mydetector', score_threshold=score_threshold, min_proteins=2).run(record)
+    if annotated:
+        record.features.append(SeqFeature(FeatureLocation(0, len(record)), type='cluster',
+                                          qualifiers={'detector': ['annotated']}))
+
+    name = os.path.basename(output_dir)
+    writers = [
+        GenbankWriter(out_path=os.path.join(output_dir, name + '.full.gbk')),
+        ClusterTSVWriter(out_path=os.path.join(output_dir, name + '.bgc.tsv')),
+        ScoreStoreWriter(out_path=os.path.join(output_dir, name + '.scores.bin'))
+    ]
+    for writer in writers:
+        writer.write(record)
+        writer.close()
+
+
+def test_unit_rethreshold(tmpdir, mocker):
+    original_dir = str(tmpdir.mkdir('original'))
+    _detect(mocker, original_dir, score_threshold=0.2)
+    expected_dir = str(tmpdir.mkdir('expected'))
+    _detect(mocker, expected_dir, score_threshold=0.6)
+    expected = pd.read_csv(os.path.join(expected_dir, 'expected.bgc.tsv'), sep='\t')
+    assert len(expected)
+
+    scores_path = os.path.join(original_dir, 'original.scores.bin')
+    tsv_dir = os.path.join(str(tmpdir), 'tsv')
+    run(['rethreshold', '--score', '0.6', '--output', tsv_dir, scores_path])
+    pd.testing.assert_frame_equal(pd.read_csv(os.path.join(tsv_dir, 'tsv.bgc.tsv'), sep='\t'), expected)
+
+    gbk_dir = os.path.join(str(tmpdir), 'gbk')
+    run(['rethreshold', '--score', '0.6', '--output', gbk_dir, scores_path,
+         '--genbank', os.path.join(original_dir, 'original.full.gbk')])
+    pd.testing.assert_frame_equal(pd.read_csv(os.path.join(gbk_dir, 'gbk.bgc.tsv'), sep='\t'), expected)
+
+
+
+def test_unit_location_index():
+    random = np.random.RandomState(0)
+    starts = random.randint(0, 1000, size=200)
+    ends = starts + random.randint(1, 100, size=200)
+    index = _LocationIndex(starts, ends)
+    for start, end in [(0, 1100), (100, 300), (500, 510), (2000, 3000)] + [tuple(sorted(random.randint(0, 1100, size=2))) for _ in range(20)]:
+        expected = np.flatnonzero((starts >= start) & (ends <= end))
+        assert list(index.get_contained(start, end)) == list(expected)
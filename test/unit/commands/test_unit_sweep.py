@@ -0,0 +1,24 @@
+from deepbgc.main import run
+from test.unit.commands.test_unit_rethreshold import _detect
+import pandas as pd
+import os
+
+
+def test_unit_sweep(tmpdir, mocker):
+    counts = {}
+    for score in [0.2, 0.6]:
+        output_dir = str(tmpdir.mkdir('score{}'.format(score)))
+        _detect(mocker, output_dir, score_threshold=score, annotated=True)
+        counts[score] = len(pd.read_csv(os.path.join(output_dir, os.path.basename(output_dir) + '.bgc.tsv'), sep='\t')) - 1
+
+    sweep_path = os.path.join(str(tmpdir), 'sweep.tsv')
+    scores_path = os.path.join(str(tmpdir), 'score0.2', 'score0.2.scores.bin')
+    run(['sweep', '--score', '0.2', '0.6', '--min-proteins', '1', '2', '--output', sweep_path, scores_path])
+    result = pd.read_csv(sweep_path, sep='\t')
+    assert len(result) == 4
+    result = result.set_index(['score_threshold', 'min_proteins'])
+    assert result.loc[(0.2, 2), 'num_bgcs'] == counts[0.2]
+    assert result.loc[(0.6, 2), 'num_bgcs'] == counts[0.6]
+    # Whole record is annotated, all detected proteins are true positives
+    assert (result['precision'] == 1).all()
+    assert result.loc[(0.2, 1), 'recall'] > result.loc[(0.6, 1), 'recall']
@@ -2,7 +2,7 @@ import pandas as pd
 import pytest
 
 from deepbgc.main import run
-from deepbgc.models.wrapper import SequenceModelWrapper
+from deepbgc.models.wrapper import SequenceModelWrapper, COMPACT_MODEL_SUFFIX, FLAT_FOREST_SUFFIX
 from test.test_util import get_test_file
 import os
 
@@ -66,7 +66,8 @@ def test_unit_train_classify(tmpdir):
 
     domains = pd.read_csv(get_test_file('BGC0000015.pfam.csv'))
 
-    classes = model.predict([sample for _, sample in domains.groupby('sequence_id')])
+    samples = [sample for _, sample in domains.groupby('sequence_id')]
+    classes = model.predict(samples)
 
     assert isinstance(classes, pd.DataFrame)
     assert list(classes.columns) == ['class1', 'class2', 'class3', 'class4']
@@ -75,3 +76,24 @@ def test_unit_train_classify(tmpdir):
 
     assert list(classes.iloc[0] > 0.5) == [True, False, True, False]
     assert list(classes.iloc[1] > 0.5) == [False, True, False, True]
+
+    # Sparse one-hot encoding gives the same prediction as dense DataFrame
+    dense_classes = model.model.predict(model.transformer.transform(samples))
+    assert (classes.values == dense_classes.values).all()
+
+    # Execution parameters can be changed after loading
+    model.set_execution_params(n_jobs=2)
+    assert model.model.rf.n_jobs == 2
+    assert (model.predict(samples).values == classes.values).all()
+
+    # Compact flat-array forest gives identical scores
+    model.set_execution_params(compact=True)
+    assert (model.predict(samples).values == classes.values).all()
+
+    # Compact model is compiled on first load and loaded without the sklearn forest afterwards
+    compiled = SequenceModelWrapper.load_compact(out_path)
+    assert (compiled.predict(samples).values == classes.values).all()
+    assert os.path.exists(out_path + COMPACT_MODEL_SUFFIX) and os.path.exists(out_path + FLAT_FOREST_SUFFIX)
+    compact = SequenceModelWrapper.load_compact(out_path)
+    assert compact.model.rf is None
+    assert (compact.predict(samples).values == classes.values).all()
@@ -0,0 +1,32 @@
+from deepbgc.models.flat_forest import FlatForest
+from sklearn.ensemble import RandomForestClassifier
+from scipy import sparse
+import numpy as np
+import os
+
+
+def test_unit_flat_forest(tmpdir):
+    random = np.random.RandomState(0)
+    X = (random.rand(200, 50) < 0.1).astype(int)
+    y = np.stack([X[:, 0] | X[:, 1], X[:, 2] & (random.rand(200) < 0.8)], axis=1)
+    rf = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    expected = np.array([class_pred[:, 1] for class_pred in rf.predict_proba(X)]).T
+
+    flat = FlatForest.from_sklearn(rf)
+    assert (flat.predict_proba(X) == expected).all()
+    assert (flat.predict_proba(sparse.csr_matrix(X)) == expected).all()
+    assert flat.predict_proba(sparse.csr_matrix((0, 50))).shape == (0, 2)
+
+    path = os.path.join(str(tmpdir), 'forest.npz')
+    flat.save(path)
+    loaded = FlatForest.load(path)
+    for name in FlatForest.INDEX_ARRAYS:
+        assert (getattr(loaded, name) == getattr(flat, name)).all()
+    assert (loaded.predict_proba(sparse.csr_matrix(X)) == expected).all()
+
+
+def test_unit_flat_forest_negative_thresholds():
+    random = np.random.RandomState(0)
+    X = random.randn(100, 5).astype(np.float32)
+    rf = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, X[:, 0] + X[:, 1] > 0)
+    assert (FlatForest.from_sklearn(rf).predict_proba(X)[:, 0] == rf.predict_proba(X)[:, 1]).all()
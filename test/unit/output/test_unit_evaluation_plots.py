@@ -0,0 +1,97 @@
+from deepbgc.output.evaluation.bgc_region_plot import BGCRegionPlotWriter
+from deepbgc.output.evaluation.plot_writer import PlotRenderPool
+from deepbgc.output.evaluation.pfam_score_plot import PfamScorePlotWriter, summarize_trace, MAX_TRACE_POINTS
+from deepbgc.output.evaluation.pr_plot import PrecisionRecallPlotWriter
+from deepbgc.output.evaluation.roc_plot import ROCPlotWriter
+from sklearn.metrics import roc_auc_score, average_precision_score
+import numpy as np
+import pandas as pd
+import os
+
+
+def test_unit_summarize_trace():
+    values = np.sin(np.arange(10000) / 100.0)
+    x, y_min, y_max = summarize_trace(values, max_points=100)
+    assert len(x) == len(y_min) == len(y_max) == 100
+    assert y_min.min() == values.min()
+    assert y_max.max() == values.max()
+    assert y_max[0] == values[:100].max()
+
+    x, y_min, y_max = summarize_trace(values[:50], max_points=100)
+    np.testing.assert_array_equal(y_max, values[:50])
+
+
+def test_unit_curve_plot_counts(tmpdir, mocker):
+    logging_info = mocker.patch('deepbgc.output.evaluation.roc_plot.logging.info')
+    random = np.random.RandomState(0)
+    detector_meta = [dict(name='mydetector', label='mydetector', score_threshold='0.5')]
+    roc_writer = ROCPlotWriter(out_path=os.path.join(str(tmpdir), 'roc.png'))
+    pr_writer = PrecisionRecallPlotWriter(out_path=os.path.join(str(tmpdir), 'pr.png'))
+    all_scores = []
+    # More sequences than plotted in the score plot, all are evaluated
+    for i in range(60):
+        in_cluster = random.rand(100) < 0.3
+        scores = pd.DataFrame({
+            'in_cluster': in_cluster.astype(int),
+            'mydetector_score': np.clip(in_cluster * 0.3 + random.rand(100) * 0.7, 0, 1).round(5)
+        })
+        all_scores.append(scores)
+        roc_writer.write_scores('seq{}'.format(i), scores, detector_meta)
+        pr_writer.write_scores('seq{}'.format(i), scores, detector_meta)
+
+    all_scores = pd.concat(all_scores)
+    positive_counts, negative_counts = roc_writer.detector_counts['mydetector']
+    assert positive_counts.sum() == all_scores['in_cluster'].sum()
+    assert negative_counts.sum() == len(all_scores) - all_scores['in_cluster'].sum()
+
+    roc_writer.close()
+    pr_writer.close()
+    assert os.path.exists(roc_writer.out_path)
+    assert os.path.exists(pr_writer.out_path)
+    # Binned values are close to the exact ones
+    expected_auc = roc_auc_score(all_scores['in_cluster'], all_scores['mydetector_score'])
+    expected_ap = average_precision_score(all_scores['in_cluster'], all_scores['mydetector_score'])
+    logged_auc, logged_ap = [float(call[0][1].split()[1]) for call in logging_info.call_args_list]
+    assert abs(logged_auc - expected_auc) < 0.005
+    assert abs(logged_ap - expected_ap) < 0.005
+
+
+def test_unit_plots_large_sequence(tmpdir):
+    num_pfams = 200000
+    random = np.random.RandomState(0)
+    detector_meta = [dict(name='mydetector', label='mydetector', score_threshold='0.5')]
+    score_writer = PfamScorePlotWriter(out_path=os.path.join(str(tmpdir), 'score.png'))
+    scores = pd.DataFrame({
+        'in_cluster': (np.arange(num_pfams) // 1000 % 7 == 0).astype(int),
+        'mydetector_score': random.rand(num_pfams)
+    })
+    score_writer.write_scores('large', scores, detector_meta)
+    assert len(score_writer.sequence_traces[0]['mydetector_score'][0]) == MAX_TRACE_POINTS
+
+    region_writer = BGCRegionPlotWriter(out_path=os.path.join(str(tmpdir), 'bgc.png'))
+    starts = np.arange(0, 50000000, 10000)
+    clusters = pd.DataFrame({
+        'detector_label': ['mydetector', 'annotated'] * (len(starts) // 2),
+        'nucl_start': starts,
+        'nucl_end': starts + 5000
+    })
+    region_writer.write_clusters('large', clusters)
+
+    score_writer.close()
+    region_writer.close()
+    assert os.path.exists(score_writer.out_path)
+    assert os.path.exists(region_writer.out_path)
+
+
+def test_unit_plot_render_pool(tmpdir):
+    render_pool = PlotRenderPool(processes=2)
+    writer = BGCRegionPlotWriter(out_path=os.path.join(str(tmpdir), 'bgc.png'), max_sequences=2, render_pool=render_pool)
+    clusters = pd.DataFrame({'detector_label': ['mydetector'], 'nucl_start': [100], 'nucl_end': [5000]})
+    for i in range(5):
+        writer.write_clusters('seq{}'.format(i), clusters)
+    # Plot is submitted as soon as the maximum number of sequences is reached
+    assert writer.is_rendered
+    assert len(render_pool.results) == 1
+    writer.close()
+    render_pool.wait()
+    assert os.path.exists(writer.out_path)
@@ -0,0 +1,35 @@
+from deepbgc.output.registry import parse_outputs, create_output_writers, get_output_writer_class, OUTPUT_WRITERS
+import subprocess
+import sys
+import pytest
+import os
+
+
+def test_unit_parse_outputs():
+    assert parse_outputs(None) == list(OUTPUT_WRITERS)
+    assert parse_outputs(None, is_minimal_output=True) == ['genbank']
+    # Outputs are created in the given order
+    assert parse_outputs('bgc-tsv, genbank,bgc-tsv') == ['bgc-tsv', 'genbank']
+    with pytest.raises(ValueError):
+        parse_outputs('genbank,invalid')
+
+
+def test_unit_output_writer_names():
+    # Registry names are kept next to the class paths to avoid importing all writers, they must match get_name()
+    for name in OUTPUT_WRITERS:
+        assert get_output_writer_class(name).get_name() == name
+
+
+def test_unit_create_output_writers(tmpdir):
+    tmpdir = str(tmpdir)
+    writers = create_output_writers(['genbank', 'bgc-genbank', 'roc-plot'], tmpdir, os.path.join(tmpdir, 'evaluation'), 'report')
+    assert [w.get_name() for w in writers] == ['genbank', 'bgc-genbank', 'roc-plot']
+    assert writers[1].out_path == os.path.join(tmpdir, 'report.bgc.gbk')
+    assert writers[2].out_path == os.path.join(tmpdir, 'evaluation', 'report.roc.png')
+
+
+def test_unit_matplotlib_not_imported():
+    # Matplotlib is loaded only when a plot is rendered
+    code = 'import sys; import deepbgc.main; from deepbgc.output.registry import create_output_writers; ' \
+           'create_output_writers(["pfam-score-plot"], ".", ".", "report"); assert "matplotlib" not in sys.modules'
+    subprocess.check_call([sys.executable, '-c', code])
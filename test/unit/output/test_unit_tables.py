@@ -0,0 +1,40 @@
+from deepbgc.output.cluster_tsv import ClusterTSVWriter
+from deepbgc.output.evaluation.pfam_score_plot import PfamScorePlotWriter
+from deepbgc.output.pfam_tsv import PfamTSVWriter
+from deepbgc.output.tables import RecordTables, get_required_tables, PFAM_TABLE, CLUSTER_TABLE
+from deepbgc import util
+from test.unit.pipeline.test_unit_detector import _create_pfam_record
+import pytest
+import os
+
+
+def test_unit_record_tables_shared(tmpdir, mocker):
+    tmpdir = str(tmpdir)
+    create_pfam_dataframe = mocker.spy(util, 'create_pfam_dataframe')
+    writers = [
+        PfamTSVWriter(out_path=os.path.join(tmpdir, 'pfam.tsv')),
+        PfamScorePlotWriter(out_path=os.path.join(tmpdir, 'score.png')),
+        ClusterTSVWriter(out_path=os.path.join(tmpdir, 'bgc.tsv'))
+    ]
+    assert get_required_tables(writers) == [PFAM_TABLE, CLUSTER_TABLE]
+
+    record = _create_pfam_record()
+    tables = RecordTables(record, get_required_tables(writers))
+    for writer in writers:
+        writer.write(record, tables=tables)
+    assert create_pfam_dataframe.call_count == 1
+
+    # Writers used on their own compute the tables themselves
+    writers[0].write(record)
+    assert create_pfam_dataframe.call_count == 2
+    for writer in writers:
+        writer.close()
+    assert os.path.exists(writers[0].out_path)
+
+
+def test_unit_record_tables_undeclared():
+    tables = RecordTables(_create_pfam_record(), [PFAM_TABLE])
+    with pytest.raises(ValueError):
+        tables.get(CLUSTER_TABLE)
+    with pytest.raises(ValueError):
+        RecordTables(_create_pfam_record(), ['invalid'])
@@ -0,0 +1,138 @@
+from deepbgc.pipeline.detector import segment_clusters, count_cluster_domains, get_domain_index
+from deepbgc.vocabulary import get_pfam_vocabulary
+from deepbgc import util
+import numpy as np
+
+
+def test_unit_segment_clusters():
+    starts = np.array([0, 100, 200, 300, 400, 500, 600, 700])
+    ends = starts + 90
+    scores = np.array([0.9, 0.8, 0.1, 0.7, 0.2, 0.1, 0.6, 0.5])
+
+    first, last, cluster_scores = segment_clusters(starts, ends, scores, score_threshold=0.5)
+    assert list(first) == [0, 3, 6]
+    assert list(last) == [1, 3, 7]
+    np.testing.assert_allclose(cluster_scores, [0.85, 0.7, 0.55])
+
+    # Merge clusters separated by a single protein
+    first, last, cluster_scores = segment_clusters(starts, ends, scores, score_threshold=0.5, merge_max_protein_gap=1)
+    assert list(first) == [0, 6]
+    assert list(last) == [3, 7]
+    np.testing.assert_allclose(cluster_scores, [0.625, 0.55])
+
+    # Merge clusters within 210 nucleotides
+    first, last, _ = segment_clusters(starts, ends, scores, score_threshold=0.5, merge_max_nucl_gap=210)
+    assert list(first) == [0]
+    assert list(last) == [7]
+
+    first, last, _ = segment_clusters(starts, ends, scores, score_threshold=0.5, min_proteins=2, min_nucl=150)
+    assert list(first) == [0, 6]
+
+    first, last, _ = segment_clusters(starts, ends, scores, score_threshold=0.95)
+    assert not len(first)
+
+
+def test_unit_count_cluster_domains():
+    pfam_protein_idx = [0, 0, 1, 3, 3, 4]
+    pfam_codes = get_pfam_vocabulary().encode(['PF00109', 'PF00001', 'PF00109', 'PF02801', None, 'PF00002'])
+    num_domains, num_bio_domains = count_cluster_domains(pfam_protein_idx, pfam_codes, num_proteins=5,
+                                                         first_idx=[0, 2, 4], last_idx=[1, 3, 4])
+    assert list(num_domains) == [3, 1, 1]
+    # Biosynthetic Pfam IDs are counted once per cluster
+    assert list(num_bio_domains) == [1, 1, 0]
+
+
+def test_unit_count_cluster_domains_random():
+    random = np.random.RandomState(0)
+    pfam_ids = ['PF00109', 'PF02801', 'PF00001', 'PF00002', 'PF00550', 'PF08659']
+    num_proteins = 200
+    pfam_protein_idx = np.sort(random.randint(0, num_proteins, 500))
+    pfam_codes = get_pfam_vocabulary().encode(list(random.choice(pfam_ids, 500)))
+    first_idx, last_idx, _ = segment_clusters(np.arange(num_proteins), np.arange(num_proteins) + 1,
+                                              random.rand(num_proteins), score_threshold=0.3)
+    _, num_bio_domains = count_cluster_domains(pfam_protein_idx, pfam_codes, num_proteins, first_idx, last_idx)
+    is_bio = util.get_biosynthetic_pfam_table()[pfam_codes]
+    expected = [len(set(pfam_codes[is_bio & (pfam_protein_idx >= first) & (pfam_protein_idx <= last)]))
+                for first, last in zip(first_idx, last_idx)]
+    assert list(num_bio_domains) == expected
+    # Precomputed domain index gives the same counts
+    domain_index = get_domain_index(pfam_protein_idx, pfam_codes, num_proteins)
+    _, num_bio_domains = count_cluster_domains(None, None, num_proteins, first_idx, last_idx, domain_index=domain_index)
+    assert list(num_bio_domains) == expected
+
+
+def _create_pfam_record():
+    from Bio import SeqIO
+    from Bio.SeqFeature import SeqFeature, FeatureLocation
+    from deepbgc import util
+    from deepbgc.data import PFAM_DB_VERSION
+    from test.test_util import get_test_file
+    record = next(SeqIO.parse(get_test_file('BGC0000015.gbk'), 'genbank'))
+    for protein in util.get_protein_features(record):
+        location = FeatureLocation(protein.location.start, protein.location.start + 30, strand=protein.location.strand)
+        record.features.append(SeqFeature(location, type=util.PFAM_FEATURE, qualifiers={
+            'locus_tag': [util.get_protein_id(protein)],
+            'db_xref': ['PF00109.1'],
+            'database': [PFAM_DB_VERSION]
+        }))
+    return record
+
+
+def test_unit_detector_skip_unchanged(mocker):
+    from deepbgc.pipeline.detector import DeepBGCDetector
+    from deepbgc import util
+    mocker.patch('deepbgc.pipeline.detector.util.get_model_path')
+    mock_load = mocker.patch('deepbgc.pipeline.detector.SequenceModelWrapper.load')
+    model = mock_load.return_value
+    model.version = '0.1.0'
+    model.timestamp = 123.0
+
+    record = _create_pfam_record()
+    num_pfams = len(util.get_pfam_features(record))
+    model.predict.return_value = np.linspace(0, 1, num_pfams)
+    DeepBGCDetector('mydetector', score_threshold=0.5, skip_unchanged=True).run(record)
+    assert model.predict.call_count == 1
+    num_clusters = len(util.get_cluster_features(record))
+
+    # Same parameters, nothing is done
+    DeepBGCDetector('mydetector', score_threshold=0.5, skip_unchanged=True).run(record)
+    assert model.predict.call_count == 1
+    assert len(util.get_cluster_features(record)) == num_clusters
+
+    # Changed threshold, clusters are segmented from stored scores
+    detector = DeepBGCDetector('mydetector', score_threshold=0.9, skip_unchanged=True)
+    detector.run(record)
+    assert model.predict.call_count == 1
+    assert detector.num_rescored == 1
+    assert util.get_record_detector_meta(record)['mydetector']['score_threshold'] == 0.9
+
+    # Changed model version, scores are predicted again
+    model.version = '0.2.0'
+    DeepBGCDetector('mydetector', score_threshold=0.9, skip_unchanged=True).run(record)
+    assert model.predict.call_count == 2
+
+
+def test_unit_detector_qualifier_precision(mocker):
+    from deepbgc.pipeline.detector import DeepBGCDetector
+    from deepbgc import util
+    mocker.patch('deepbgc.pipeline.detector.util.get_model_path')
+    model = mocker.patch('deepbgc.pipeline.detector.SequenceModelWrapper.load').return_value
+    model.version = '0.1.0'
+    model.timestamp = 123.0
+
+    record = _create_pfam_record()
+    # Formatted as "0.49999" in the score qualifier, but rounded to 0.5 using np.round
+    model.predict.return_value = np.full(len(util.get_pfam_features(record)), 0.49999499999999997)
+    DeepBGCDetector('mydetector', score_threshold=0.5).run(record)
+    assert not util.get_cluster_features(record)
+
+
+def test_unit_segment_clusters_breaks():
+    starts = np.array([0, 100, 200, 300, 0, 100, 200])
+    ends = starts + 90
+    scores = np.array([0.1, 0.8, 0.9, 0.7, 0.6, 0.1, 0.6])
+
+    # Clusters of concatenated records are not merged across record boundaries
+    first, last, _ = segment_clusters(starts, ends, scores, score_threshold=0.5, merge_max_protein_gap=1, breaks=[4])
+    assert list(first) == [1, 4]
+    assert list(last) == [3, 6]
@@ -0,0 +1,161 @@
+from deepbgc.input import read_records, read_inputs, count_records, parse_shard, sniff_format, open_input, RecordIndex
+from deepbgc.input.reader import ReadaheadIterator
+from deepbgc import util
+from test.test_util import get_test_file
+from Bio import SeqIO, bgzf
+import pandas as pd
+import pytest
+import shutil
+import gzip
+import io
+import os
+import re
+
+
+def _gzip(path, out_path):
+    with open(path, 'rb') as f, gzip.open(out_path, 'wb') as out:
+        shutil.copyfileobj(f, out)
+    return out_path
+
+
+@pytest.mark.parametrize("file_name,fmt", [
+    ('BGC0000015.gbk', 'genbank'),
+    ('BGC0000015.fa', 'fasta'),
+])
+def test_unit_read_records_compressed(tmpdir, file_name, fmt):
+    # Compressed file with a misleading extension, format is detected from content
+    compressed_path = _gzip(get_test_file(file_name), os.path.join(str(tmpdir), 'input.txt'))
+    with open_input(compressed_path) as f:
+        assert sniff_format(f) == fmt
+
+    expected = list(SeqIO.parse(get_test_file(file_name), fmt))
+    records = list(read_records(compressed_path))
+    assert [r.id for r in records] == [r.id for r in expected]
+    assert [str(r.seq) for r in records] == [str(r.seq) for r in expected]
+    assert [len(r.features) for r in records] == [len(r.features) for r in expected]
+
+
+def test_unit_read_records_pfam_table(tmpdir):
+    csv_path = get_test_file('BGC0000015.pfam.csv')
+    tsv_path = os.path.join(str(tmpdir), 'input.tsv')
+    domains = pd.read_csv(csv_path)
+    domains.to_csv(tsv_path, sep='\t', index=False)
+
+    for path in [csv_path, tsv_path]:
+        records = list(read_records(path))
+        assert [r.id for r in records] == list(domains['sequence_id'].unique())
+        record_domains = domains[domains['sequence_id'] == records[0].id]
+        pfams = util.get_pfam_features(records[0])
+        assert sorted(util.get_pfam_id(f) for f in pfams) == sorted(record_domains['pfam_id'])
+        assert len(util.get_protein_features(records[0])) == record_domains['protein_id'].nunique()
+        # Domain location is computed from protein location, first protein is on the reverse strand
+        pfam = [f for f in pfams if util.get_pfam_id(f) == 'PF00005' and util.get_pfam_protein_id(f) == 'AAK73498.1'][0]
+        assert pfam.location.end == 1824 - 3 * 1
+        assert pfam.location.start == 1824 - 3 * 137
+
+
+def test_unit_read_records_pfam_table_missing_sequence_id(tmpdir):
+    tsv_path = os.path.join(str(tmpdir), 'input.tsv')
+    pd.read_csv(get_test_file('BGC0000015.pfam.csv')).drop(columns=['sequence_id']).to_csv(tsv_path, sep='\t', index=False)
+    with pytest.raises(ValueError, match='sequence_id'):
+        list(read_records(tsv_path))
+
+
+def test_unit_readahead_error():
+    def generate():
+        yield 1
+        yield 2
+        raise ValueError('Invalid record')
+
+    items = ReadaheadIterator(generate(), 1)
+    assert next(items) == 1
+    assert next(items) == 2
+    with pytest.raises(ValueError):
+        next(items)
+
+
+def _write_records(path, fmt, num_records, compressed=False):
+    record = next(SeqIO.parse(get_test_file('BGC0000015.gbk'), 'genbank'))
+    records = []
+    for i in range(num_records):
+        copy = record[i * 100:]
+        copy.id = 'record{}.1'.format(i)
+        copy.name = 'record{}'.format(i)
+        copy.annotations = dict(record.annotations)
+        records.append(copy)
+    handle = bgzf.BgzfWriter(path, 'wb') if compressed else open(path, 'w')
+    with handle:
+        if compressed:
+            data = io.StringIO()
+            SeqIO.write(records, data, fmt)
+            handle.write(data.getvalue().encode('utf-8'))
+        else:
+            SeqIO.write(records, handle, fmt)
+    return records
+
+
+@pytest.mark.parametrize("fmt", ['genbank', 'fasta'])
+@pytest.mark.parametrize("compressed", [False, True])
+def test_unit_read_inputs_indexed(tmpdir, fmt, compressed):
+    path = os.path.join(str(tmpdir), 'input.' + ('gbk' if fmt == 'genbank' else 'fa'))
+    records = _write_records(path, fmt, 5, compressed=compressed)
+
+    selected = list(read_inputs([path], record_ids=['record3.1', 'record1.1'], readahead=0))
+    assert [r.id for r in selected] == ['record1.1', 'record3.1']
+    assert str(selected[1].seq) == str(records[3].seq)
+    assert os.path.exists(RecordIndex.get_index_path(path))
+
+    # Index is reused, shards are selected from records in both inputs
+    shards = [[r.id for r in read_inputs([path, path], shard=(i, 3))] for i in [1, 2, 3]]
+    assert shards[0] == ['record0.1', 'record3.1', 'record1.1', 'record4.1']
+    assert sorted(sum(shards, [])) == sorted([r.id for r in records] * 2)
+
+
+@pytest.mark.parametrize("fmt", ['genbank', 'fasta'])
+def test_unit_record_index_small_blocks(tmpdir, mocker, fmt):
+    path = os.path.join(str(tmpdir), 'input.' + ('gbk' if fmt == 'genbank' else 'fa'))
+    records = _write_records(path, fmt, 5)
+    expected = RecordIndex.build(path, fmt).entries
+    # Record markers and headers split between scanned blocks are found
+    mocker.patch('deepbgc.input.index.SCAN_BLOCK_SIZE', 7)
+    index = RecordIndex.build(path, fmt)
+    assert index.entries == expected
+    assert [index.read(entry).id for entry in index.entries] == [r.id for r in records]
+    index.close()
+
+
+@pytest.mark.parametrize("fmt", ['genbank', 'fasta'])
+def test_unit_count_records(tmpdir, mocker, fmt):
+    path = os.path.join(str(tmpdir), 'input.' + ('gbk' if fmt == 'genbank' else 'fa'))
+    _write_records(path, fmt, 5)
+    gz_path = path + '.gz'
+    _gzip(path, gz_path)
+    # Record markers split between read blocks are counted
+    mocker.patch('deepbgc.input.reader.BUFFER_SIZE', 3)
+    assert count_records([path, gz_path]) == 10
+    assert count_records([path, gz_path], limit=7) == 7
+    assert count_records([path, get_test_file('BGC0000015.pfam.csv')]) is None
+
+
+def test_unit_read_inputs_index_key_mismatch(tmpdir):
+    path = os.path.join(str(tmpdir), 'input.gbk')
+    _write_records(path, 'genbank', 3)
+    with open(path) as f:
+        text = f.read()
+    # GI-style VERSION line without ACCESSION, parsed by Biopython as ID "GI:12345"
+    text = re.sub(r'^ACCESSION.*\n', '', text, flags=re.M)
+    text = re.sub(r'^VERSION .*$', 'VERSION     GI:12345', text, count=1, flags=re.M)
+    with open(path, 'w') as f:
+        f.write(text)
+    assert [e.id for e in RecordIndex.open(path, 'genbank').entries][0] != 'GI:12345'
+
+    # Record not found in the index is found by reading all records
+    selected = list(read_inputs([path], record_ids=['GI:12345', 'record2.1'], readahead=0))
+    assert [r.id for r in selected] == ['GI:12345', 'record2.1']
+
+
+def test_unit_parse_shard():
+    assert parse_shard('2/8') == (2, 8)
+    for value in ['0/8', '9/8', '1', 'a/b']:
+        with pytest.raises(ValueError):
+            parse_shard(value)
@@ -0,0 +1,90 @@
+from deepbgc.output.genbank import GenbankWriter
+from deepbgc.output.journal import RecordJournal
+from deepbgc.output.writer import TSVWriter
+from test.test_util import get_test_file
+from Bio import SeqIO
+import pandas as pd
+import os
+
+
+class LengthTSVWriter(TSVWriter):
+    def record_to_df(self, record, tables):
+        return pd.DataFrame({'sequence_id': [record.id], 'length': [len(record)]})
+
+
+def _create_writers(output_dir):
+    return [
+        GenbankWriter(out_path=os.path.join(output_dir, 'out.gbk')),
+        LengthTSVWriter(out_path=os.path.join(output_dir, 'out.tsv'))
+    ]
+
+
+def _read_outputs(output_dir):
+    return [open(os.path.join(output_dir, name)).read() for name in ['out.gbk', 'out.tsv']]
+
+
+def test_unit_journal_resume(tmpdir):
+    record = next(SeqIO.parse(get_test_file('BGC0000015.gbk'), 'genbank'))
+    records = [record[:5000], record[5000:10000], record[10000:]]
+    for i, r in enumerate(records):
+        r.id = 'record{}'.format(i)
+
+    expected_dir = str(tmpdir.mkdir('expected'))
+    writers = _create_writers(expected_dir)
+    for r in records:
+        for writer in writers:
+            writer.write(r)
+    for writer in writers:
+        writer.close()
+
+    # Interrupted while writing the third record
+    output_dir = str(tmpdir.mkdir('resumed'))
+    journal_path = os.path.join(output_dir, 'checkpoint.jsonl')
+    journal = RecordJournal(journal_path)
+    writers = _create_writers(output_dir)
+    for ordinal, r in enumerate(records[:2], 1):
+        for writer in writers:
+            writer.write(r)
+        journal.append(ordinal, r, writers)
+    writers[0].write(records[2])
+    writers[0].fd.flush()
+    journal.fd.write('{"ordinal": 3')
+    journal.fd.flush()
+
+    journal = RecordJournal(journal_path, resume=True)
+    assert len(journal) == 2
+    writers = _create_writers(output_dir)
+    checkpoints = journal.get_last_checkpoints()
+    for writer in writers:
+        writer.resume(checkpoints[writer.out_path])
+    assert [journal.is_completed(ordinal, r) for ordinal, r in enumerate(records, 1)] == [True, True, False]
+    for writer in writers:
+        writer.write(records[2])
+    journal.append(3, records[2], writers)
+    for writer in writers:
+        writer.close()
+    journal.close(remove=True)
+
+    assert _read_outputs(output_dir) == _read_outputs(expected_dir)
+    assert not os.path.exists(journal_path)
+
+
+def test_unit_journal_no_sync(tmpdir, mocker):
+    fsync = mocker.patch('os.fsync')
+    record = next(SeqIO.parse(get_test_file('BGC0000015.gbk'), 'genbank'))
+    output_dir = str(tmpdir)
+    journal = RecordJournal(os.path.join(output_dir, 'checkpoint.jsonl'), sync=False)
+    writers = _create_writers(output_dir)
+    for writer in writers:
+        writer.write(record)
+    journal.append(1, record, writers)
+    for writer in writers:
+        writer.close()
+    journal.close()
+
+    # Offsets are recorded without syncing the outputs to disk
+    assert not fsync.called
+    journal = RecordJournal(journal.path, resume=True)
+    checkpoints = journal.get_last_checkpoints()
+    journal.close()
+    assert [checkpoints[writer.out_path] for writer in writers] == [len(output) for output in _read_outputs(output_dir)]
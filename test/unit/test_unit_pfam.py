@@ -0,0 +1,24 @@
+from deepbgc import util
+from deepbgc.pipeline.pfam import get_reduced_pfam_db
+from test.test_util import get_test_file
+import os
+
+
+def test_unit_reduced_pfam_db(tmpdir, mocker, monkeypatch):
+    tmpdir = str(tmpdir)
+    monkeypatch.setenv(util.DEEPBGC_DOWNLOADS_DIR, tmpdir)
+    mock_hmmpress = mocker.patch('deepbgc.util.run_hmmpress')
+    db_path = get_test_file('Pfam-A.PF00005.hmm')
+    model_path = get_test_file('pfam2vec.test.tsv')
+
+    reduced_path, num_profiles = get_reduced_pfam_db({'PF00005'}, [model_path], db_path=db_path)
+    assert num_profiles == 1
+    assert reduced_path.startswith(tmpdir)
+    mock_hmmpress.assert_called_once_with(reduced_path, force=True)
+    with open(reduced_path) as f, open(db_path) as expected:
+        assert f.read() == expected.read()
+
+    other_path, num_profiles = get_reduced_pfam_db({'PF99999'}, [db_path], db_path=db_path)
+    assert num_profiles == 1
+    assert other_path != reduced_path
+    assert os.path.getsize(other_path) == 0
@@ -0,0 +1,63 @@
+from deepbgc import util
+from deepbgc.vocabulary import get_pfam_vocabulary
+from test.test_util import get_test_file
+import shutil
+import os
+
+
+def test_unit_pfam_metadata(tmpdir):
+    tmpdir = str(tmpdir)
+    clans_path = os.path.join(tmpdir, 'clans.tsv')
+    shutil.copy(get_test_file('Pfam-A.PF00005.clans.tsv'), clans_path)
+
+    metadata = util.get_pfam_metadata(clans_path)
+    assert metadata.get_description('PF00005.26') == 'ABC transporter'
+    assert metadata.get_description('PF00005') == 'ABC transporter'
+    assert metadata.get_clan_id('PF00005') == 'CL0023'
+    assert metadata.get_description('PF99999') is None
+
+    # Loaded only once per process
+    assert util.get_pfam_metadata(clans_path) is metadata
+
+    # Binary sidecar is created and reused
+    assert os.path.exists(clans_path + util.PFAM_METADATA_SIDECAR_SUFFIX)
+    reloaded = util.PfamMetadata.load(clans_path)
+    assert reloaded.get_clan_id('PF00005.26') == 'CL0023'
+    assert len(reloaded) == 1
+
+
+def test_unit_extract_cluster_record():
+    from Bio import SeqIO
+    from Bio.SeqFeature import SeqFeature, FeatureLocation
+    record = next(SeqIO.parse(get_test_file('BGC0000015.gbk'), 'genbank'))
+    proteins = util.get_protein_features(record)
+    for protein in proteins:
+        location = FeatureLocation(protein.location.start, protein.location.start + 30, strand=protein.location.strand)
+        record.features.append(SeqFeature(location, type=util.PFAM_FEATURE, qualifiers={'locus_tag': [util.get_protein_id(protein)]}))
+    start, end = proteins[2].location.start - 10, proteins[6].location.end + 10
+    cluster = SeqFeature(FeatureLocation(start, end), type='cluster', qualifiers={'bgc_candidate_id': ['my_cluster']})
+    record.features.append(cluster)
+
+    cluster_record = util.extract_cluster_record(cluster, record)
+    expected = cluster.extract(record)
+    assert cluster_record.id == 'my_cluster'
+    assert str(cluster_record.seq) == str(expected.seq)
+    assert [(f.type, str(f.location)) for f in cluster_record.features] \
+        == [(f.type, str(f.location)) for f in expected.features]
+    assert len(util.get_protein_features(cluster_record)) == 5
+    assert len(util.get_features_of_type(cluster_record, util.PFAM_FEATURE)) == 5
+
+    # Memoized until record features change
+    cluster.qualifiers['product_class'] = ['Polyketide']
+    assert util.extract_cluster_record(cluster, record) is cluster_record
+    assert util.get_cluster_features(cluster_record)[0].qualifiers['product_class'] == ['Polyketide']
+    record.features.append(SeqFeature(FeatureLocation(start, end), type='misc_feature'))
+    assert util.extract_cluster_record(cluster, record) is not cluster_record
+
+
+def test_unit_filter_biosynthetic_pfams():
+    pfam_ids = ['PF00001', 'PF02801', 'PF00109', 'PF02801', 'PF00002']
+    assert util.filter_biosynthetic_pfam_ids(pfam_ids) == ['PF02801', 'PF00109']
+    vocabulary = get_pfam_vocabulary()
+    bio_codes = util.filter_biosynthetic_pfam_codes(vocabulary.encode(pfam_ids))
+    assert vocabulary.decode(bio_codes) == ['PF02801', 'PF00109']
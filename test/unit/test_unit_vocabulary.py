@@ -0,0 +1,43 @@
+from deepbgc.vocabulary import PfamVocabulary, PfamLookupTable
+from deepbgc import util
+
+
+def test_unit_pfam_vocabulary():
+    vocabulary = PfamVocabulary()
+    codes = vocabulary.encode(['PF00001', 'PF00002', None, 'PF00001'])
+    assert list(codes) == [1, 2, 0, 1]
+    assert vocabulary.decode(codes) == ['PF00001', 'PF00002', None, 'PF00001']
+
+    table = PfamLookupTable(lambda pfam_id: pfam_id == 'PF00002', default=False, vocabulary=vocabulary)
+    assert list(table[codes]) == [False, True, False, False]
+    # Table is extended with Pfam IDs added later
+    new_codes = vocabulary.encode(['PF00003', 'PF00002'])
+    assert list(table[new_codes]) == [False, True]
+
+
+def test_unit_filter_biosynthetic_pfam_ids():
+    pfam_ids = ['PF00001', 'PF02801', 'PF00109', 'PF02801', None]
+    assert util.filter_biosynthetic_pfam_ids(pfam_ids) == ['PF02801', 'PF00109']
+
+
+def test_unit_pfam_index_transformer():
+    import pickle
+    import pandas as pd
+    from deepbgc.features import Pfam2VecTransformer
+    from deepbgc.vocabulary import get_pfam_vocabulary, PFAM_CODE_COLUMN
+    from test.test_util import get_test_file
+
+    transformer = Pfam2VecTransformer(get_test_file('pfam2vec.test.tsv'))
+    pfam_ids = list(transformer.vectors.index[:3]) + ['PF99999']
+    X = pd.DataFrame({'pfam_id': pfam_ids})
+    X_encoded = X.assign(**{PFAM_CODE_COLUMN: get_pfam_vocabulary().encode(pfam_ids)})
+
+    vectors = transformer.transform(X)
+    assert (vectors.values == transformer.transform(X_encoded).values).all()
+    assert (vectors.values[:3] == transformer.vectors.values[:3]).all()
+    assert (vectors.values[3] == 0).all()
+
+    # Lookup tables are process-specific and are not pickled
+    loaded = pickle.loads(pickle.dumps(transformer))
+    assert getattr(loaded, '_pfam_index_table', None) is None
+    assert (loaded.transform(X).values == vectors.values).all()